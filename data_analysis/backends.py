@@ -0,0 +1,121 @@
+# backends.py
+"""
+Alternative CPU inference backends for the saved classification models.
+
+  - torch: the fp32 PyTorch model as loaded (default)
+  - int8:  dynamic int8 quantization of every nn.Linear (weights int8, activations
+           quantized on the fly); built in memory at load time
+  - onnx:  ONNX export run through onnxruntime; exported once to
+           <model_dir>/onnx/model.onnx and re-exported when the weights are newer
+
+Every backend is called like the PyTorch model (model(**enc).logits), so
+inference.predict_labels keeps its (probs, binary_preds) contract unchanged.
+Use compare_inference.py backend to measure accuracy parity before switching.
+"""
+
+import os
+import inspect
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from torch import nn
+
+BACKENDS = ("torch", "int8", "onnx")
+ONNX_OPSET = 17
+
+@contextmanager
+def single_threaded():
+    """Run torch ops on one intra-op thread for the duration.
+
+    Loading happens in the parent before parallel_inference.py forks its workers; once the
+    parent has used torch's OpenMP pool, a forked worker hangs on its first parallel op.
+    """
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(threads)
+
+def quantize_int8(model):
+    model = model.to("cpu").eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def weights_mtime(model_dir):
+    mtimes = [os.path.getmtime(os.path.join(model_dir, f)) for f in os.listdir(model_dir)
+              if f.endswith((".safetensors", ".bin"))]
+    return max(mtimes) if mtimes else 0.0
+
+def export_onnx(model, tokenizer, onnx_path):
+    model = model.to("cpu").eval()
+    sample = tokenizer(["Gaza ceasefire talks", "Aid convoys reach Rafah crossing after weeks of negotiations"],
+                       padding=True, return_tensors="pt")
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # TorchScript exporter: Longformer's data-dependent padding does not trace with dynamo
+        kwargs["dynamo"] = False
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        onnx_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={"input_ids": {0: "batch", 1: "seq"}, "attention_mask": {0: "batch", 1: "seq"}, "logits": {0: "batch"}},
+        opset_version=ONNX_OPSET,
+        **kwargs,
+    )
+
+class OnnxModel:
+    """onnxruntime session behind the model(**enc).logits interface.
+
+    The session is created on first use in each process, with num_threads or else the
+    process's torch.get_num_threads(); forked workers (parallel_inference.py) set their
+    thread count first, so each gets a session sized to its share of the cores.
+    """
+
+    def __init__(self, onnx_path, num_threads=None):
+        self.onnx_path = onnx_path
+        self.num_threads = num_threads
+        self._session, self._pid = None, None
+
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.num_threads or torch.get_num_threads()
+            self._session = ort.InferenceSession(self.onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+            self._pid = os.getpid()
+            self.input_names = [i.name for i in self._session.get_inputs()]
+        return self._session
+
+    def __call__(self, **enc):
+        session = self.session
+        feeds = {k: v.cpu().numpy().astype(np.int64) for k, v in enc.items() if k in self.input_names}
+        logits = session.run(["logits"], feeds)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def eval(self):
+        return self
+
+def load_backend(model, tokenizer, model_dir, backend="torch"):
+    """Wrap an already loaded PyTorch model in the requested backend."""
+    if backend == "torch":
+        return model
+    if backend == "int8":
+        with single_threaded():
+            return quantize_int8(model)
+    if backend == "onnx":
+        onnx_path = os.path.join(model_dir, "onnx", "model.onnx")
+        if not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < weights_mtime(model_dir):
+            print(f"Exporting {model_dir} → {onnx_path}")
+            with single_threaded():
+                export_onnx(model, tokenizer, onnx_path)
+        return OnnxModel(onnx_path)
+    raise ValueError(f"Unknown backend {backend!r}; choose from {BACKENDS}")
@@ -0,0 +1,344 @@
+# benchmark.py
+"""
+Inference throughput/latency benchmark for the classification models.
+
+Runs offline on CPU: tiny randomly-initialized models of the same architectures
+(Longformer → LabelFrames, MPNet → TopLabelFrames, BART NLI → zero-shot) are built
+once under --work-dir, with BPE/WordPiece tokenizers trained on the benchmark corpus.
+Weights are random, so only speed and memory are meaningful, not predictions.
+
+Corpus: synthetic articles with a log-normal word count (news-like: long right tail),
+or --csv to sample the Text column of a real file (e.g. data/eval_data.csv).
+
+Each case (model × max_length × batch_size × length bucket) runs in its own forked
+process, so peak RSS is per case. Reported per case: docs/sec, tokens/sec (non-pad
+tokens seen by the model), p50/p95 latency per batch and peak RSS, as JSON.
+
+  python benchmark.py run --out results/bench.json
+  python benchmark.py run --baseline results/bench.json     # exit code 1 on regression
+  python benchmark.py compare new.json old.json --tolerance 0.1
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import multiprocessing as mp
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import torch
+from transformers import (
+    BartConfig, BartForSequenceClassification,
+    LongformerConfig, LongformerForSequenceClassification,
+    MPNetConfig, MPNetForSequenceClassification,
+    MPNetTokenizerFast, RobertaTokenizerFast,
+)
+
+from inference import predict_labels
+from profiling import peak_rss_mb
+
+# Paths
+BASE_DIR = os.path.abspath("/Users/davidluu/Model Training & Performance Testing")
+WORK_DIR = os.path.join(BASE_DIR, "results", "benchmarks")
+
+# Constants
+MODELS = ("longformer", "mpnet", "zeroshot_batched", "zeroshot_pipeline")
+LENGTH_BUCKETS = {"short": (0, 300), "medium": (300, 1000), "long": (1000, None)}  # words
+NUM_LABELS = {"longformer": 40, "mpnet": 12}
+ZS_LABELS = ["humanitarian crisis", "military operation", "diplomacy", "hostages", "protest",
+             "civilian casualties", "ceasefire", "international law"]
+# A case is only flagged as a regression when the change is larger than the tolerance
+COMPARED_METRICS = {"docs_per_sec": "higher", "latency_p95_ms": "lower", "peak_rss_mb": "lower"}
+
+# Corpus
+def synthetic_corpus(n_docs, median_words=550, sigma=0.7, seed=0):
+    """Articles whose word counts follow a log-normal distribution, clipped to 30–8000 words."""
+    rng = np.random.default_rng(seed)
+    vocab_rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocab = ["".join(vocab_rng.choices(letters, k=vocab_rng.randint(2, 10))) for _ in range(5000)]
+    # Zipf-like word frequencies, as in natural text
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+    lengths = np.clip(rng.lognormal(np.log(median_words), sigma, n_docs), 30, 8000).astype(int)
+    docs = []
+    for n in lengths:
+        words = rng.choice(len(vocab), size=n, p=weights)
+        docs.append(" ".join(vocab[w] for w in words))
+    return docs
+
+def csv_corpus(path, n_docs, seed=0):
+    df = pd.read_csv(path, usecols=["Text"])
+    texts = df["Text"].dropna().astype(str)
+    return texts.sample(min(n_docs, len(texts)), random_state=seed).tolist()
+
+def bucket_texts(texts, bucket):
+    if bucket == "all":
+        return texts
+    lo, hi = LENGTH_BUCKETS[bucket]
+    return [t for t in texts if len(t.split()) >= lo and (hi is None or len(t.split()) < hi)]
+
+# Tiny models
+def train_tokenizers(texts, out_dir):
+    """Byte-level BPE (Longformer/BART family) and WordPiece (MPNet family) trained on the corpus."""
+    from tokenizers import ByteLevelBPETokenizer, BertWordPieceTokenizer
+    bpe_dir, wp_dir = os.path.join(out_dir, "tok_bpe"), os.path.join(out_dir, "tok_wordpiece")
+    os.makedirs(bpe_dir, exist_ok=True)
+    os.makedirs(wp_dir, exist_ok=True)
+
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(texts, vocab_size=8000, special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"])
+    bpe.save_model(bpe_dir)
+    wp = BertWordPieceTokenizer(lowercase=True)
+    wp.train_from_iterator(texts, vocab_size=8000, special_tokens=["<s>", "<pad>", "</s>", "[UNK]", "<mask>"])
+    wp.save_model(wp_dir)
+
+    tok_bpe = RobertaTokenizerFast(os.path.join(bpe_dir, "vocab.json"), os.path.join(bpe_dir, "merges.txt"))
+    tok_wp = MPNetTokenizerFast(os.path.join(wp_dir, "vocab.txt"), unk_token="[UNK]")
+    return tok_bpe, tok_wp
+
+def build_tiny_models(texts, out_dir, hidden_size=64, layers=2, seed=0):
+    """Save tiny random models + tokenizers to out_dir/{longformer,mpnet,nli}; returns their paths."""
+    torch.manual_seed(seed)
+    tok_bpe, tok_wp = train_tokenizers(texts, out_dir)
+    heads = max(1, hidden_size // 32)
+    common = dict(hidden_size=hidden_size, num_hidden_layers=layers, num_attention_heads=heads,
+                  intermediate_size=hidden_size * 4)
+    paths = {}
+
+    def save(name, model, tokenizer, max_length):
+        path = os.path.join(out_dir, name)
+        tokenizer.model_max_length = max_length
+        model.save_pretrained(path)
+        tokenizer.save_pretrained(path)
+        paths[name] = path
+
+    id2label = {i: f"frame_{i}" for i in range(NUM_LABELS["longformer"])}
+    save("longformer", LongformerForSequenceClassification(LongformerConfig(
+        vocab_size=len(tok_bpe), max_position_embeddings=4098, attention_window=64,
+        pad_token_id=tok_bpe.pad_token_id, bos_token_id=tok_bpe.bos_token_id, eos_token_id=tok_bpe.eos_token_id,
+        problem_type="multi_label_classification", id2label=id2label,
+        label2id={v: k for k, v in id2label.items()}, **common)), tok_bpe, 4096)
+
+    id2label = {i: f"top_{i}" for i in range(NUM_LABELS["mpnet"])}
+    save("mpnet", MPNetForSequenceClassification(MPNetConfig(
+        vocab_size=len(tok_wp), max_position_embeddings=1026, pad_token_id=tok_wp.pad_token_id,
+        problem_type="multi_label_classification", id2label=id2label,
+        label2id={v: k for k, v in id2label.items()}, **common)), tok_wp, 1024)
+
+    nli_labels = {0: "contradiction", 1: "neutral", 2: "entailment"}
+    save("nli", BartForSequenceClassification(BartConfig(
+        vocab_size=len(tok_bpe), d_model=hidden_size, encoder_layers=layers, decoder_layers=layers,
+        encoder_attention_heads=heads, decoder_attention_heads=heads,
+        encoder_ffn_dim=hidden_size * 4, decoder_ffn_dim=hidden_size * 4, max_position_embeddings=1024,
+        pad_token_id=tok_bpe.pad_token_id, bos_token_id=tok_bpe.bos_token_id, eos_token_id=tok_bpe.eos_token_id,
+        decoder_start_token_id=tok_bpe.eos_token_id, forced_eos_token_id=tok_bpe.eos_token_id,
+        num_labels=3, id2label=nli_labels, label2id={v: k for k, v in nli_labels.items()})), tok_bpe, 1024)
+    return paths
+
+# Measurement
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000) if latencies else float("nan")
+
+def time_batches(texts, batch_size, run_batch, count_tokens, warmup=1):
+    """Call run_batch on consecutive slices; returns per-batch latencies (s) and non-pad tokens seen."""
+    batches = [texts[i:i+batch_size] for i in range(0, len(texts), batch_size)]
+    for batch in batches[:warmup]:
+        run_batch(batch)
+    latencies, tokens = [], 0
+    for batch in batches:
+        t0 = time.perf_counter()
+        run_batch(batch)
+        latencies.append(time.perf_counter() - t0)
+        tokens += count_tokens(batch)
+    return latencies, tokens
+
+def nli_pair_tokens(tokenizer, texts, max_length):
+    """Tokens in every (premise, hypothesis) pair the zero-shot engines build for `texts`."""
+    hypotheses = [f"This example is {label}." for label in ZS_LABELS]
+    return sum(len(ids) for t in texts
+               for ids in tokenizer([t] * len(hypotheses), hypotheses, truncation="only_first", max_length=max_length)["input_ids"])
+
+def run_case(case, paths, texts, threads):
+    """Executed in a forked child: load the model fresh, time it, report peak RSS of this process."""
+    torch.set_num_threads(threads)
+    name, max_length, batch_size = case["model"], case["max_length"], case["batch_size"]
+
+    if name in ("longformer", "mpnet"):
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        tokenizer = AutoTokenizer.from_pretrained(paths[name])
+        model = AutoModelForSequenceClassification.from_pretrained(paths[name]).eval()
+        run_batch = lambda batch: predict_labels(model, tokenizer, batch, batch_size=batch_size, max_length=max_length)
+        count_tokens = lambda batch: sum(len(ids) for ids in tokenizer(batch, truncation=True, max_length=max_length)["input_ids"])
+    elif name == "zeroshot_batched":
+        from evaluate_zeroshot import BatchedZeroShot
+        engine = BatchedZeroShot(paths["nli"], device="cpu", max_length=max_length)
+        tokenizer = engine.tokenizer
+        run_batch = lambda batch: engine.classify(batch, ZS_LABELS, multi_label=True)
+        count_tokens = lambda batch: nli_pair_tokens(tokenizer, batch, max_length)
+    else:
+        from transformers import pipeline
+        clf = pipeline("zero-shot-classification", model=paths["nli"], device=-1)
+        clf.tokenizer.model_max_length = max_length
+        run_batch = lambda batch: [clf(t, ZS_LABELS, multi_label=True) for t in batch]
+        count_tokens = lambda batch: nli_pair_tokens(clf.tokenizer, batch, max_length)
+
+    latencies, tokens = time_batches(texts, batch_size, run_batch, count_tokens)
+    elapsed = sum(latencies)
+    return {
+        **case,
+        "docs": len(texts),
+        "tokens": int(tokens),
+        "docs_per_sec": len(texts) / elapsed if elapsed else float("nan"),
+        "tokens_per_sec": tokens / elapsed if elapsed else float("nan"),
+        "latency_p50_ms": percentile_ms(latencies, 50),
+        "latency_p95_ms": percentile_ms(latencies, 95),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def build_cases(models, max_lengths, batch_sizes, buckets):
+    cases = []
+    for model in models:
+        for max_length in max_lengths:
+            # The pipeline scores one text per call; batch size does not apply
+            sizes = [1] if model == "zeroshot_pipeline" else batch_sizes
+            for batch_size in sizes:
+                for bucket in buckets:
+                    cases.append({"model": model, "max_length": max_length, "batch_size": batch_size, "bucket": bucket})
+    return cases
+
+def case_key(r):
+    return (r["model"], r["max_length"], r["batch_size"], r["bucket"])
+
+def run_benchmark(args):
+    if args.csv:
+        corpus = csv_corpus(args.csv, args.corpus_docs, seed=args.seed)
+    else:
+        corpus = synthetic_corpus(args.corpus_docs, median_words=args.median_words, seed=args.seed)
+
+    work_dir = os.path.join(args.work_dir, f"h{args.hidden_size}_l{args.layers}")
+    paths = {n: os.path.join(work_dir, n) for n in ("longformer", "mpnet", "nli")}
+    if args.rebuild or not all(os.path.exists(p) for p in paths.values()):
+        print(f"Building tiny models in {work_dir}")
+        paths = build_tiny_models(corpus, work_dir, hidden_size=args.hidden_size, layers=args.layers, seed=args.seed)
+
+    threads = args.threads or torch.get_num_threads()
+    ctx = mp.get_context("fork")
+    results = []
+    for case in build_cases(args.models, args.max_lengths, args.batch_sizes, args.buckets):
+        texts = bucket_texts(corpus, case["bucket"])[:args.docs]
+        if not texts:
+            print(f"skip {case}: no documents in bucket")
+            continue
+        with ctx.Pool(1) as pool:
+            row = pool.apply(run_case, (case, paths, texts, threads))
+        results.append(row)
+        print(f"{row['model']:<18} len={row['max_length']:<5} bs={row['batch_size']:<3} {row['bucket']:<7} "
+              f"{row['docs_per_sec']:8.2f} docs/s {row['tokens_per_sec']:10.0f} tok/s "
+              f"p50={row['latency_p50_ms']:8.1f}ms p95={row['latency_p95_ms']:8.1f}ms rss={row['peak_rss_mb']:.0f}MB")
+
+    words = np.array([len(t.split()) for t in corpus])
+    meta = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "torch_threads": threads,
+        "corpus": {"source": args.csv or "synthetic", "docs": len(corpus),
+                   "words_p50": float(np.median(words)), "words_p95": float(np.percentile(words, 95))},
+        "tiny_model": {"hidden_size": args.hidden_size, "layers": args.layers},
+    }
+    return {"meta": meta, "results": results}
+
+# Baseline comparison
+def compare(current, baseline, tolerance=0.1):
+    """Per-case relative change of each COMPARED_METRICS entry; regressions beyond tolerance are flagged."""
+    base = {case_key(r): r for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        b = base.get(case_key(r))
+        if b is None:
+            continue
+        for metric, better in COMPARED_METRICS.items():
+            if not b.get(metric):
+                continue
+            change = (r[metric] - b[metric]) / b[metric]
+            worse = -change if better == "higher" else change
+            rows.append({"model": r["model"], "max_length": r["max_length"], "batch_size": r["batch_size"],
+                         "bucket": r["bucket"], "metric": metric, "baseline": b[metric], "current": r[metric],
+                         "change": change, "regression": worse > tolerance})
+    return rows
+
+def format_comparison(rows):
+    lines = ["| model | max_length | batch | bucket | metric | baseline | current | change |", "|---|---|---|---|---|---|---|---|"]
+    for r in rows:
+        flag = " ⚠" if r["regression"] else ""
+        lines.append(f"| {r['model']} | {r['max_length']} | {r['batch_size']} | {r['bucket']} | {r['metric']} | "
+                     f"{r['baseline']:.2f} | {r['current']:.2f} | {r['change']:+.1%}{flag} |")
+    return lines
+
+def report_comparison(current, baseline, tolerance):
+    rows = compare(current, baseline, tolerance)
+    for line in format_comparison(rows):
+        print(line)
+    regressions = [r for r in rows if r["regression"]]
+    print(f"\n{len(regressions)} regression(s) beyond {tolerance:.0%} across {len(rows)} comparisons")
+    return 1 if regressions else 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_run = sub.add_parser("run", help="Run the benchmark and write JSON.")
+    p_run.add_argument("--out", default=None, help="JSON output path (default: bench_<timestamp>.json in the work dir).")
+    p_run.add_argument("--baseline", default=None, help="Compare against a saved benchmark JSON; exit 1 on regression.")
+    p_run.add_argument("--tolerance", type=float, default=0.1)
+    p_run.add_argument("--models", nargs="+", choices=MODELS, default=list(MODELS))
+    p_run.add_argument("--max-lengths", nargs="+", type=int, default=[512, 1024])
+    p_run.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 16])
+    p_run.add_argument("--buckets", nargs="+", choices=["all", *LENGTH_BUCKETS], default=["all", *LENGTH_BUCKETS])
+    p_run.add_argument("--docs", type=int, default=32, help="Documents timed per case.")
+    p_run.add_argument("--csv", default=None, help="Sample the Text column of this CSV instead of the synthetic corpus.")
+    p_run.add_argument("--corpus-docs", type=int, default=400)
+    p_run.add_argument("--median-words", type=int, default=550)
+    p_run.add_argument("--hidden-size", type=int, default=64)
+    p_run.add_argument("--layers", type=int, default=2)
+    p_run.add_argument("--threads", type=int, default=None, help="torch intra-op threads per case (default: torch's).")
+    p_run.add_argument("--work-dir", default=WORK_DIR)
+    p_run.add_argument("--rebuild", action="store_true", help="Rebuild the tiny models and tokenizers.")
+    p_run.add_argument("--seed", type=int, default=0)
+
+    p_cmp = sub.add_parser("compare", help="Compare two benchmark JSON files.")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("--tolerance", type=float, default=0.1)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    if args.mode == "compare":
+        with open(args.current) as f:
+            current = json.load(f)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(report_comparison(current, baseline, args.tolerance))
+
+    report = run_benchmark(args)
+    out = args.out or os.path.join(args.work_dir, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(report['results'])} cases to {out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(report_comparison(report, baseline, args.tolerance))
@@ -0,0 +1,231 @@
+# cascade.py
+"""
+Confidence cascade for finetuned_analysis.py (--cascade).
+
+A sparse TF-IDF + logistic-regression model, trained on the TokenString column of
+train_data.csv (the stopword-removed tokens written by data_preparation.R), scores
+every article in milliseconds. Only articles inside the uncertainty band go on to
+Longformer/MPNet; all other articles keep the linear predictions:
+
+  uncertain = any LabelFrames probability in [low, high]
+              or best - second best TopLabelFrames probability < top_margin
+
+TopLabelFrames is one softmax over all classes, so its best probability shrinks as
+classes are added; the margin between the two best classes does not.
+
+The linear probabilities use the transformers' label order, so they fill the same
+probs_label / probs_top columns (prediction_output.py); finetuned_analysis.py marks
+the rows the transformers scored in a `routed` column and records the cascade model,
+band and margin in the output metadata.
+
+  python cascade.py train                # fit on train_data.csv → results/cascade/linear_frames.joblib
+  python cascade.py report --band 0.2 0.8 --top-margin 0.2
+      # eval_data.csv: routed fraction, speedup and agreement with the transformer-only output
+"""
+
+import os
+import json
+import time
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import f1_score
+from sklearn.multiclass import OneVsRestClassifier
+
+import finetuned_analysis as fa
+
+# Paths (under fa.RESULTS_DIR, resolved on use so --results-dir applies)
+def cascade_path():
+    return os.path.join(fa.RESULTS_DIR, "cascade", "linear_frames.joblib")
+
+def report_path():
+    return os.path.join(fa.RESULTS_DIR, "cascade", "cascade_report.json")
+
+SEP = "|"
+DEFAULT_BAND = (0.2, 0.8)
+DEFAULT_TOP_MARGIN = 0.2
+
+def split_labels(s: str):
+    return [l.strip() for l in str(s).split(SEP) if l.strip()]
+
+def load_label_order(path):
+    with open(path, "r") as f:
+        label2id = json.load(f)
+    return [label for label, _ in sorted(label2id.items(), key=lambda kv: int(kv[1]))]
+
+def token_features(df):
+    """TokenString where the R pipeline wrote it, else the raw Text (the vectorizer drops stopwords either way)."""
+    text = df["Text"].fillna("").astype(str) if "Text" in df.columns else pd.Series([""] * len(df), index=df.index)
+    if "TokenString" not in df.columns:
+        return text.tolist()
+    tokens = df["TokenString"]
+    return tokens.where(tokens.notna() & (tokens.astype(str).str.strip() != ""), text).astype(str).tolist()
+
+class LinearFrames:
+    """TF-IDF features, one-vs-rest logistic regression for LabelFrames, multinomial for TopLabelFrames."""
+
+    def __init__(self, labels_label, labels_top, max_features=100000, C=4.0):
+        self.labels_label = list(labels_label)
+        self.labels_top = list(labels_top)
+        self.vectorizer = TfidfVectorizer(lowercase=True, stop_words="english", ngram_range=(1, 2), min_df=2,
+                                          max_features=max_features, sublinear_tf=True, dtype=np.float32)
+        self.model_label = OneVsRestClassifier(LogisticRegression(C=C, max_iter=1000))
+        self.model_top = LogisticRegression(C=C, max_iter=1000)
+
+    def fit(self, tokens, label_strings, top_strings):
+        X = self.vectorizer.fit_transform(tokens)
+        Y = np.zeros((len(tokens), len(self.labels_label)), dtype=int)
+        index = {label: i for i, label in enumerate(self.labels_label)}
+        for row, s in enumerate(label_strings):
+            for label in split_labels(s):
+                if label in index:
+                    Y[row, index[label]] = 1
+        # A label without positives (or negatives) gets a constant classifier instead of failing the fit
+        self.model_label.fit(X, Y)
+        top = [next(iter(split_labels(s)), "") for s in top_strings]
+        self.model_top.fit(X, top)
+        return self
+
+    def predict_proba(self, tokens):
+        """(probs_label, probs_top) as float32 matrices in the transformer label order."""
+        X = self.vectorizer.transform(tokens)
+        probs_label = np.asarray(self.model_label.predict_proba(X), dtype=np.float32)
+        probs_top = np.zeros((len(tokens), len(self.labels_top)), dtype=np.float32)
+        seen = self.model_top.predict_proba(X)
+        for j, label in enumerate(self.model_top.classes_):
+            if label in self.labels_top:
+                probs_top[:, self.labels_top.index(label)] = seen[:, j]
+        return probs_label, probs_top
+
+    def save(self, path=None):
+        path = path or cascade_path()
+        # Plain sklearn objects only, so the file loads whether this class lives in __main__ or in cascade
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump({k: getattr(self, k) for k in ("labels_label", "labels_top", "vectorizer", "model_label", "model_top")}, path)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or cascade_path()
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Linear cascade model not found: {path} (run `python cascade.py train` first)")
+        state = joblib.load(path)
+        model = cls(state["labels_label"], state["labels_top"])
+        for k, v in state.items():
+            setattr(model, k, v)
+        model.path = os.path.abspath(path)
+        return model
+
+def top_margins(probs_top):
+    """Best minus second-best TopLabelFrames probability per row."""
+    if probs_top.shape[1] < 2:
+        return probs_top.max(axis=1, initial=0.0)
+    best_two = np.partition(probs_top, -2, axis=1)[:, -2:]
+    return best_two[:, 1] - best_two[:, 0]
+
+def uncertain(probs_label, probs_top, band=DEFAULT_BAND, top_margin=DEFAULT_TOP_MARGIN):
+    """Rows the linear model is unsure about (see module docstring)."""
+    low, high = band
+    in_band = ((probs_label >= low) & (probs_label <= high)).any(axis=1)
+    return in_band | (top_margins(probs_top) < top_margin)
+
+def train(max_features=100000, C=4.0, path=None):
+    t0 = time.time()
+    path = path or cascade_path()
+    df = pd.read_csv(os.path.join(fa.DATA_DIR, "train_data.csv"))
+    model = LinearFrames(load_label_order(fa.LF_LABEL_JSON), load_label_order(fa.MP_TOP_JSON), max_features=max_features, C=C)
+    model.fit(token_features(df), df["LabelFrames"].fillna("").str.replace(";", SEP), df["TopLabelFrames"].fillna("").str.replace(";", SEP))
+    model.save(path)
+    print(f"Linear cascade model: {len(model.vectorizer.vocabulary_)} features, {len(df)} articles, {time.time() - t0:.1f}s → {path}")
+    return model
+
+def agreement(reference, probs_label, probs_top, ref_probs_label, ref_probs_top):
+    """LabelFrames micro/weighted F1 and exact match, TopLabelFrames accuracy, against the reference predictions."""
+    ref = (ref_probs_label >= 0.5).astype(int)
+    pred = (probs_label >= 0.5).astype(int)
+    return {
+        "labelframes_f1_micro": f1_score(ref, pred, average="micro", zero_division=0),
+        "labelframes_f1_weighted": f1_score(ref, pred, average="weighted", zero_division=0),
+        "labelframes_exact_match": float((reference["LabelFrames_pred"] == reference["cascade_label"]).mean()),
+        "topframes_accuracy": float((ref_probs_top.argmax(axis=1) == probs_top.argmax(axis=1)).mean()),
+    }
+
+def report(band=DEFAULT_BAND, top_margin=DEFAULT_TOP_MARGIN, sweep=(0.1, 0.2, 0.3, 0.4), path=None):
+    """Cascade vs transformer-only on eval_data.csv (uncached, same batching)."""
+    t0 = time.time()
+    path = path or report_path()
+    df = pd.read_csv(os.path.join(fa.DATA_DIR, "eval_data.csv"))
+    texts, tokens = df["Text"].astype(str).tolist(), token_features(df)
+
+    # Models load lazily; load both predictors' models first so neither timing includes it
+    full = fa.FramePredictor(cache=None)
+    cascade = fa.FramePredictor(cache=None, cascade=LinearFrames.load(), band=band, top_margin=top_margin)
+    full.models()
+    cascade.models()
+
+    start = time.perf_counter()
+    ref_strings, ref_top, ref_probs_label, ref_probs_top = full.predict(texts)
+    seconds_full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    strings, top, probs_label, probs_top = cascade.predict(texts, tokens=tokens)
+    seconds_cascade = time.perf_counter() - start
+
+    compared = pd.DataFrame({"LabelFrames_pred": ref_strings, "cascade_label": strings})
+    result = {
+        "rows": len(texts), "band": list(band), "top_margin": top_margin,
+        "routed_fraction": cascade.cascade_stats["routed"] / max(cascade.cascade_stats["rows"], 1),
+        "transformer_seconds": seconds_full, "cascade_seconds": seconds_cascade,
+        "speedup": seconds_full / seconds_cascade if seconds_cascade else None,
+        "agreement": agreement(compared, probs_label, probs_top, ref_probs_label, ref_probs_top),
+    }
+
+    # Other bands, estimated from the same outputs: routed rows take the transformer result
+    lin_label, lin_top = cascade.cascade.predict_proba(tokens)
+    result["sweep"] = []
+    for width in sweep:
+        b = (width, 1 - width)
+        mask = uncertain(lin_label, lin_top, b, top_margin)
+        mixed_label = np.where(mask[:, None], ref_probs_label, lin_label)
+        mixed_top = np.where(mask[:, None], ref_probs_top, lin_top)
+        compared["cascade_label"] = fa.decode_label_frames(mixed_label, mixed_label >= 0.5, fa.id2label_label)
+        result["sweep"].append({"band": list(b), "routed_fraction": float(mask.mean()),
+                                **agreement(compared, mixed_label, mixed_top, ref_probs_label, ref_probs_top)})
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    lines = [
+        f"band {band[0]:g}–{band[1]:g}, top margin {top_margin:g}: {result['routed_fraction']:.1%} of {len(texts)} articles routed to the transformers",
+        f"time: transformer-only {seconds_full:.1f}s, cascade {seconds_cascade:.1f}s (×{result['speedup']:.1f})",
+        "agreement with transformer-only: " + ", ".join(f"{k}={v:.4f}" for k, v in result["agreement"].items()),
+    ]
+    lines += [f"  band {s['band'][0]:g}–{s['band'][1]:g}: routed {s['routed_fraction']:.1%}, "
+              f"f1_micro={s['labelframes_f1_micro']:.4f}, top_acc={s['topframes_accuracy']:.4f}" for s in result["sweep"]]
+    print("\n".join(lines))
+    fa.log_to_readme("Confidence cascade report on eval_data.csv", t0, notes=" | ".join(lines[:3]) + f" | → {path}")
+    return result
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    fa.add_path_args(parser)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_train = sub.add_parser("train", help="Fit the TF-IDF + linear model on train_data.csv.")
+    p_train.add_argument("--max-features", type=int, default=100000)
+    p_train.add_argument("--C", type=float, default=4.0, help="Inverse regularization strength.")
+    p_report = sub.add_parser("report", help="Routed fraction, speedup and agreement on eval_data.csv.")
+    p_report.add_argument("--band", type=float, nargs=2, default=list(DEFAULT_BAND), metavar=("LOW", "HIGH"))
+    p_report.add_argument("--top-margin", type=float, default=DEFAULT_TOP_MARGIN,
+                          help="Route rows whose two best TopLabelFrames probabilities are closer than this.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    fa.apply_path_args(args)
+    if args.command == "train":
+        train(max_features=args.max_features, C=args.C)
+    else:
+        report(band=tuple(args.band), top_margin=args.top_margin)
@@ -0,0 +1,77 @@
+# clusters.py
+"""
+Outlet → cluster memberships and the t1–t5 periods, as built by
+web_scraping/data_preparation.R (the *_tokenized.csv cluster files).
+
+  cluster1_politicalcompliance_{il,ps,nc}
+  cluster2_politicalsystem_{democratic,nondemocratic}
+
+Each cluster also has one slice per period; view names follow the CSV stems,
+e.g. cluster1_politicalcompliance_il_t3.
+"""
+
+import pandas as pd
+
+# Per-outlet tokenized files written by data_preparation.R
+OUTLET_FILES = {
+    "abcnews": "abcnews_gaza_all_articles_tokenized.csv",
+    "aljazeera": "aljazeera_gaza_all_articles_tokenized.csv",
+    "arabnews": "arabnews_gaza_all_articles_tokenized.csv",
+    "bbc": "bbc_gaza_all_articles_tokenized.csv",
+    "cgtn": "cgtn_gaza_all_articles_tokenized.csv",
+    "cnn": "cnn_gaza_all_articles_tokenized.csv",
+    "dailysabah": "dailysabah_gaza_all_articles_tokenized.csv",
+    "dw": "dw_gaza_all_articles_tokenized.csv",
+    "euronews": "euronews_gaza_all_articles_tokenized.csv",
+    "france24": "france24_gaza_all_articles_tokenized.csv",
+    "israelhayom": "israelhayom_gaza_all_articles_tokenized.csv",
+    "lemonde": "lemonde_gaza_all_articles_tokenized.csv",
+    "mehrnewsagency": "mehrnewsagency_gaza_all_articles_tokenized.csv",
+    "npr": "npr_middleeast_all_articles_tokenized.csv",
+    "scmp": "scmp_gaza_all_articles_tokenized.csv",
+    "theguardian": "theguardian_gaza_all_articles_tokenized.csv",
+    "theintercept": "theintercept_gaza_all_articles_tokenized.csv",
+    "thestraitstimes": "thestraitstimes_gaza_all_articles_tokenized.csv",
+    "timesofindia": "timesofindia_gaza_all_articles_tokenized.csv",
+    "voa": "voa_gaza_all_articles_tokenized.csv",
+    "vox": "vox_gaza_all_articles_tokenized.csv",
+    "wafa": "wafa_gaza_all_articles_tokenized.csv",
+}
+
+_DEMOCRATIC = ["israelhayom", "abcnews", "bbc", "cnn", "dw", "euronews", "france24", "lemonde",
+               "npr", "theguardian", "theintercept", "vox", "voa"]
+
+CLUSTERS = {
+    # cluster 1 — political compliance
+    "cluster1_politicalcompliance_il": _DEMOCRATIC,
+    "cluster1_politicalcompliance_ps": ["aljazeera", "arabnews", "dailysabah", "mehrnewsagency", "wafa"],
+    "cluster1_politicalcompliance_nc": ["cgtn", "scmp", "thestraitstimes", "timesofindia"],
+    # cluster 2 — political system
+    "cluster2_politicalsystem_democratic": _DEMOCRATIC,
+    "cluster2_politicalsystem_nondemocratic": ["wafa", "aljazeera", "arabnews", "cgtn", "dailysabah",
+                                               "mehrnewsagency", "scmp", "thestraitstimes", "timesofindia"],
+}
+
+# Inclusive date ranges
+PERIODS = {
+    "t1": ("2023-10-07", "2024-03-26"),  # initial attacks → UN finds grounds for genocide
+    "t2": ("2024-03-27", "2024-05-24"),  # → ICJ calls for end of Rafah offensive
+    "t3": ("2024-05-25", "2024-10-17"),  # → Yahya Sinwar killed
+    "t4": ("2024-10-18", "2025-03-18"),  # → ceasefire broken
+    "t5": ("2025-03-19", "2025-08-11"),  # → recognition of a Palestinian state announced
+}
+
+def period_of(dates):
+    """Period name (t1–t5) per date, None outside all periods (e.g. articles after the t5 cutoff)."""
+    dates = pd.to_datetime(pd.Series(dates), errors="coerce")
+    out = pd.Series([None] * len(dates), index=dates.index, dtype=object)
+    for name, (start, end) in PERIODS.items():
+        out[(dates >= start) & (dates <= end)] = name
+    return out
+
+def clusters_of(outlet):
+    return [name for name, members in CLUSTERS.items() if outlet in members]
+
+def view_names():
+    """Every cluster view and its period slices, in CLUSTER_FILES order."""
+    return [f"{cluster}{suffix}" for cluster in CLUSTERS for suffix in [f"_{p}" for p in PERIODS] + [""]]
@@ -0,0 +1,182 @@
+# compare_inference.py
+"""
+Side-by-side comparisons of inference paths on /data/eval_data.csv.
+
+  batching — fixed batches of 4 in file order (old path) vs. length-sorted
+             dynamic batching under a token budget.
+  backend  — fp32 PyTorch vs. the int8 or ONNX Runtime backend (backends.py):
+             how often the decoded label sets disagree, and the change in
+             micro/weighted precision/recall/F1 against the gold labels.
+  chunked  — truncation (first max_length tokens) vs. sliding-window chunks
+             pooled per article: docs/sec and tokens/sec, label agreement and
+             F1 against the gold labels.
+
+Reports docs/sec per path and model, the speedup, the largest absolute
+probability difference and how often the thresholded label sets agree.
+Appends a run log to READme.md.
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+from sklearn.metrics import precision_recall_fscore_support
+from sklearn.preprocessing import MultiLabelBinarizer
+
+import finetuned_analysis as fa
+from backends import load_backend
+from inference import encode_windows, predict_labels, predict_labels_chunked
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+def agreement(preds_a, preds_b):
+    """Share of rows whose thresholded label sets are identical."""
+    if not len(preds_a):
+        return float("nan")
+    return float(np.mean(np.all(preds_a == preds_b, axis=1)))
+
+def compare_batching(texts, token_budget):
+    rows = []
+    for name, model, tokenizer, max_length in (
+        ("LabelFrames (Longformer)", fa.model_label, fa.tokenizer_label, fa.LF_LABEL_MAX_LENGTH),
+        ("TopLabelFrames (MPNet)", fa.model_top, fa.tokenizer_top, 512),
+    ):
+        (probs_fixed, preds_fixed), t_fixed = timed(predict_labels, model, tokenizer, texts, max_length=max_length)
+        (probs_dyn, preds_dyn), t_dyn = timed(predict_labels, model, tokenizer, texts, max_length=max_length, token_budget=token_budget)
+        rows.append({
+            "model": name,
+            "docs_per_sec_fixed": len(texts) / t_fixed,
+            "docs_per_sec_dynamic": len(texts) / t_dyn,
+            "speedup": t_fixed / t_dyn if t_dyn else float("nan"),
+            "max_abs_prob_diff": float(np.max(np.abs(probs_fixed - probs_dyn))) if probs_fixed.size else 0.0,
+            "label_agreement": agreement(preds_fixed, preds_dyn),
+        })
+    return rows
+
+def gold_label_sets(series):
+    return [set(fa.split_labels(s)) for s in series.fillna("").astype(str).str.replace(";", fa.SEP)]
+
+def set_metrics(gold_sets, pred_sets, labels):
+    """Micro/weighted P/R/F1 of predicted vs. gold label sets (same averages as train_longformer.compute_metrics)."""
+    mlb = MultiLabelBinarizer(classes=labels)
+    y_true = mlb.fit_transform([g & set(labels) for g in gold_sets])
+    y_pred = mlb.transform(pred_sets)
+    metrics = {}
+    for avg in ("micro", "weighted"):
+        p, r, f1, _ = precision_recall_fscore_support(y_true, y_pred, average=avg, zero_division=0)
+        metrics.update({f"precision_{avg}": p, f"recall_{avg}": r, f"f1_{avg}": f1})
+    return metrics
+
+def compare_backend(texts, eval_df, backend, token_budget):
+    rows = []
+    for column, model, tokenizer, model_dir, max_length, id2label in (
+        ("LabelFrames", fa.model_label, fa.tokenizer_label, fa.LF_LABEL_DIR, fa.LF_LABEL_MAX_LENGTH, fa.id2label_label),
+        ("TopLabelFrames", fa.model_top, fa.tokenizer_top, fa.MP_TOP_DIR, 512, fa.id2label_top),
+    ):
+        alt_model = load_backend(model, tokenizer, model_dir, backend)
+        (probs_ref, preds_ref), t_ref = timed(predict_labels, model, tokenizer, texts, max_length=max_length, token_budget=token_budget)
+        (probs_alt, preds_alt), t_alt = timed(predict_labels, alt_model, tokenizer, texts, max_length=max_length, token_budget=token_budget)
+
+        if column == "LabelFrames":
+            decoded_ref = fa.decode_label_frames(probs_ref, preds_ref, id2label)
+            decoded_alt = fa.decode_label_frames(probs_alt, preds_alt, id2label)
+        else:
+            decoded_ref = fa.decode_top_frames(probs_ref, id2label)
+            decoded_alt = fa.decode_top_frames(probs_alt, id2label)
+        sets_ref = [set(fa.split_labels(s)) for s in decoded_ref]
+        sets_alt = [set(fa.split_labels(s)) for s in decoded_alt]
+
+        row = {
+            "model": column,
+            "backend": backend,
+            "speedup": t_ref / t_alt if t_alt else float("nan"),
+            "max_abs_prob_diff": float(np.max(np.abs(probs_ref - probs_alt))) if probs_ref.size else 0.0,
+            "label_set_disagreement": float(np.mean([a != b for a, b in zip(sets_ref, sets_alt)])) if texts else float("nan"),
+        }
+        if column in eval_df.columns:
+            gold = gold_label_sets(eval_df[column].iloc[:len(texts)])
+            labels = [id2label[i] for i in sorted(id2label)]
+            m_ref, m_alt = set_metrics(gold, sets_ref, labels), set_metrics(gold, sets_alt, labels)
+            for k in ("f1_micro", "f1_weighted", "precision_micro", "recall_micro"):
+                row[f"{k}_torch"] = m_ref[k]
+                row[f"delta_{k}"] = m_alt[k] - m_ref[k]
+        rows.append(row)
+    return rows
+
+def compare_chunked(texts, eval_df, token_budget, pooling="max", overlap=128):
+    rows = []
+    for column, model, tokenizer, max_length, id2label in (
+        ("LabelFrames", fa.model_label, fa.tokenizer_label, fa.LF_LABEL_MAX_LENGTH, fa.id2label_label),
+        ("TopLabelFrames", fa.model_top, fa.tokenizer_top, 512, fa.id2label_top),
+    ):
+        (probs_trunc, preds_trunc), t_trunc = timed(predict_labels, model, tokenizer, texts, max_length=max_length, token_budget=token_budget)
+        (probs_chunk, preds_chunk), t_chunk = timed(predict_labels_chunked, model, tokenizer, texts, max_length=max_length,
+                                                    token_budget=token_budget, overlap=overlap, pooling=pooling)
+        windows, owner = encode_windows(tokenizer, texts, max_length=max_length, overlap=overlap)
+        decode = (lambda p, b: fa.decode_label_frames(p, b, id2label)) if column == "LabelFrames" else (lambda p, b: fa.decode_top_frames(p, id2label))
+        sets_trunc = [set(fa.split_labels(s)) for s in decode(probs_trunc, preds_trunc)]
+        sets_chunk = [set(fa.split_labels(s)) for s in decode(probs_chunk, preds_chunk)]
+        row = {
+            "model": column,
+            "pooling": pooling,
+            "windows_per_doc": len(windows) / max(len(texts), 1),
+            "truncated_docs": float(np.mean(np.bincount(owner, minlength=len(texts)) > 1)) if texts else float("nan"),
+            "docs_per_sec_truncated": len(texts) / t_trunc,
+            "docs_per_sec_chunked": len(texts) / t_chunk,
+            "tokens_per_sec_chunked": sum(len(w) for w in windows) / t_chunk,
+            "label_set_agreement": float(np.mean([a == b for a, b in zip(sets_trunc, sets_chunk)])) if texts else float("nan"),
+        }
+        if column in eval_df.columns:
+            gold = gold_label_sets(eval_df[column].iloc[:len(texts)])
+            labels = [id2label[i] for i in sorted(id2label)]
+            m_trunc, m_chunk = set_metrics(gold, sets_trunc, labels), set_metrics(gold, sets_chunk, labels)
+            for k in ("f1_micro", "f1_weighted"):
+                row[f"{k}_truncated"] = m_trunc[k]
+                row[f"{k}_chunked"] = m_chunk[k]
+        rows.append(row)
+    return rows
+
+def format_rows(rows):
+    lines = []
+    for r in rows:
+        lines.append(" | ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in r.items()))
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="mode", required=True)
+    p_batch = sub.add_parser("batching", help="Fixed-size vs. length-sorted dynamic batching.")
+    p_batch.add_argument("--token-budget", type=int, default=4096)
+    p_backend = sub.add_parser("backend", help="fp32 PyTorch vs. int8 / ONNX Runtime parity on eval_data.csv.")
+    p_backend.add_argument("--backend", choices=["int8", "onnx"], required=True)
+    p_backend.add_argument("--token-budget", type=int, default=4096)
+    p_chunk = sub.add_parser("chunked", help="Truncation vs. sliding-window chunks pooled per article.")
+    p_chunk.add_argument("--token-budget", type=int, default=4096)
+    p_chunk.add_argument("--pooling", choices=["max", "mean"], default="max")
+    p_chunk.add_argument("--chunk-overlap", type=int, default=128)
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N rows of eval_data.csv.")
+    args = parser.parse_args()
+
+    t0 = time.time()
+    eval_df = fa.read_csv_robust(os.path.join(fa.DATA_DIR, "eval_data.csv"))
+    texts = eval_df["Text"].astype(str).tolist()[:args.limit]
+    print(f"Comparing on {len(texts)} rows of eval_data.csv")
+
+    if args.mode == "batching":
+        rows = compare_batching(texts, args.token_budget)
+        action = f"Compare fixed vs. dynamic batching (token_budget={args.token_budget})"
+    elif args.mode == "backend":
+        rows = compare_backend(texts, eval_df, args.backend, args.token_budget)
+        action = f"Backend parity: torch fp32 vs. {args.backend}"
+    elif args.mode == "chunked":
+        rows = compare_chunked(texts, eval_df, args.token_budget, pooling=args.pooling, overlap=args.chunk_overlap)
+        action = f"Truncation vs. chunked inference ({args.pooling} pooling, overlap={args.chunk_overlap})"
+
+    lines = format_rows(rows)
+    for line in lines:
+        print(line)
+    fa.log_to_readme(action, t0, notes=f"rows={len(texts)}; " + "; ".join(lines))
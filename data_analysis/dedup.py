@@ -0,0 +1,193 @@
+# dedup.py
+"""
+Near-duplicate articles (syndicated wire copy republished by several outlets).
+
+data_cleaning.R only drops exact URL duplicates. Here every article gets a MinHash
+signature over word 3-shingles of its TokenList column (the '|' separated tokens
+written by data_preparation.R; the Text column where it is missing), and an LSH
+index (bands of signature rows) finds candidate pairs in roughly linear time.
+Candidates whose estimated Jaccard similarity is ≥ --threshold are merged into
+clusters; the first article of each cluster is its representative.
+
+finetuned_analysis.py --dedup runs the models once per representative and copies
+the result to every member of its cluster.
+
+  python dedup.py leakage                # train_data.csv vs eval_data.csv → results/dedup/leakage.csv
+  python dedup.py report --threshold 0.8 # share of near-duplicate rows per cluster/outlet file
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+SEP = "|"
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 128
+SHINGLE = 3
+
+def token_lists(df):
+    """Token list per row: TokenList where present, else the lowercased Text split on whitespace."""
+    text = df["Text"].fillna("").astype(str) if "Text" in df.columns else pd.Series([""] * len(df), index=df.index)
+    fallback = text.str.lower().str.split()
+    if "TokenList" not in df.columns:
+        return fallback.tolist()
+    tokens = df["TokenList"].fillna("").astype(str)
+    return [t.split(SEP) if t.strip() else f for t, f in zip(tokens, fallback)]
+
+def shingle_hashes(tokens, k=SHINGLE):
+    """64-bit hashes of the distinct k-token shingles (the whole list if it is shorter than k)."""
+    tokens = [t for t in tokens if t]
+    if len(tokens) < k:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    return np.unique(pd.util.hash_array(np.asarray(grams, dtype=object)))
+
+def minhash_signatures(lists, num_perm=NUM_PERM, k=SHINGLE, seed=1, block=200000):
+    """(n, num_perm) uint32 MinHash signatures; permutation i is the multiply-shift hash (a_i * x + b_i) >> 32."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    sig = np.empty((len(lists), num_perm), dtype=np.uint32)
+    hashes = [shingle_hashes(t, k) for t in lists]
+    # Blocks of whole documents, so the (shingles × num_perm) matrix stays bounded
+    start = 0
+    while start < len(hashes):
+        stop, total = start, 0
+        while stop < len(hashes) and (stop == start or total + len(hashes[stop]) <= block):
+            total += len(hashes[stop])
+            stop += 1
+        x = np.concatenate(hashes[start:stop])
+        with np.errstate(over="ignore"):
+            permuted = ((x[:, None] * a + b) >> np.uint64(32)).astype(np.uint32)
+        offsets = np.cumsum([0] + [len(h) for h in hashes[start:stop - 1]])
+        sig[start:stop] = np.minimum.reduceat(permuted, offsets, axis=0)
+        start = stop
+    return sig
+
+def lsh_bands(num_perm, threshold, fp_weight=0.1):
+    """(bands, rows) with bands × rows ≤ num_perm minimising the weighted false-positive + false-negative area.
+
+    A pair with Jaccard s shares at least one band with probability 1 - (1 - s^rows)^bands.
+    Candidates are verified on the signatures afterwards, so false positives only cost
+    comparisons and missed pairs weigh more.
+    """
+    s = np.linspace(0, 1, 201)
+    def error(br):
+        p = 1 - (1 - s ** br[1]) ** br[0]
+        below = s <= threshold
+        return fp_weight * np.trapezoid(np.where(below, p, 0), s) + (1 - fp_weight) * np.trapezoid(np.where(below, 0, 1 - p), s)
+    return min(((b, num_perm // b) for b in range(1, num_perm + 1)), key=error)
+
+def find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def near_duplicate_clusters(sig, threshold=DEFAULT_THRESHOLD, max_bucket=64):
+    """Representative row (smallest index of its cluster) per row of a signature matrix.
+
+    Pairs are only verified inside LSH buckets (all pairs for buckets up to
+    max_bucket rows, against the first member above that), so the work stays
+    roughly linear in the number of rows.
+    """
+    n, num_perm = sig.shape
+    bands, rows = lsh_bands(num_perm, threshold)
+    parent = np.arange(n)
+    for band in range(bands):
+        keys = pd.util.hash_pandas_object(pd.DataFrame(sig[:, band * rows:(band + 1) * rows]), index=False).to_numpy()
+        order = np.argsort(keys, kind="stable")
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        for bucket in np.split(order, bounds):
+            if len(bucket) < 2:
+                continue
+            if len(bucket) <= max_bucket:
+                block = sig[bucket]
+                pairs = np.argwhere(np.triu((block[:, None] == block[None]).mean(axis=2) >= threshold, k=1))
+            else:
+                similar = (sig[bucket[1:]] == sig[bucket[0]]).mean(axis=1) >= threshold
+                pairs = np.column_stack([np.zeros(similar.sum(), dtype=int), 1 + np.flatnonzero(similar)])
+            for a, b in pairs:
+                ri, rj = find(parent, bucket[a]), find(parent, bucket[b])
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+    return np.array([find(parent, i) for i in range(n)])
+
+def representatives(lists, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, k=SHINGLE):
+    """(keep, inverse): rows to run the models on, and for every row its position in keep."""
+    if len(lists) < 2:
+        return np.arange(len(lists)), np.arange(len(lists))
+    rep = near_duplicate_clusters(minhash_signatures(lists, num_perm, k), threshold)
+    keep, inverse = np.unique(rep, return_inverse=True)
+    return keep, inverse
+
+def leakage(data_dir, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, k=SHINGLE):
+    """eval_data.csv rows with a near-duplicate in train_data.csv, one line per (eval, train) pair."""
+    train = pd.read_csv(os.path.join(data_dir, "train_data.csv"))
+    evals = pd.read_csv(os.path.join(data_dir, "eval_data.csv"))
+    sig = minhash_signatures(token_lists(train) + token_lists(evals), num_perm, k)
+    rep = near_duplicate_clusters(sig, threshold)
+    n_train = len(train)
+    train_rows = pd.Series(np.arange(n_train)).groupby(rep[:n_train]).agg(list)
+    records = []
+    for j, r in enumerate(rep[n_train:]):
+        for i in train_rows.get(r, []):
+            records.append({
+                "eval_row": j, "train_row": i,
+                "similarity": float((sig[n_train + j] == sig[i]).mean()),
+                "eval_url": evals["URL"].iloc[j] if "URL" in evals.columns else None,
+                "train_url": train["URL"].iloc[i] if "URL" in train.columns else None,
+            })
+    return pd.DataFrame(records, columns=["eval_row", "train_row", "similarity", "eval_url", "train_url"]), len(train), len(evals)
+
+def duplicate_report(paths, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, k=SHINGLE):
+    """Rows, clusters and the share of model calls --dedup saves, per file."""
+    records = []
+    for path in paths:
+        df = pd.read_csv(path, usecols=lambda c: c in ("Text", "TokenList"))
+        keep, _ = representatives(token_lists(df), threshold, num_perm, k)
+        records.append({"file": os.path.basename(path), "rows": len(df), "representatives": len(keep),
+                        "saved": 1 - len(keep) / len(df) if len(df) else 0.0})
+    return pd.DataFrame(records, columns=["file", "rows", "representatives", "saved"])
+
+def parse_args():
+    import finetuned_analysis as fa  # imports this module, so not at the top
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    fa.add_path_args(parser)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Estimated Jaccard similarity of near-duplicates.")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM, help="MinHash permutations (signature length).")
+    parser.add_argument("--shingle", type=int, default=SHINGLE, help="Tokens per shingle.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("leakage", help="Near-duplicates shared by train_data.csv and eval_data.csv.")
+    p_report = sub.add_parser("report", help="Near-duplicate share per *_tokenized.csv file in --data-dir.")
+    p_report.add_argument("files", nargs="*", help="Defaults to every *_tokenized.csv in --data-dir.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    import finetuned_analysis as fa
+
+    args = parse_args()
+    fa.apply_path_args(args)
+    t0 = time.perf_counter()
+    results_dir = os.path.join(fa.RESULTS_DIR, "dedup")
+    os.makedirs(results_dir, exist_ok=True)
+    if args.command == "leakage":
+        pairs, n_train, n_eval = leakage(fa.DATA_DIR, args.threshold, args.num_perm, args.shingle)
+        out = os.path.join(results_dir, "leakage.csv")
+        pairs.to_csv(out, index=False)
+        leaked = pairs["eval_row"].nunique()
+        print(f"{leaked}/{n_eval} eval_data.csv rows ({leaked / max(n_eval, 1):.1%}) have a near-duplicate among "
+              f"{n_train} train_data.csv rows ({len(pairs)} pairs, threshold {args.threshold:g}) → {out}")
+    else:
+        files = args.files or sorted(os.path.join(fa.DATA_DIR, f) for f in os.listdir(fa.DATA_DIR) if f.endswith("_tokenized.csv"))
+        report = duplicate_report(files, args.threshold, args.num_perm, args.shingle)
+        out = os.path.join(results_dir, "duplicate_report.csv")
+        report.to_csv(out, index=False)
+        print(report.round(4).to_string(index=False))
+        print(f"Saved → {out}")
+    print(f"{time.perf_counter() - t0:.1f}s")
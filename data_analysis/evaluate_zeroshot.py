@@ -1,27 +1,53 @@
 # evaluate_zeroshot.py
+"""
+Zero-shot (NLI) baseline for TopLabelFrames and LabelFrames on /data/eval_data.csv.
+
+Two engines:
+  - pipeline: the transformers zero-shot pipeline, one call per text (original path, 200-row subset)
+  - batched:  BatchedZeroShot feeds all (premise, hypothesis) pairs through the NLI model in
+              length-sorted padded batches; each premise and each hypothesis is tokenized once.
+              With --shortlist-k, a cheap embedding-similarity stage keeps only the top-k
+              candidate labels per article before NLI, which makes the fine-grained
+              LabelFrames set practical on the full eval file.
+Scores follow the pipeline: premises are truncated the same way (only_first, at the
+tokenizer's model_max_length, 1024 for bart-large-mnli), then softmax over entailment
+logits across labels (single-label) or entailment vs. contradiction per label (multi-label).
+
+Stage timings (read_csv, shortlist, tokenize, pad, forward, write_csv, per batch with
+token counts and padding ratio) go to results/metrics/evaluate_zeroshot.jsonl
+(see profiling.py).
+"""
 
 import os
 import time
+import argparse
 import platform
 from datetime import datetime
 
 import pandas as pd
 import numpy as np
-from transformers import pipeline
+from transformers import pipeline, AutoTokenizer, AutoModel, AutoModelForSequenceClassification
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+from sklearn.preprocessing import MultiLabelBinarizer
 import torch
 
+from inference import plan_token_batches
+from profiling import add_profiling_args, configure_from_args, format_summary, get_profiler, token_stats
+
 # Paths
 BASE_DIR = os.path.abspath("/Users/davidluu/Model Training & Performance Testing")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 RESULTS_DIR = os.path.join(BASE_DIR, "results")
 README_MD = os.path.join(BASE_DIR, "READme.md")
+METRICS_PATH = os.path.join(RESULTS_DIR, "metrics", "evaluate_zeroshot.jsonl")
 
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
 # Constants & Helpers
 SEP = "|"
 NLI_MODEL = "facebook/bart-large-mnli"
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+HYPOTHESIS_TEMPLATE = "This example is {}."
 
 def split_labels(s: str):
     return [l.strip() for l in str(s).split(SEP) if l.strip()]
@@ -55,21 +81,153 @@ def log_to_readme(action: str, started_at: float, notes: str = ""):
     try:
         with open(README_MD, "a", encoding="utf-8") as f:
             f.write(text)
-    except Exception:
-        pass
+    except OSError as e:
+        print(f"Could not append run log to {README_MD}: {e}")
+
+class BatchedZeroShot:
+    """NLI zero-shot classification over many (premise, hypothesis) pairs per forward pass."""
+
+    def __init__(self, model_name=NLI_MODEL, device="cpu", token_budget=16384, max_length=None, hypothesis_template=HYPOTHESIS_TEMPLATE):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name).to(device).eval()
+        self.device = device
+        self.token_budget = token_budget
+        # The pipeline truncates at model_max_length; tokenizers without one get a huge sentinel value
+        if max_length is None:
+            max_length = self.tokenizer.model_max_length
+            if max_length > 1_000_000:
+                max_length = self.model.config.max_position_embeddings
+        self.max_length = max_length
+        self.hypothesis_template = hypothesis_template
+        self.entailment_id = next((i for lab, i in self.model.config.label2id.items() if lab.lower().startswith("entail")), -1)
+        self.contradiction_id = -1 if self.entailment_id == 0 else 0
+        self.num_special = self.tokenizer.num_special_tokens_to_add(pair=True)
+        self._hypothesis_ids = {}
+
+    def hypothesis_ids(self, label):
+        if label not in self._hypothesis_ids:
+            text = self.hypothesis_template.format(label)
+            self._hypothesis_ids[label] = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        return self._hypothesis_ids[label]
+
+    def premise_length(self, premise_len, label):
+        """Premise tokens kept next to this label's hypothesis (only_first truncation)."""
+        return min(premise_len, max(self.max_length - len(self.hypothesis_ids(label)) - self.num_special, 1))
+
+    def pair_ids(self, premise_ids, t_idx, label):
+        h_ids = self.hypothesis_ids(label)
+        return self.tokenizer.build_inputs_with_special_tokens(premise_ids[t_idx][:self.premise_length(len(premise_ids[t_idx]), label)], h_ids)
+
+    def pair_logits(self, premise_ids, pairs):
+        """pairs: list of (text index, label); returns NLI logits per pair.
+
+        Batches are planned from pair lengths; each batch's input_ids are built when it runs,
+        so memory does not grow with rows × labels.
+        """
+        prof = get_profiler()
+        lengths = [self.premise_length(len(premise_ids[t_idx]), label) + len(self.hypothesis_ids(label)) + self.num_special
+                   for t_idx, label in pairs]
+
+        logits = np.empty((len(pairs), self.model.config.num_labels), dtype=np.float32)
+        for batch in plan_token_batches(lengths, self.token_budget, max_batch_size=256):
+            with prof.stage("pad", rows=len(batch)):
+                input_ids = [self.pair_ids(premise_ids, *pairs[i]) for i in batch]
+                enc = self.tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="pt")
+            with prof.stage("forward", **token_stats(enc)), prof.trace_step():
+                enc = {k: v.to(self.device) for k, v in enc.items()}
+                with torch.no_grad():
+                    logits[batch] = self.model(**enc).logits.float().cpu().numpy()
+        return logits
 
-def evaluate_level(df, column_name, candidate_labels, multi_label=False, subset_size=200, clf=None):
+    def classify(self, texts, candidate_labels, multi_label=False):
+        """candidate_labels: one list for all texts, or one list per text (e.g. a shortlist).
+        Returns pipeline-style dicts {"labels": [...], "scores": [...]} sorted by score."""
+        per_text = candidate_labels if candidate_labels and isinstance(candidate_labels[0], (list, tuple)) else [candidate_labels] * len(texts)
+        with get_profiler().stage("tokenize", rows=len(texts)):
+            # No pair keeps more than max_length premise tokens
+            premise_ids = [ids[:self.max_length] for ids in self.tokenizer(list(texts), add_special_tokens=False, verbose=False)["input_ids"]]
+        pairs = [(t_idx, lab) for t_idx, labs in enumerate(per_text) for lab in labs]
+        logits = self.pair_logits(premise_ids, pairs)
+
+        results, start = [], 0
+        for labs in per_text:
+            chunk = logits[start:start + len(labs)]
+            start += len(labs)
+            if multi_label or len(labs) == 1:
+                ec = chunk[:, [self.contradiction_id, self.entailment_id]]
+                ec = ec - ec.max(-1, keepdims=True)
+                scores = np.exp(ec)[:, 1] / np.exp(ec).sum(-1)
+            else:
+                entail = chunk[:, self.entailment_id]
+                scores = np.exp(entail - entail.max()) / np.exp(entail - entail.max()).sum()
+            order = np.argsort(scores)[::-1]
+            results.append({"labels": [labs[i] for i in order], "scores": scores[order].tolist()})
+        return results
+
+class LabelShortlister:
+    """Cheap first stage: cosine similarity of mean-pooled sentence embeddings, article vs. label name."""
+
+    def __init__(self, model_name=EMBED_MODEL, device="cpu", batch_size=64, max_length=256):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(device).eval()
+        self.device = device
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def embed(self, texts):
+        out = []
+        for i in range(0, len(texts), self.batch_size):
+            enc = self.tokenizer(texts[i:i+self.batch_size], truncation=True, padding=True, max_length=self.max_length, return_tensors="pt")
+            enc = {k: v.to(self.device) for k, v in enc.items()}
+            with torch.no_grad():
+                hidden = self.model(**enc)[0]
+            mask = enc["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            emb = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            out.append(torch.nn.functional.normalize(emb, dim=-1).float().cpu().numpy())
+        return np.vstack(out) if out else np.empty((0, 0), dtype=np.float32)
+
+    def shortlist(self, texts, candidate_labels, k):
+        sims = self.embed(list(texts)) @ self.embed(list(candidate_labels)).T
+        top = np.argsort(-sims, axis=1)[:, :k]
+        return [[candidate_labels[j] for j in row] for row in top]
+
+def multilabel_set_metrics(true_labels, preds, candidate_labels):
+    mlb = MultiLabelBinarizer(classes=candidate_labels)
+    y_true = mlb.fit_transform([[l for l in split_labels(t) if l in mlb.classes] for t in true_labels])
+    y_pred = mlb.transform([[l for l in split_labels(p) if l in mlb.classes] for p in preds])
+    _, _, f1_micro, _ = precision_recall_fscore_support(y_true, y_pred, average="micro", zero_division=0)
+    _, _, f1_w, _ = precision_recall_fscore_support(y_true, y_pred, average="weighted", zero_division=0)
+    return {"f1_micro_multilabel": round(f1_micro, 4), "f1_weighted_multilabel": round(f1_w, 4)}
+
+def evaluate_level(df, column_name, candidate_labels, multi_label=False, subset_size=200, clf=None, engine=None, shortlister=None, shortlist_k=0):
     print(f"\n--- Evaluating {column_name} ---")
-    if len(candidate_labels) > 500 and multi_label:
+    if engine is None and len(candidate_labels) > 500 and multi_label:
         print(f"{len(candidate_labels)} fine-grained labels is too many for meaningful zero-shot evaluation. Skipping metrics.")
         subset_size = min(subset_size, 50)
 
     texts = df["Text"].astype(str).tolist()[:subset_size]
     true_labels = df[column_name].astype(str).tolist()[:subset_size]
+    subset_size = len(texts)
+    prof = get_profiler()
+
+    if engine is not None:
+        labels_per_text = candidate_labels
+        if shortlister is not None and 0 < shortlist_k < len(candidate_labels):
+            print(f"Shortlisting top-{shortlist_k} of {len(candidate_labels)} labels per text...")
+            with prof.stage("shortlist", rows=len(texts), labels=len(candidate_labels), k=shortlist_k):
+                labels_per_text = shortlister.shortlist(texts, candidate_labels, shortlist_k)
+        with prof.stage("classify", rows=len(texts)):
+            results = engine.classify(texts, labels_per_text, multi_label=multi_label)
+    else:
+        results = []
+        for i, txt in enumerate(texts):
+            with prof.stage("pipeline_call", labels=len(candidate_labels)), prof.trace_step():
+                results.append(clf(txt, candidate_labels, multi_label=multi_label))
+            if (i + 1) % 20 == 0:
+                print(f"Processed {i+1}/{subset_size} texts...")
 
     preds, scores = [], []
-    for i, txt in enumerate(texts):
-        res = clf(txt, candidate_labels, multi_label=multi_label)
+    for res in results:
         if multi_label:
             threshold = 0.3
             chosen = [lab for lab, sc in zip(res["labels"], res["scores"]) if sc > threshold]
@@ -78,8 +236,6 @@ def evaluate_level(df, column_name, candidate_labels, multi_label=False, subset_
         else:
             preds.append(res["labels"][0])
             scores.append(float(res["scores"][0]))
-        if (i + 1) % 20 == 0:
-            print(f"Processed {i+1}/{subset_size} texts...")
 
     label_to_idx = {lab: idx for idx, lab in enumerate(candidate_labels)}
     y_true_idx = np.array([label_to_idx.get(str(t).split(SEP)[0], -1) for t in true_labels])
@@ -89,9 +245,10 @@ def evaluate_level(df, column_name, candidate_labels, multi_label=False, subset_
     out[f"{column_name}_zs_pred"] = preds
     out[f"{column_name}_zs_score"] = scores
     out_path = os.path.join(RESULTS_DIR, f"zs_eval_subset_{column_name}.csv")
-    out.to_csv(out_path, index=False)
+    with prof.stage("write_csv", rows=len(out)):
+        out.to_csv(out_path, index=False)
 
-    if len(candidate_labels) > 500 and multi_label:
+    if engine is None and len(candidate_labels) > 500 and multi_label:
         print(f"Saved {column_name} predictions to {out_path}")
         return None
 
@@ -105,14 +262,36 @@ def evaluate_level(df, column_name, candidate_labels, multi_label=False, subset_
         "recall_weighted": round(r, 4),
         "f1_weighted": round(f1, 4),
     }
+    if multi_label:
+        metrics.update(multilabel_set_metrics(true_labels, preds, candidate_labels))
+    metrics["rows"] = subset_size
     print(metrics)
     return metrics, out_path
 
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=["batched", "pipeline"], default="batched",
+                        help="batched NLI pairs (default) or the original per-text transformers pipeline.")
+    parser.add_argument("--subset-size", type=int, default=None,
+                        help="Rows of eval_data.csv to score (default: all for batched, 200 for pipeline).")
+    parser.add_argument("--shortlist-k", type=int, default=20,
+                        help="Batched engine: keep the top-k labels per article by embedding similarity before NLI "
+                             "(applied when a level has more than k labels; 0 disables).")
+    parser.add_argument("--token-budget", type=int, default=16384,
+                        help="Batched engine: max padded tokens per NLI forward pass.")
+    parser.add_argument("--nli-model", default=NLI_MODEL)
+    parser.add_argument("--embed-model", default=EMBED_MODEL)
+    add_profiling_args(parser, METRICS_PATH)
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     t0 = time.time()
+    prof = configure_from_args(args, "evaluate_zeroshot")
 
-    train_df = pd.read_csv(os.path.join(DATA_DIR, "train_data.csv"))
-    eval_df = pd.read_csv(os.path.join(DATA_DIR, "eval_data.csv"))
+    with prof.stage("read_csv"):
+        train_df = pd.read_csv(os.path.join(DATA_DIR, "train_data.csv"))
+        eval_df = pd.read_csv(os.path.join(DATA_DIR, "eval_data.csv"))
 
     # Delimiter normalization
     for df in (train_df, eval_df):
@@ -130,27 +309,48 @@ if __name__ == "__main__":
     print(f"Using device: {'GPU/MPS' if device == 0 else 'CPU'}")
 
     # Zero-shot classifier (NLI)
-    classifier = pipeline("zero-shot-classification", model=NLI_MODEL, device=device)
-    print("Loaded zero-shot pipeline:", NLI_MODEL)
+    classifier, engine, shortlister = None, None, None
+    if args.engine == "pipeline":
+        subset_size = args.subset_size or 200
+        classifier = pipeline("zero-shot-classification", model=args.nli_model, device=device)
+        print("Loaded zero-shot pipeline:", args.nli_model)
+    else:
+        subset_size = args.subset_size or len(eval_df)
+        torch_device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
+        engine = BatchedZeroShot(args.nli_model, device=torch_device, token_budget=args.token_budget)
+        print("Loaded batched zero-shot engine:", args.nli_model)
+        if args.shortlist_k > 0:
+            shortlister = LabelShortlister(args.embed_model, device=torch_device)
+            print("Loaded label shortlister:", args.embed_model)
 
     top_labels = sorted({lab for labs in train_df["TopLabelFrames"].fillna("") for lab in split_labels(labs)})
     fine_labels = sorted({lab for labs in train_df["LabelFrames"].fillna("") for lab in split_labels(labs)})
 
     notes = []
     if "TopLabelFrames" in eval_df.columns:
-        m_top = evaluate_level(eval_df, "TopLabelFrames", top_labels, multi_label=False, subset_size=200, clf=classifier)
+        with prof.tagged(level="TopLabelFrames"):
+            m_top = evaluate_level(eval_df, "TopLabelFrames", top_labels, multi_label=False, subset_size=subset_size,
+                                   clf=classifier, engine=engine, shortlister=shortlister, shortlist_k=args.shortlist_k)
         if m_top:
             metrics, path = m_top
             notes.append(f"TopLabelFrames zshot: {metrics} (saved {path})")
 
     if "LabelFrames" in eval_df.columns:
-        m_fine = evaluate_level(eval_df, "LabelFrames", fine_labels, multi_label=True, subset_size=200, clf=classifier)
+        with prof.tagged(level="LabelFrames"):
+            m_fine = evaluate_level(eval_df, "LabelFrames", fine_labels, multi_label=True, subset_size=subset_size,
+                                    clf=classifier, engine=engine, shortlister=shortlister, shortlist_k=args.shortlist_k)
         if m_fine:
             metrics, path = m_fine
             notes.append(f"LabelFrames zshot: {metrics} (saved {path})")
 
+    stages = prof.summary()
+    if prof.path:
+        notes.append(f"slowest stages: {format_summary(stages)} (metrics → {prof.path})")
+    prof.close()
+
     log_to_readme(
-        action="Zero-shot evaluation (facebook/bart-large-mnli)",
+        action=f"Zero-shot evaluation ({args.nli_model}, engine={args.engine}"
+               + (f", shortlist_k={args.shortlist_k})" if engine is not None else ")"),
         started_at=t0,
         notes="; ".join(notes)
     )
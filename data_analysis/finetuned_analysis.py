@@ -13,34 +13,124 @@ Writes columns:
   - LabelFrames_pred (multi-label, '|' delimited; falls back to argmax if none ≥ threshold)
   - TopLabelFrames_pred (single best label)
 Also appends a run log to READme.md.
+
+Probabilities are stored in results/prediction_cache.sqlite (keyed by text hash +
+model fingerprint + max_length), so articles shared between cluster files are only
+inferred once and re-runs are nearly free. Disable with --no-cache.
+
+Batches are packed by token length up to --token-budget tokens (see inference.py),
+so short articles are no longer padded to the longest article in file order.
+
+--multitask uses the shared-encoder Longformer (results/longformer/trained_models/
+longformer_multitask, see multitask.py) for both columns in a single forward pass.
+
+--stream reads each file in --chunk-rows chunks (only STREAM_COLUMNS), appends the
+predictions of every chunk to the output (row, URL, Date + prediction columns) and
+keeps a <output>.ckpt.json offset, so a crashed run resumes where it stopped.
+
+--workers N shards rows across N forked CPU workers (see parallel_inference.py);
+--scaling-scan first measures docs/sec for 1, 2, 4, … N workers and adds the
+table to the run log.
+
+--pipeline tokenizes/pads the next batches on background threads while the current
+forward pass runs (bounded queues, see inference.predict_labels_pipelined) and runs
+the Longformer and MPNet passes concurrently instead of one after the other; batches
+and outputs are identical to the default path.
+
+--backend int8|onnx runs the same models through dynamic int8 quantization or
+onnxruntime (see backends.py); check parity first with compare_inference.py backend.
+
+--output-format parquet writes results/<name>.parquet instead of a full copy of the
+CSV: row, key, URL, Date, both prediction columns and the float16 probability
+matrices with label names in the metadata (see prediction_output.py), so results
+can be re-thresholded later without running the models again.
+
+--chunked classifies whole articles instead of the first 1024/512 tokens: each
+article becomes overlapping windows (--chunk-overlap) that are packed into full
+batches, and the window logits are max- or mean-pooled per article (--pooling);
+see inference.predict_labels_chunked and `python compare_inference.py chunked`.
+
+--dedup groups near-duplicate articles (syndicated wire copy) per file, or per
+chunk with --stream, by MinHash/LSH over the TokenList column (see dedup.py), runs
+the models on one representative per group and copies its predictions to the
+other members; `python dedup.py leakage` checks train/eval overlap.
+
+--cascade scores every article with the TF-IDF + linear model from cascade.py
+(python cascade.py train) and only sends articles inside the --band uncertainty band
+(or with a TopLabelFrames margin below --top-margin) to Longformer/MPNet; a `routed`
+column marks the rows the transformers scored. `python cascade.py report` measures
+the routed fraction, speedup and agreement with the transformer-only output on
+eval_data.csv.
+
+Inputs default to the cluster files + train/eval_data.csv under --data-dir; --files
+takes glob patterns instead (relative to --data-dir), --list prints the matched files
+and --dry-run their rows and estimated tokens, without loading any model. --tasks
+label|top runs one model only. Models are loaded on first use (memory-mapped
+safetensors weights), so a run served entirely from the prediction store never
+loads them; --label-model swaps in another LabelFrames folder (e.g. the
+`train_longformer.py search` winner; `student` for the distilled student).
+
+  python finetuned_analysis.py --dry-run --files "cluster1_*_t[1-5]_tokenized.csv"
+  python finetuned_analysis.py --tasks top --data-dir /data/gaza --results-dir /tmp/results
+
+Stage timings (read_csv, cache, tokenize, forward, sigmoid, decode, write_csv; per
+file and per batch, with token counts, padding ratio and peak memory) go to
+results/metrics/finetuned_analysis.jsonl (see profiling.py); --profile-batch N adds
+a torch profiler trace of the N-th forward batch.
 """
 
 import os
+import csv
+import glob
 import json
 import time
+import codecs
+import shutil
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import platform
 from datetime import datetime
+from importlib import metadata
 
-import torch
 import pandas as pd
 import numpy as np
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+# torch, transformers and the modules built on them (backends, cascade/sklearn, inference,
+# multitask, parallel_inference) are imported where they are used, so --list/--dry-run and
+# fully cached runs start without them
+from dedup import DEFAULT_THRESHOLD as DEDUP_THRESHOLD, representatives, token_lists
+from profiling import add_profiling_args, configure_from_args, format_summary, get_profiler
+from prediction_cache import PredictionCache, text_key, model_fingerprint
+from prediction_output import (decode_label_frames, decode_top_frames, label_array, part_path,
+                               predictions_table, remove_parts_from, write_table)
 
 # Paths
 BASE_DIR = os.path.abspath("/Users/davidluu/Model Training & Performance Testing")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 RESULTS_DIR = os.path.join(BASE_DIR, "results")
 README_MD = os.path.join(BASE_DIR, "READme.md")
+CACHE_PATH = os.path.join(RESULTS_DIR, "prediction_cache.sqlite")
+METRICS_PATH = os.path.join(RESULTS_DIR, "metrics", "finetuned_analysis.jsonl")
 
 # Model Folders & Label Maps (Longformer for LabelFrames, MPNet for TopLabelFrames)
 LF_LABEL_DIR = os.path.join(RESULTS_DIR, "longformer", "trained_models", "longformer_labelframes")
 MP_TOP_DIR   = os.path.join(RESULTS_DIR, "mpnet", "trained_models", "mpnet_topframes")
+LF_MULTITASK_DIR = os.path.join(RESULTS_DIR, "longformer", "trained_models", "longformer_multitask")
+# Distilled LabelFrames student (train_longformer.py distill): same layout, --label-model student for bulk labeling
+LF_STUDENT_DIR = os.path.join(RESULTS_DIR, "longformer", "trained_models", "longformer_labelframes_student")
 
 LF_LABEL_JSON = os.path.join(LF_LABEL_DIR, "label2id_longformer_labelframes.json")
 MP_TOP_JSON   = os.path.join(MP_TOP_DIR, "label2id_mpnet_topframes.json")
 
 # Constants & Helpers
 SEP = "|"
+ENCODINGS = ("utf-8", "utf-8-sig", "latin-1", "cp1252")
+STREAM_COLUMNS = ["URL", "Date", "Text"]
+TASKS = ("label", "top")
+BACKENDS = ("torch", "int8", "onnx")  # backends.BACKENDS, without importing torch for --list/--dry-run
+TOKENS_PER_WORD = 1.3  # BPE tokens per whitespace word in English news text, for --dry-run estimates
 
 def split_labels(s: str):
     return [l.strip() for l in str(s).split(SEP) if l.strip()]
@@ -48,10 +138,11 @@ def split_labels(s: str):
 def join_labels(labels):
     return SEP.join(labels)
 
-def get_ver(mod, attr="__version__"):
+def get_ver(dist):
+    # From the installed package metadata, so logging a cached run does not import torch/transformers
     try:
-        return getattr(mod, attr)
-    except Exception:
+        return metadata.version(dist)
+    except metadata.PackageNotFoundError:
         return "n/a"
 
 def hms(seconds: float):
@@ -60,20 +151,16 @@ def hms(seconds: float):
     return f"{h:02d}:{m:02d}:{s:02d}"
 
 def log_to_readme(action: str, started_at: float, notes: str = ""):
-    try:
-        import torch as _torch, transformers, pandas as _pd, numpy as _np
-    except Exception:
-        _torch = transformers = _pd = _np = None
     finished_at = time.time()
     lines = [
         f"## [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {action}",
         f"- Duration: {hms(finished_at - started_at)}",
         f"- Host: {platform.node()} — Python {platform.python_version()} ({platform.platform()})",
         "- Package versions:",
-        f"  - torch: {get_ver(_torch)}",
-        f"  - transformers: {get_ver(transformers)}",
-        f"  - pandas: {get_ver(_pd)}",
-        f"  - numpy: {get_ver(_np)}",
+        f"  - torch: {get_ver('torch')}",
+        f"  - transformers: {get_ver('transformers')}",
+        f"  - pandas: {get_ver('pandas')}",
+        f"  - numpy: {get_ver('numpy')}",
         f"- Notes: {notes}" if notes else "",
         "\n---\n",
     ]
@@ -81,43 +168,142 @@ def log_to_readme(action: str, started_at: float, notes: str = ""):
     try:
         with open(README_MD, "a", encoding="utf-8") as f:
             f.write(text)
-    except Exception:
-        pass
-
-def read_csv_robust(path: str) -> pd.DataFrame:
-    """Try multiple encodings to avoid UnicodeDecodeError."""
-    for enc in ("utf-8", "utf-8-sig", "latin-1", "cp1252"):
+    except OSError as e:
+        print(f"Could not append run log to {README_MD}: {e}")
+
+def detect_encoding(path: str, sample_bytes: int = 1 << 20) -> str:
+    """Pick the first encoding that decodes a sample of the file (instead of re-parsing the whole file per attempt)."""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    for enc in ENCODINGS:
         try:
-            return pd.read_csv(path, encoding=enc)
+            # Incremental decoder: a multi-byte char cut at the sample boundary is not an error
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+            return enc
         except UnicodeDecodeError:
             continue
-    # Replace errors
-    return pd.read_csv(path, encoding="utf-8", errors="replace")
-
-# Validate models
-if not os.path.exists(LF_LABEL_DIR):
-    raise FileNotFoundError(f"Longformer LabelFrames model folder not found: {LF_LABEL_DIR}")
-if not os.path.exists(MP_TOP_DIR):
-    raise FileNotFoundError(f"MPNet TopLabelFrames model folder not found: {MP_TOP_DIR}")
-
-# Load Label Maps & Models
-with open(LF_LABEL_JSON, "r") as f:
-    label2id_label = json.load(f)
-id2label_label = {int(v): k for k, v in label2id_label.items()}
-
-with open(MP_TOP_JSON, "r") as f:
-    label2id_top = json.load(f)
-id2label_top = {int(v): k for k, v in label2id_top.items()}
-
-tokenizer_label = AutoTokenizer.from_pretrained(LF_LABEL_DIR, use_fast=True)
-model_label = AutoModelForSequenceClassification.from_pretrained(LF_LABEL_DIR)
-tokenizer_top = AutoTokenizer.from_pretrained(MP_TOP_DIR, use_fast=False)
-model_top = AutoModelForSequenceClassification.from_pretrained(MP_TOP_DIR)
-
-device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
-model_label.to(device).eval()
-model_top.to(device).eval()
-print(f"Using device: {device} (Longformer for LabelFrames, MPNet for TopLabelFrames)")
+    return "utf-8"
+
+def read_csv_robust(path: str, **kwargs) -> pd.DataFrame:
+    """Detect the encoding once on a sample; undecodable bytes past the sample are replaced."""
+    return pd.read_csv(path, encoding=detect_encoding(path), encoding_errors="replace", **kwargs)
+
+def iter_csv_chunks(path: str, chunk_rows: int, columns=None):
+    """Yield DataFrame chunks of chunk_rows rows, reading only `columns` (if present in the file)."""
+    usecols = (lambda c: c in columns) if columns else None
+    return read_csv_robust(path, usecols=usecols, chunksize=chunk_rows)
+
+def set_paths(data_dir=None, results_dir=None, label_model=None):
+    """Point the input/output folders and the LabelFrames model somewhere else (before any model is loaded)."""
+    global DATA_DIR, RESULTS_DIR, README_MD, CACHE_PATH, METRICS_PATH, LF_LABEL_DIR, MP_TOP_DIR, LF_MULTITASK_DIR, LF_STUDENT_DIR, LF_LABEL_JSON, MP_TOP_JSON
+    if data_dir:
+        DATA_DIR = os.path.abspath(data_dir)
+    if results_dir:
+        RESULTS_DIR = os.path.abspath(results_dir)
+        README_MD = os.path.join(RESULTS_DIR, "READme.md")
+        CACHE_PATH = os.path.join(RESULTS_DIR, "prediction_cache.sqlite")
+        METRICS_PATH = os.path.join(RESULTS_DIR, "metrics", "finetuned_analysis.jsonl")
+        LF_LABEL_DIR = os.path.join(RESULTS_DIR, "longformer", "trained_models", "longformer_labelframes")
+        MP_TOP_DIR = os.path.join(RESULTS_DIR, "mpnet", "trained_models", "mpnet_topframes")
+        LF_MULTITASK_DIR = os.path.join(RESULTS_DIR, "longformer", "trained_models", "longformer_multitask")
+        LF_STUDENT_DIR = os.path.join(RESULTS_DIR, "longformer", "trained_models", "longformer_labelframes_student")
+    if label_model == "student":
+        LF_LABEL_DIR = LF_STUDENT_DIR
+    elif label_model:
+        LF_LABEL_DIR = os.path.abspath(label_model)
+    LF_LABEL_JSON = os.path.join(LF_LABEL_DIR, "label2id_longformer_labelframes.json")
+    MP_TOP_JSON = os.path.join(MP_TOP_DIR, "label2id_mpnet_topframes.json")
+
+def metrics_path(script):
+    return os.path.join(RESULTS_DIR, "metrics", f"{script}.jsonl")
+
+def add_path_args(parser):
+    """--data-dir/--results-dir for the scripts built on this module; apply them with apply_path_args."""
+    parser.add_argument("--data-dir", default=None, help=f"Input folder (default: {DATA_DIR}).")
+    parser.add_argument("--results-dir", default=None,
+                        help=f"Models, prediction store, metrics and outputs (default: {RESULTS_DIR}).")
+
+def apply_path_args(args, script=None, label_model=None):
+    """set_paths from the parsed arguments; a --metrics left at its default moves along with --results-dir."""
+    default_metrics = metrics_path(script) if script else None
+    set_paths(args.data_dir, args.results_dir, label_model)
+    if script and args.metrics == default_metrics:
+        args.metrics = metrics_path(script)
+
+# Models (loaded on first use)
+_loaded = {}
+_load_lock = threading.Lock()
+
+def get_device():
+    if "device" not in _loaded:
+        import torch
+        _loaded["device"] = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    return _loaded["device"]
+
+def read_id2label(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Label map not found: {path}")
+    with open(path, "r") as f:
+        return {int(v): k for k, v in json.load(f).items()}
+
+def configured_max_length(model_dir, cap):
+    """min(cap, model_max_length) from tokenizer_config.json, without loading the tokenizer."""
+    path = os.path.join(model_dir, "tokenizer_config.json")
+    if not os.path.exists(path):
+        return cap
+    with open(path, "r") as f:
+        return min(cap, int(json.load(f).get("model_max_length") or cap))
+
+def label_max_length():
+    # 1024 to match training; a distilled student (train_longformer.py distill) stores its shorter length in the tokenizer
+    return configured_max_length(LF_LABEL_DIR, 1024)
+
+def load_model(model_dir, use_fast=True, name="model"):
+    """(model, tokenizer) from a trained model folder, on the device in eval mode.
+
+    low_cpu_mem_usage skips the random init: the model.safetensors tensors are
+    memory-mapped and copied straight into the parameters.
+    """
+    if not os.path.exists(model_dir):
+        raise FileNotFoundError(f"{name} model folder not found: {model_dir}")
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    t0 = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, use_fast=use_fast)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir, low_cpu_mem_usage=True)
+    model.to(get_device()).eval()
+    print(f"Loaded {name} from {model_dir} on {get_device()} in {time.perf_counter() - t0:.1f}s")
+    return model, tokenizer
+
+def label_task():
+    """(model, tokenizer) of the LabelFrames Longformer."""
+    with _load_lock:
+        if "label" not in _loaded:
+            _loaded["label"] = load_model(LF_LABEL_DIR, use_fast=True, name="Longformer LabelFrames")
+        return _loaded["label"]
+
+def top_task():
+    """(model, tokenizer) of the TopLabelFrames MPNet."""
+    with _load_lock:
+        if "top" not in _loaded:
+            _loaded["top"] = load_model(MP_TOP_DIR, use_fast=False, name="MPNet TopLabelFrames")
+        return _loaded["top"]
+
+# Module attributes used by compare_inference.py and cascade.py, resolved on first access
+_LAZY_ATTRS = {
+    "model_label": lambda: label_task()[0],
+    "tokenizer_label": lambda: label_task()[1],
+    "model_top": lambda: top_task()[0],
+    "tokenizer_top": lambda: top_task()[1],
+    "id2label_label": lambda: read_id2label(LF_LABEL_JSON),
+    "id2label_top": lambda: read_id2label(MP_TOP_JSON),
+    "LF_LABEL_MAX_LENGTH": label_max_length,
+    "device": get_device,
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        return _LAZY_ATTRS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # File list
 CLUSTER_FILES = [
@@ -158,62 +344,549 @@ CLUSTER_FILES = [
 
 CORE_FILES = ["train_data.csv", "eval_data.csv"]
 
-def predict_labels(model, tokenizer, texts, threshold=0.5, batch_size=4, max_length=512):
-    all_probs = []
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i+batch_size]
-        enc = tokenizer(batch_texts, truncation=True, padding=True, max_length=max_length, return_tensors="pt")
-        enc = {k: v.to(device) for k, v in enc.items()}
-        with torch.no_grad():
-            out = model(**enc)
-        logits = out.logits.cpu().numpy()
-        probs = 1 / (1 + np.exp(-logits))
-        all_probs.append(probs)
-    probs_all = np.vstack(all_probs) if len(all_probs) else np.empty((0, 0))
+def discover_files(patterns=None, data_dir=None):
+    """Input files: glob patterns relative to data_dir (absolute ones as given), each file once in pattern order.
+    Without patterns, the CLUSTER_FILES + CORE_FILES that exist."""
+    data_dir = data_dir or DATA_DIR
+    if not patterns:
+        return [p for p in (os.path.join(data_dir, f) for f in CLUSTER_FILES + CORE_FILES) if os.path.exists(p)]
+    found = []
+    for pattern in patterns:
+        if os.path.isabs(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [os.path.join(data_dir, m) for m in sorted(glob.glob(pattern, root_dir=data_dir))]
+        matches = [m for m in matches if os.path.isfile(m) and m not in found]
+        if not matches:
+            print(f"No new files match {pattern!r} in {data_dir}")
+        found += matches
+    return found
+
+def sample_words(path, sample_rows):
+    """Text words per row of the first sample_rows rows, the body bytes they span, the header bytes, and whether that was the whole file."""
+    encoding = detect_encoding(path)
+    consumed = [0]
+    def lines(f):
+        for line in f:
+            consumed[0] += len(line)
+            yield line.decode(encoding, errors="replace")
+    csv.field_size_limit(2 ** 31 - 1)  # an article is one field
+    with open(path, "rb") as f:
+        reader = csv.reader(lines(f))
+        header = next(reader, [])
+        header_bytes = consumed[0]
+        if "Text" not in header:
+            return np.zeros(0, dtype=int), 0, header_bytes, True
+        col = header.index("Text")
+        words = [len(r[col].split()) if col < len(r) else 0 for r in itertools.islice(reader, sample_rows)]
+        body_bytes = consumed[0] - header_bytes
+        whole = len(words) < sample_rows or next(reader, None) is None
+    return np.asarray(words, dtype=int), body_bytes, header_bytes, whole
+
+def dry_run(targets, tasks=TASKS, sample_rows=2000):
+    """Rows and estimated tokens per file (Text words × TOKENS_PER_WORD), and the tokens each task would see after truncation.
+
+    Only the first sample_rows rows are parsed; larger files are extrapolated from their size
+    (estimated=True), so the listing stays fast on the full corpus.
+    """
+    lengths = {"label": label_max_length(), "top": 512}
+    rows = []
+    for path in targets:
+        words, body_bytes, header_bytes, whole = sample_words(path, sample_rows)
+        est = (words * TOKENS_PER_WORD).astype(int) + 2
+        scale = 1.0 if whole else (os.path.getsize(path) - header_bytes) / max(body_bytes, 1)
+        fed = {task: int(np.minimum(est, lengths[task]).sum() * scale) for task in tasks}
+        rows.append({"file": os.path.basename(path), "rows": int(round(len(est) * scale)), "est_tokens": int(est.sum() * scale),
+                     **{f"{t}_tokens": v for t, v in fed.items()}, "estimated": not whole})
+    return pd.DataFrame(rows, columns=["file", "rows", "est_tokens"] + [f"{t}_tokens" for t in tasks] + ["estimated"])
+
+def predict_labels_cached(load, texts, cache=None, fingerprint=None, threshold=0.5, batch_size=4, max_length=512, token_budget=None, predict_fn=None):
+    """Same contract as predict_labels, but only runs the model on texts missing from the cache.
+
+    load() returns (model, tokenizer) and is only called on a cache miss.
+    """
+    if predict_fn is None:
+        from inference import predict_labels as predict_fn
+    if cache is None:
+        return predict_fn(*load(), texts, threshold=threshold, batch_size=batch_size, max_length=max_length, token_budget=token_budget)
+
+    prof = get_profiler()
+    with prof.stage("cache_get", rows=len(texts)) as rec:
+        keys = [text_key(t) for t in texts]
+        found = cache.get_many(fingerprint, keys)
+        rec["hits"] = len(found)
+    missing = {}
+    for key, txt in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = txt
+
+    if missing:
+        probs_new, _ = predict_fn(*load(), list(missing.values()), threshold=threshold, batch_size=batch_size, max_length=max_length, token_budget=token_budget)
+        new = dict(zip(missing.keys(), probs_new))
+        with prof.stage("cache_put", rows=len(new)):
+            cache.put_many(fingerprint, new)
+        found.update(new)
+    print(f"  cache: {len(keys) - len(missing)}/{len(keys)} rows served from store, {len(missing)} inferred")
+
+    probs_all = np.vstack([found[k] for k in keys]) if keys else np.empty((0, 0))
     binary_preds = (probs_all >= threshold).astype(int) if probs_all.size else np.empty((0, 0), dtype=int)
     return probs_all, binary_preds
 
+def inference_fn(name, **kwargs):
+    """inference.<name> with kwargs bound, imported on the first call (the module imports torch)."""
+    def predict(*args, **kw):
+        import inference
+        return getattr(inference, name)(*args, **kwargs, **kw)
+    return predict
+
+def load_multitask(model_dir=None):
+    from transformers import AutoTokenizer
+    from multitask import MultiTaskClassifier, load_label_maps
+    model_dir = model_dir or LF_MULTITASK_DIR
+    if not os.path.exists(model_dir):
+        raise FileNotFoundError(f"Multi-task Longformer folder not found: {model_dir}")
+    label2id_l, label2id_t = load_label_maps(model_dir)
+    model = MultiTaskClassifier.from_pretrained(model_dir).to(get_device()).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, use_fast=True)
+    return model, tokenizer, {int(v): k for k, v in label2id_l.items()}, {int(v): k for k, v in label2id_t.items()}
+
+class FramePredictor:
+    """LabelFrames + TopLabelFrames predictions for a list of texts, with the run's cache/batching/model settings."""
+
+    def __init__(self, cache=None, token_budget=4096, multitask=False, backend="torch", pipeline=False, cascade=None, band=None,
+                 chunked=False, pooling="max", overlap=128, dedup=None, tasks=TASKS, top_margin=None):
+        self.cache = cache
+        self.token_budget = token_budget
+        self.multitask = multitask
+        self.backend = backend
+        # The shared encoder always predicts both columns
+        self.tasks = TASKS if multitask else tuple(t for t in TASKS if t in tasks)
+        self.predict_fn = inference_fn("predict_labels_pipelined" if pipeline else "predict_labels")
+        # Whole articles as overlapping max_length windows, pooled per article (cached separately from truncation)
+        self.chunked = chunked
+        variant = None
+        if chunked:
+            self.predict_fn = inference_fn("predict_labels_chunked", overlap=overlap, pooling=pooling, depth=4 if pipeline else 0)
+            variant = f"chunked-{pooling}-{overlap}"
+        self.sharded = None
+        self.loaded = {}
+        # Second thread for the TopLabelFrames pass, so both models run at the same time
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="top") if pipeline and not multitask and len(self.tasks) == 2 else None
+        # Label maps, max_length and cache fingerprints come from the model folders; the models load on the first cache miss
+        if multitask:
+            from multitask import load_label_maps
+            label2id_l, label2id_t = load_label_maps(LF_MULTITASK_DIR)
+            self.id2label_label = {int(v): k for k, v in label2id_l.items()}
+            self.id2label_top = {int(v): k for k, v in label2id_t.items()}
+            self.max_length = {"multitask": 1024}
+            self.fp_mt = model_fingerprint(LF_MULTITASK_DIR, 1024, backend, variant) if cache else None
+        else:
+            self.id2label_label = read_id2label(LF_LABEL_JSON) if "label" in self.tasks else None
+            self.id2label_top = read_id2label(MP_TOP_JSON) if "top" in self.tasks else None
+            self.max_length = {"label": label_max_length(), "top": 512}
+            self.fp_label = model_fingerprint(LF_LABEL_DIR, self.max_length["label"], backend, variant) if cache and "label" in self.tasks else None
+            self.fp_top = model_fingerprint(MP_TOP_DIR, 512, backend, variant) if cache and "top" in self.tasks else None
+        # Linear model in front of the transformers (cascade.py); only uncertain rows reach them
+        self.cascade, self.band, self.top_margin = cascade, band, top_margin
+        self.cascade_stats = {"rows": 0, "routed": 0}
+        if cascade is not None:
+            from cascade import DEFAULT_BAND, DEFAULT_TOP_MARGIN
+            self.band = band or DEFAULT_BAND
+            self.top_margin = DEFAULT_TOP_MARGIN if top_margin is None else top_margin
+            if self.tasks != TASKS:
+                raise ValueError("The linear cascade routes on both columns; run it with both tasks.")
+            if [cascade.labels_label, cascade.labels_top] != list(self.label_names()):
+                raise ValueError("Linear cascade model was trained with different label maps; rerun `python cascade.py train`.")
+        # Near-duplicate threshold (dedup.py): one model call per cluster of syndicated copies
+        self.dedup = dedup
+        self.dedup_stats = {"rows": 0, "representatives": 0}
+
+    def load(self, name):
+        """(model, tokenizer) of "label", "top" or "multitask" with the run's backend, loaded on first use."""
+        if name not in self.loaded:
+            from backends import load_backend
+            if name == "multitask":
+                model, tokenizer, _, _ = load_multitask()
+                model_dir = LF_MULTITASK_DIR
+            else:
+                model, tokenizer = label_task() if name == "label" else top_task()
+                model_dir = LF_LABEL_DIR if name == "label" else MP_TOP_DIR
+            self.loaded[name] = (load_backend(model, tokenizer, model_dir, self.backend), tokenizer)
+        return self.loaded[name]
+
+    def models(self):
+        """{name: (model, tokenizer)} of the models this predictor runs, with their max_length (loads them)."""
+        names = ["multitask"] if self.multitask else list(self.tasks)
+        return {name: self.load(name) for name in names}, {name: self.max_length[name] for name in names}
+
+    def use_workers(self, workers):
+        """Run forward passes in `workers` forked CPU processes from now on."""
+        if workers > 1:
+            from inference import predict_labels
+            from parallel_inference import ShardedPredictor
+            self.sharded = ShardedPredictor(self.models()[0], workers, predict_fn=self.predict_fn if self.chunked else predict_labels)
+            self.predict_fn = self.sharded.predict_labels
+
+    def close(self):
+        if self.sharded:
+            self.sharded.close()
+        if self.executor:
+            self.executor.shutdown()
+
+    def label_names(self):
+        """(LabelFrames names, TopLabelFrames names), indexed like the probability columns (None for a skipped task)."""
+        return tuple(None if id2label is None else label_array(id2label).tolist() for id2label in (self.id2label_label, self.id2label_top))
+
+    def cascade_meta(self):
+        """Linear cascade settings for the output metadata, None without --cascade."""
+        if self.cascade is None:
+            return None
+        return {"model": getattr(self.cascade, "path", None), "band": list(self.band), "top_margin": self.top_margin}
+
+    def predictions_table(self, base, texts, source=None, tokens=None, dedup_tokens=None):
+        """Predict `texts` and return the columnar output table (see prediction_output.py)."""
+        label_strings, top_preds, probs_label, probs_top, routed = self.predict_routed(texts, tokens=tokens, dedup_tokens=dedup_tokens)
+        base = base.assign(key=[text_key(t) for t in texts])
+        return predictions_table(base, label_strings, top_preds, probs_label, probs_top, *self.label_names(), source=source,
+                                 routed=routed, cascade=self.cascade_meta())
+
+    def predict(self, texts, tokens=None, dedup_tokens=None):
+        """Returns (LabelFrames_pred, TopLabelFrames_pred, probs_label, probs_top); None for a task not in self.tasks.
+
+        tokens: TokenString per text for the linear cascade model (defaults to the texts).
+        dedup_tokens: TokenList per text for near-duplicate detection (defaults to the split texts).
+        """
+        return self.predict_routed(texts, tokens=tokens, dedup_tokens=dedup_tokens)[:4]
+
+    def predict_routed(self, texts, tokens=None, dedup_tokens=None):
+        """predict() plus a boolean per row: True where the transformers scored it (None without a cascade)."""
+        prof = get_profiler()
+        inverse = None
+        if self.dedup is not None and len(texts) > 1:
+            with prof.stage("dedup", rows=len(texts)) as rec:
+                keep, inverse = representatives(dedup_tokens or [t.lower().split() for t in texts], threshold=self.dedup)
+                rec["representatives"] = len(keep)
+            self.dedup_stats["rows"] += len(texts)
+            self.dedup_stats["representatives"] += len(keep)
+            print(f"  dedup: {len(keep)} representatives for {len(texts)} rows")
+            texts = [texts[i] for i in keep]
+            tokens = None if tokens is None else [tokens[i] for i in keep]
+        routed = None
+        if self.cascade is not None:
+            probs_label, preds_label, probs_top, routed = self.predict_cascade(texts, tokens)
+        else:
+            probs_label, preds_label, probs_top = self.predict_models(texts)
+        if inverse is not None:
+            probs_label, preds_label, probs_top, routed = (None if a is None else a[inverse] for a in (probs_label, preds_label, probs_top, routed))
+        with prof.stage("decode", rows=len(texts)):
+            label_strings = None if probs_label is None else decode_label_frames(probs_label, preds_label, self.id2label_label)
+            top_preds = None if probs_top is None else decode_top_frames(probs_top, self.id2label_top)
+        return label_strings, top_preds, probs_label, probs_top, routed
+
+    def predict_cascade(self, texts, tokens=None):
+        """Linear scores for every text; uncertain rows are replaced by predict_models (routed mask as the last item)."""
+        from cascade import uncertain
+        prof = get_profiler()
+        with prof.stage("linear", rows=len(texts)) as rec:
+            probs_label, probs_top = self.cascade.predict_proba(texts if tokens is None else tokens)
+            mask = uncertain(probs_label, probs_top, self.band, self.top_margin)
+            routed = np.flatnonzero(mask)
+            rec["routed"] = len(routed)
+        self.cascade_stats["rows"] += len(texts)
+        self.cascade_stats["routed"] += len(routed)
+        print(f"  cascade: {len(routed)}/{len(texts)} rows routed to the transformers")
+        if len(routed):
+            sub_label, _, sub_top = self.predict_models([texts[i] for i in routed])
+            probs_label[routed] = sub_label
+            probs_top[routed] = sub_top
+        return probs_label, (probs_label >= 0.5).astype(int), probs_top, mask
+
+    def predict_models(self, texts):
+        """(probs_label, preds_label, probs_top) from the transformers (None for a task not in self.tasks)."""
+        prof = get_profiler()
+        probs_label = preds_label = probs_top = None
+        if self.multitask:
+            from multitask import split_probs
+            # Both columns from one Longformer forward pass at 1024
+            with prof.tagged(model="multitask"), prof.stage("predict", rows=len(texts)):
+                probs_mt, _ = predict_labels_cached(lambda: self.load("multitask"), texts, cache=self.cache, fingerprint=self.fp_mt, max_length=1024, token_budget=self.token_budget, predict_fn=self.predict_fn)
+            probs_label, probs_top = split_probs(probs_mt, len(self.id2label_label)) if probs_mt.size else (probs_mt, probs_mt)
+            preds_label = (probs_label >= 0.5).astype(int)
+        else:
+            # TopLabelFrames (MPNet, single-label argmax at 512); on the second thread with --pipeline
+            tags = dict(prof.tags)
+            def predict_top():
+                with prof.tagged(**tags, model="top"), prof.stage("predict", rows=len(texts)):
+                    return predict_labels_cached(lambda: self.load("top"), texts, cache=self.cache, fingerprint=self.fp_top, max_length=512, token_budget=self.token_budget, predict_fn=self.predict_fn)
+            top_future = self.executor.submit(predict_top) if self.executor else None
+            # LabelFrames (Longformer, multi-label)
+            if "label" in self.tasks:
+                with prof.tagged(model="label"), prof.stage("predict", rows=len(texts)):
+                    probs_label, preds_label = predict_labels_cached(lambda: self.load("label"), texts, cache=self.cache, fingerprint=self.fp_label, max_length=self.max_length["label"], token_budget=self.token_budget, predict_fn=self.predict_fn)
+            if "top" in self.tasks:
+                probs_top, _ = top_future.result() if top_future else predict_top()
+        return probs_label, preds_label, probs_top
+
+def output_path(file_path, output_format="csv"):
+    fname = os.path.basename(file_path)
+    if output_format == "parquet":
+        fname = os.path.splitext(fname)[0] + ".parquet"
+    return os.path.join(RESULTS_DIR, fname)
+
+def passthrough_columns(df, row_index):
+    """row, URL, Date (if present) of an input chunk, as the base of the columnar output."""
+    base = pd.DataFrame({"row": np.asarray(row_index)})
+    for col in STREAM_COLUMNS:
+        if col in df.columns and col != "Text":
+            base[col] = df[col].to_numpy()
+    return base
+
+def assign_predictions(df, label_strings, top_preds, routed=None):
+    """Add the prediction columns of the tasks that ran (and the cascade's routed flags)."""
+    if label_strings is not None:
+        df["LabelFrames_pred"] = label_strings
+    if top_preds is not None:
+        df["TopLabelFrames_pred"] = top_preds
+    if routed is not None:
+        df["routed"] = routed
+
+def cascade_tokens(predictor, df):
+    """TokenString per row for --cascade, None otherwise."""
+    if not predictor.cascade:
+        return None
+    from cascade import token_features
+    return token_features(df)
+
+def run_file(predictor, file_path, out_path, output_format="csv"):
+    prof = get_profiler()
+    with prof.stage("read_csv") as rec:
+        # Parquet output only keeps row/URL/Date, so the token columns are never parsed (except TokenString/TokenList for --cascade/--dedup)
+        columns = STREAM_COLUMNS + (["TokenString"] if predictor.cascade else []) + (["TokenList"] if predictor.dedup is not None else [])
+        usecols = (lambda c: c in columns) if output_format == "parquet" else None
+        df = read_csv_robust(file_path, usecols=usecols)
+        rec["rows"] = len(df)
+    if "Text" not in df.columns:
+        return False
+    texts = df["Text"].astype(str).tolist()
+    tokens = cascade_tokens(predictor, df)
+    dedup_tokens = token_lists(df) if predictor.dedup is not None else None
+    if output_format == "parquet":
+        table = predictor.predictions_table(passthrough_columns(df, df.index), texts, source=os.path.basename(file_path), tokens=tokens, dedup_tokens=dedup_tokens)
+        if os.path.isdir(out_path):
+            shutil.rmtree(out_path)  # part files of an earlier --stream run
+        with prof.stage("write_parquet", rows=len(df)):
+            write_table(table, out_path)
+    else:
+        label_strings, top_preds, _, _, routed = predictor.predict_routed(texts, tokens=tokens, dedup_tokens=dedup_tokens)
+        assign_predictions(df, label_strings, top_preds, routed)
+        with prof.stage("write_csv", rows=len(df)):
+            df.to_csv(out_path, index=False)
+    # A full rewrite invalidates any --stream checkpoint for this output
+    if os.path.exists(out_path + ".ckpt.json"):
+        os.remove(out_path + ".ckpt.json")
+    return True
+
+def source_signature(path):
+    st = os.stat(path)
+    return {"source_size": st.st_size, "source_mtime": st.st_mtime}
+
+def run_file_streaming(predictor, file_path, out_path, chunk_rows=2000, restart=False, output_format="csv"):
+    """Chunked, resumable variant of run_file. Output: row, URL, Date (if present) + prediction columns.
+    CSV output is appended to one file; Parquet output is one part file per chunk in the out_path folder."""
+    ckpt_path = out_path + ".ckpt.json"
+    ckpt = {"rows_done": 0, "out_bytes": 0, "parts": 0, "complete": False, **source_signature(file_path)}
+    if not restart and os.path.exists(ckpt_path) and os.path.exists(out_path):
+        with open(ckpt_path, "r") as f:
+            saved = json.load(f)
+        if all(saved.get(k) == v for k, v in source_signature(file_path).items()):
+            ckpt = saved
+    if ckpt["complete"]:
+        print(f"  already complete ({ckpt['rows_done']} rows), skipping")
+        return True
+    if ckpt["rows_done"]:
+        print(f"  resuming at row {ckpt['rows_done']}")
+
+    # Drop anything written after the last checkpoint (crash between append and checkpoint)
+    if output_format == "parquet":
+        if not ckpt["rows_done"] and os.path.isfile(out_path):
+            os.remove(out_path)
+        remove_parts_from(out_path, ckpt.get("parts", 0))
+        os.makedirs(out_path, exist_ok=True)
+    else:
+        with open(out_path, "a+b") as f:
+            f.truncate(ckpt["out_bytes"])
+
+    prof = get_profiler()
+    row = 0
+    columns = STREAM_COLUMNS + (["TokenString"] if predictor.cascade else []) + (["TokenList"] if predictor.dedup is not None else [])
+    for chunk in prof.iter_stage(iter_csv_chunks(file_path, chunk_rows, columns=columns), "read_csv"):
+        if "Text" not in chunk.columns:
+            return False
+        start = row
+        row += len(chunk)
+        if row <= ckpt["rows_done"]:
+            continue
+        chunk = chunk.iloc[max(ckpt["rows_done"] - start, 0):]
+
+        out = passthrough_columns(chunk, chunk.index)
+        texts = chunk["Text"].astype(str).tolist()
+        tokens = cascade_tokens(predictor, chunk)
+        dedup_tokens = token_lists(chunk) if predictor.dedup is not None else None
+        if output_format == "parquet":
+            table = predictor.predictions_table(out, texts, source=os.path.basename(file_path), tokens=tokens, dedup_tokens=dedup_tokens)
+            with prof.stage("write_parquet", rows=len(out)):
+                write_table(table, part_path(out_path, ckpt["parts"]))
+            ckpt["parts"] += 1
+        else:
+            label_strings, top_preds, _, _, routed = predictor.predict_routed(texts, tokens=tokens, dedup_tokens=dedup_tokens)
+            assign_predictions(out, label_strings, top_preds, routed)
+            with prof.stage("write_csv", rows=len(out)):
+                out.to_csv(out_path, mode="a", header=ckpt["out_bytes"] == 0, index=False)
+            ckpt["out_bytes"] = os.path.getsize(out_path)
+
+        ckpt["rows_done"] = row
+        with open(ckpt_path, "w") as f:
+            json.dump(ckpt, f)
+        print(f"  {row} rows done")
+
+    ckpt["complete"] = True
+    with open(ckpt_path, "w") as f:
+        json.dump(ckpt, f)
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Apply fine-tuned LabelFrames/TopLabelFrames models to cluster/train/eval files.")
+    add_path_args(parser)
+    parser.add_argument("--label-model", default=None, help="LabelFrames model folder, or 'student' for the distilled student (default: the Longformer).")
+    parser.add_argument("--files", nargs="+", default=None, metavar="PATTERN",
+                        help="Glob patterns relative to --data-dir (default: the cluster files + train/eval_data.csv).")
+    parser.add_argument("--tasks", nargs="+", choices=TASKS, default=list(TASKS),
+                        help="label = LabelFrames (Longformer), top = TopLabelFrames (MPNet); only these models are loaded.")
+    parser.add_argument("--list", action="store_true", help="Print the input files and exit.")
+    parser.add_argument("--dry-run", action="store_true", help="Print rows and estimated tokens per input file and exit (no model is loaded).")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update the persistent prediction store.")
+    parser.add_argument("--token-budget", type=int, default=4096,
+                        help="Length-sorted batching: max rows × longest row per batch. 0 = fixed batches of 4 in file order.")
+    parser.add_argument("--multitask", action="store_true",
+                        help="Predict both columns with the shared-encoder Longformer instead of Longformer + MPNet.")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="torch (fp32), int8 (dynamic quantization) or onnx (onnxruntime); int8/onnx run on the CPU.")
+    parser.add_argument("--stream", action="store_true", help="Chunked, resumable processing with flat memory use.")
+    parser.add_argument("--chunk-rows", type=int, default=2000, help="Rows per chunk in --stream mode.")
+    parser.add_argument("--restart", action="store_true", help="Ignore --stream checkpoints and start every file from row 0.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap tokenization with the forward pass and run both models concurrently.")
+    parser.add_argument("--workers", type=int, default=1, help="Shard rows across N forked CPU worker processes.")
+    parser.add_argument("--scaling-scan", action="store_true",
+                        help="Before the run, time 1, 2, 4, … --workers workers on a sample and log the table.")
+    parser.add_argument("--scan-rows", type=int, default=256, help="Sample size for --scaling-scan.")
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default="csv",
+                        help="csv: input file + prediction columns; parquet: key, predictions and float16 probabilities.")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Score every article with the TF-IDF + linear model (cascade.py); only uncertain ones go to the transformers.")
+    parser.add_argument("--band", type=float, nargs=2, default=None, metavar=("LOW", "HIGH"),
+                        help="--cascade uncertainty band (default: cascade.DEFAULT_BAND): rows with a LabelFrames score in [LOW, HIGH] are routed.")
+    parser.add_argument("--top-margin", type=float, default=None,
+                        help="--cascade: also route rows whose two best TopLabelFrames scores are closer than this (default: cascade.DEFAULT_TOP_MARGIN).")
+    parser.add_argument("--chunked", action="store_true",
+                        help="No truncation: overlapping max_length windows per article, packed into full batches and pooled per article.")
+    parser.add_argument("--pooling", choices=["max", "mean"], default="max", help="How --chunked combines window logits.")
+    parser.add_argument("--chunk-overlap", type=int, default=128, help="Tokens shared by neighbouring --chunked windows.")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Run the models once per near-duplicate cluster (MinHash/LSH over TokenList, see dedup.py) and copy the result to its members.")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD, help="Estimated Jaccard similarity for --dedup.")
+    add_profiling_args(parser, METRICS_PATH)
+    args = parser.parse_args()
+    if set(args.tasks) != set(TASKS) and (args.cascade or args.multitask):
+        parser.error("--cascade and --multitask predict both columns; drop --tasks")
+    return args
+
 if __name__ == "__main__":
+    args = parse_args()
     t0 = time.time()
     processed = []
-
-    targets = [os.path.join(DATA_DIR, f) for f in (CLUSTER_FILES + CORE_FILES)]
-    targets = [p for p in targets if os.path.exists(p)]
-
+    apply_path_args(args, "finetuned_analysis", args.label_model)
+
+    targets = discover_files(args.files)
+    if args.list or args.dry_run:
+        if args.list:
+            for p in targets:
+                print(f"{os.path.getsize(p) / 1e6:9.1f} MB  {p}")
+        if args.dry_run:
+            table = dry_run(targets, tasks=args.tasks)
+            print(table.to_string(index=False))
+            approx = "~" if table["estimated"].any() else ""
+            print(f"\n{len(targets)} files, {approx}{table['rows'].sum()} rows, ~{table['est_tokens'].sum():,} tokens "
+                  f"(~{TOKENS_PER_WORD:g} tokens/word; estimated files extrapolated from their first rows) in {time.time() - t0:.2f}s")
+        raise SystemExit(0)
+
+    prof = configure_from_args(args, "finetuned_analysis")
     os.makedirs(RESULTS_DIR, exist_ok=True)
 
+    cache = None if args.no_cache else PredictionCache(CACHE_PATH)
+    cascade = None
+    if args.cascade:
+        from cascade import LinearFrames
+        cascade = LinearFrames.load()
+    predictor = FramePredictor(cache=cache, token_budget=args.token_budget, multitask=args.multitask, backend=args.backend, pipeline=args.pipeline,
+                               cascade=cascade, band=tuple(args.band) if args.band else None, chunked=args.chunked, pooling=args.pooling,
+                               overlap=args.chunk_overlap, dedup=args.dedup_threshold if args.dedup else None, tasks=args.tasks,
+                               top_margin=args.top_margin)
+
+    scan_lines = []
+    if (args.workers > 1 or args.scaling_scan) and get_device().type != "cpu":
+        print(f"--workers/--scaling-scan are CPU-only; running in-process on {get_device()}.")
+    else:
+        if args.scaling_scan and targets:
+            from parallel_inference import format_scaling_table, scaling_table
+            sample = read_csv_robust(targets[-1], usecols=["Text"], nrows=args.scan_rows)["Text"].astype(str).tolist()
+            counts = sorted({1, args.workers} | {2 ** i for i in range(1, args.workers.bit_length()) if 2 ** i < args.workers})
+            models, max_lengths = predictor.models()
+            scan_lines = format_scaling_table(scaling_table(models, sample, counts, max_lengths, token_budget=args.token_budget))
+            print("\n".join(scan_lines))
+        predictor.use_workers(args.workers)
+
     for file_path in targets:
         fname = os.path.basename(file_path)
-        out_path = os.path.join(RESULTS_DIR, fname)
+        out_path = output_path(file_path, args.output_format)
         print(f"\nProcessing {fname} ...")
 
-        df = read_csv_robust(file_path)
-        if "Text" not in df.columns:
+        with prof.tagged(file=fname), prof.stage("file"):
+            if args.stream:
+                ok = run_file_streaming(predictor, file_path, out_path, chunk_rows=args.chunk_rows, restart=args.restart, output_format=args.output_format)
+            else:
+                ok = run_file(predictor, file_path, out_path, output_format=args.output_format)
+        if not ok:
             print(f"Skipping {fname}, no 'Text' column.")
             continue
-
-        texts = df["Text"].astype(str).tolist()
-
-        # LabelFrames (Longformer, multi-label). Use 1024 to match training.
-        probs_label, preds_label = predict_labels(model_label, tokenizer_label, texts, max_length=1024)
-        label_strings = []
-        for p_row, probs_row in zip(preds_label, probs_label):
-            idxs = np.where(p_row == 1)[0]
-            if len(idxs) == 0:
-                idxs = [int(np.argmax(probs_row))]
-            labels = [id2label_label[i] for i in idxs]
-            label_strings.append(join_labels(labels))
-        df["LabelFrames_pred"] = label_strings
-
-        # TopLabelFrames (MPNet, single-label argmax at 512)
-        probs_top, _ = predict_labels(model_top, tokenizer_top, texts, max_length=512)
-        top_preds = [id2label_top[int(np.argmax(row))] for row in probs_top]
-        df["TopLabelFrames_pred"] = top_preds
-
-        df.to_csv(out_path, index=False)
         print(f"Saved predictions → {out_path}")
         processed.append(fname)
 
+    predictor.close()
     notes = f"Predictions saved for {len(processed)} files → /results. Files: {', '.join(processed[:5])}..."
+    if set(args.tasks) != set(TASKS):
+        notes += f" | tasks={','.join(args.tasks)}"
+    if args.label_model:
+        notes += f" | LabelFrames model: {LF_LABEL_DIR}"
+    if args.workers > 1:
+        notes += f" | workers={args.workers}"
+    if args.chunked:
+        notes += f" | chunked ({args.pooling} pooling, overlap {args.chunk_overlap})"
+    if args.dedup:
+        stats = predictor.dedup_stats
+        notes += f" | dedup ≥{args.dedup_threshold:g}: {stats['representatives']}/{stats['rows']} rows sent to the models"
+    if cascade is not None:
+        stats = predictor.cascade_stats
+        notes += (f" | cascade band {predictor.band[0]:g}–{predictor.band[1]:g}, top margin {predictor.top_margin:g}: "
+                  f"{stats['routed']}/{stats['rows']} rows routed to the transformers")
+    if scan_lines:
+        notes += f"\n\nWorker scaling on {args.scan_rows} rows:\n\n" + "\n".join(scan_lines) + "\n"
+    if cache:
+        notes += f" | prediction store: {cache.count()} entries ({CACHE_PATH})"
+        cache.close()
+    stages = prof.summary()
+    if prof.path:
+        notes += f" | slowest stages: {format_summary(stages)} (metrics → {prof.path})"
+    prof.close()
     log_to_readme("Apply Longformer (LabelFrames) & MPNet (TopLabelFrames) to cluster/train/eval files", t0, notes=notes)
     print("\nAll requested files processed.")
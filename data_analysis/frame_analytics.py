@@ -0,0 +1,214 @@
+# frame_analytics.py
+"""
+Frame-share analytics over one article table, instead of the 30 materialized
+cluster/period CSVs (CLUSTER_FILES, built by web_scraping/data_preparation.R).
+
+The table is loaded once from the ingest.py predictions (or any file read by
+prediction_output.read_predictions that has an outlet column):
+  - sorted DatetimeIndex (periods and custom windows are binary-searched slices),
+  - outlet as a categorical, cluster membership as a cluster × outlet boolean matrix,
+  - LabelFrames as a boolean indicator matrix (re-thresholded from the stored
+    probabilities), TopLabelFrames as integer codes.
+
+Any cluster (clusters.CLUSTERS or an ad-hoc outlet list) × period (t1–t5 or
+--start/--end) is a mask plus a column mean, so a new cluster definition or time
+window costs milliseconds rather than new CSV files and another inference run.
+
+  python frame_analytics.py shares --cluster cluster1_politicalcompliance_il --period t3
+  python frame_analytics.py shares --outlets bbc cnn --start 2024-01-01 --end 2024-06-30 --column top
+  python frame_analytics.py timeseries --cluster cluster2_politicalsystem_democratic --freq M
+  python frame_analytics.py report     # every cluster × period → results/analytics/frame_shares.csv
+
+Shares: LabelFrames = fraction of articles carrying the frame (multi-label, rows do
+not sum to 1); TopLabelFrames = fraction of articles whose top frame it is.
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import finetuned_analysis as fa
+from clusters import CLUSTERS, OUTLET_FILES, PERIODS
+from prediction_output import read_predictions
+
+# Paths (under fa.RESULTS_DIR, resolved on use so --results-dir applies)
+def source_path():
+    return os.path.join(fa.RESULTS_DIR, "ingest", "predictions")
+
+def report_path():
+    return os.path.join(fa.RESULTS_DIR, "analytics", "frame_shares.csv")
+
+COLUMNS = ("label", "top")
+
+class FrameTable:
+    """One row per article, sorted by date; see the module docstring for the layout."""
+
+    def __init__(self, df, probs_label, probs_top, labels_label, labels_top, threshold=0.5, clusters=CLUSTERS):
+        if "outlet" not in df.columns:
+            raise ValueError("predictions need an outlet column (written by ingest.py)")
+        dates = pd.to_datetime(df["Date"], errors="coerce").to_numpy()
+        keep = ~pd.isna(dates)
+        if "URL" in df.columns:
+            keep &= ~df["URL"].duplicated().to_numpy()
+        order = np.flatnonzero(keep)[np.argsort(dates[keep], kind="stable")]
+
+        self.dates = pd.DatetimeIndex(dates[order])
+        outlets = df["outlet"].to_numpy()[order]
+        self.outlet = pd.Categorical(outlets, categories=sorted(set(OUTLET_FILES) | set(outlets)))
+        self.labels = {"label": list(labels_label), "top": list(labels_top)}
+
+        probs = np.asarray(probs_label, dtype=np.float32)[order]
+        label = probs >= threshold
+        empty = ~label.any(axis=1)
+        label[empty, np.argmax(probs[empty], axis=1)] = True  # same fallback as decode_label_frames
+        top = np.argmax(np.asarray(probs_top, dtype=np.float32)[order], axis=1)
+        self.indicators = {"label": label, "top": np.eye(len(labels_top), dtype=bool)[top]}
+        self.threshold = threshold
+        self.membership = pd.DataFrame(
+            {name: np.isin(self.outlet.categories, members) for name, members in clusters.items()},
+            index=self.outlet.categories).T
+
+    @classmethod
+    def load(cls, path=None, threshold=None):
+        path = path or source_path()
+        df, probs_label, probs_top, meta = read_predictions(path, columns=["outlet", "URL", "Date", "probs_label", "probs_top"])
+        if probs_label is None:
+            raise FileNotFoundError(f"No predictions found in {path} (run ingest.py first)")
+        threshold = meta.get("threshold", 0.5) if threshold is None else threshold
+        return cls(df, probs_label, probs_top, meta["labels_label"], meta["labels_top"], threshold=threshold)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def window(self, period=None, start=None, end=None):
+        """[lo, hi) row range of a period name or an inclusive start/end date window."""
+        if period:
+            start, end = PERIODS[period]
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side="left")
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side="right")
+        return lo, hi
+
+    def outlet_mask(self, cluster=None, outlets=None):
+        """Boolean per outlet category, or None for all outlets."""
+        if outlets:
+            return np.isin(self.outlet.categories, outlets)
+        if cluster:
+            return self.membership.loc[cluster].to_numpy()
+        return None
+
+    def select(self, cluster=None, outlets=None, period=None, start=None, end=None):
+        """Row indices of the articles in a cluster (or outlet list) × period (or window)."""
+        lo, hi = self.window(period, start, end)
+        mask = self.outlet_mask(cluster, outlets)
+        if mask is None:
+            return np.arange(lo, hi)
+        return lo + np.flatnonzero(mask[self.outlet.codes[lo:hi]])
+
+    def shares(self, column="label", **query):
+        """Frame → share of the selected articles; .attrs["n"] holds the article count."""
+        rows = self.select(**query)
+        ind = self.indicators[column][rows]
+        out = pd.Series(ind.mean(axis=0) if len(rows) else np.zeros(ind.shape[1]), index=self.labels[column], name="share")
+        out.attrs["n"] = len(rows)
+        return out
+
+    def time_series(self, column="label", freq="M", **query):
+        """Per-period shares (rows: period start, columns: frames, plus n articles)."""
+        rows = self.select(**query)
+        buckets = self.dates[rows].to_period(freq)
+        frame = pd.DataFrame(self.indicators[column][rows], columns=self.labels[column])
+        grouped = frame.groupby(buckets.to_timestamp().to_numpy())
+        out = grouped.mean()
+        out.insert(0, "n", grouped.size())
+        out.index.name = "period_start"
+        return out
+
+    def share_table(self, column="label", windows=None, clusters=None):
+        """Shares for every cluster × window at once (long format: cluster, period, n, frame, share).
+
+        Counts are summed per (window, outlet) once; each cluster is then a
+        membership-weighted sum of those counts.
+        """
+        windows = windows or {**PERIODS, "all": (None, None)}
+        membership = self.membership if clusters is None else self.membership.loc[clusters]
+        ind = self.indicators[column]
+        n_out = len(self.outlet.categories)
+        records = []
+        for period, (start, end) in windows.items():
+            lo, hi = self.window(start=start, end=end)
+            codes = self.outlet.codes[lo:hi]
+            counts = np.zeros((n_out, ind.shape[1]))
+            np.add.at(counts, codes, ind[lo:hi])
+            totals = np.bincount(codes, minlength=n_out)
+            cluster_counts = membership.to_numpy().astype(float) @ counts
+            cluster_n = membership.to_numpy() @ totals
+            shares = np.divide(cluster_counts, cluster_n[:, None], out=np.zeros_like(cluster_counts), where=cluster_n[:, None] > 0)
+            for i, cluster in enumerate(membership.index):
+                for j, frame in enumerate(self.labels[column]):
+                    records.append((cluster, period, column, int(cluster_n[i]), frame, shares[i, j]))
+        return pd.DataFrame(records, columns=["cluster", "period", "column", "n", "frame", "share"])
+
+def add_query_args(parser):
+    parser.add_argument("--cluster", choices=sorted(CLUSTERS), default=None)
+    parser.add_argument("--outlets", nargs="+", default=None, help="Ad-hoc cluster (overrides --cluster).")
+    parser.add_argument("--period", choices=sorted(PERIODS), default=None)
+    parser.add_argument("--start", default=None, help="Window start date (inclusive, overrides --period).")
+    parser.add_argument("--end", default=None, help="Window end date (inclusive).")
+    parser.add_argument("--column", choices=COLUMNS, default="label", help="label = LabelFrames, top = TopLabelFrames.")
+    parser.add_argument("--out", default=None, help="Also write the result as CSV.")
+
+def query_kwargs(args):
+    period = None if (args.start or args.end) else args.period
+    return dict(cluster=args.cluster, outlets=args.outlets, period=period, start=args.start, end=args.end)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    fa.add_path_args(parser)
+    parser.add_argument("--source", default=None, help="Predictions with an outlet column (default: ingest.py partitions under --results-dir).")
+    parser.add_argument("--threshold", type=float, default=None, help="LabelFrames threshold (default: the one stored with the predictions).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    shares = sub.add_parser("shares", help="Frame shares of one cluster × period.")
+    add_query_args(shares)
+
+    series = sub.add_parser("timeseries", help="Frame shares per day/week/month.")
+    add_query_args(series)
+    series.add_argument("--freq", default="M", help="pandas period alias: D, W, M, Q.")
+
+    report = sub.add_parser("report", help="Every cluster × period (t1–t5 and all), both columns.")
+    report.add_argument("--out", default=None, help="Default: analytics/frame_shares.csv under --results-dir.")
+    return parser.parse_args()
+
+def save(df, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df.to_csv(path, index=True if df.index.name else False)
+    print(f"Saved → {path}")
+
+if __name__ == "__main__":
+    args = parse_args()
+    fa.apply_path_args(args)
+    args.source = args.source or source_path()
+    if args.command == "report":
+        args.out = args.out or report_path()
+    t0 = time.perf_counter()
+    table = FrameTable.load(args.source, threshold=args.threshold)
+    t1 = time.perf_counter()
+    print(f"Loaded {len(table)} articles from {args.source} in {(t1 - t0) * 1000:.0f} ms (threshold {table.threshold})")
+
+    if args.command == "shares":
+        result = table.shares(column=args.column, **query_kwargs(args))
+        print(f"{result.attrs['n']} articles")
+        result = result.sort_values(ascending=False).to_frame()
+        result.index.name = "frame"
+    elif args.command == "timeseries":
+        result = table.time_series(column=args.column, freq=args.freq, **query_kwargs(args))
+    else:
+        result = pd.concat([table.share_table(column) for column in COLUMNS], ignore_index=True)
+
+    print(f"Query: {(time.perf_counter() - t1) * 1000:.1f} ms\n")
+    print(result.round(4).to_string() if args.command != "report" else result.head(20).round(4).to_string())
+    if args.out:
+        save(result, args.out)
@@ -0,0 +1,236 @@
+# inference.py
+"""
+Batched inference helpers shared by finetuned_analysis.py and the comparison tools.
+
+predict_labels supports two batching modes:
+  - fixed:   slice texts in file order, batch_size rows per batch (padding=True)
+  - dynamic: pre-tokenize, sort by token length and pack batches up to a token
+             budget (rows × longest row), then scatter results back to input order.
+Both return (probs, binary_preds) with rows in the original order.
+
+predict_labels_pipelined runs the same batches, but builds them on a background
+thread (bounded queue) so tokenization overlaps the forward pass.
+
+predict_labels_chunked does not truncate: every article is cut into overlapping
+windows of max_length tokens (the last window ends at the article end, so all
+windows of long articles are full), windows of all articles are packed into
+length-sorted batches under the token budget, and the window logits are pooled
+back per article (max or mean) before the sigmoid.
+
+Each batch is recorded as tokenize / forward / sigmoid stages (rows, tokens,
+padding ratio) by the profiler configured in the calling script (profiling.py).
+"""
+
+import queue
+import threading
+
+import numpy as np
+import torch
+
+from profiling import get_profiler, token_stats
+
+def model_device(model):
+    try:
+        return next(model.parameters()).device
+    except (StopIteration, AttributeError):
+        return torch.device("cpu")
+
+def sigmoid(logits):
+    return 1 / (1 + np.exp(-logits))
+
+def plan_token_batches(lengths, token_budget, max_batch_size=64):
+    """Group row indices (longest first) so that rows × longest row ≤ token_budget."""
+    order = np.argsort(np.asarray(lengths), kind="stable")[::-1]
+    batches, current, current_max = [], [], 0
+    for idx in order:
+        length = int(lengths[idx])
+        new_max = max(current_max, length)
+        if current and (new_max * (len(current) + 1) > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current, new_max = [], length
+        current.append(int(idx))
+        current_max = new_max
+    if current:
+        batches.append(current)
+    return batches
+
+def forward_logits(model, enc, device=None):
+    prof = get_profiler()
+    device = device or model_device(model)
+    with prof.stage("forward", **token_stats(enc)), prof.trace_step():
+        enc = {k: v.to(device) for k, v in enc.items()}
+        with torch.no_grad():
+            out = model(**enc)
+        return out.logits.float().cpu().numpy()
+
+def forward_probs(model, enc, device=None):
+    logits = forward_logits(model, enc, device)
+    with get_profiler().stage("sigmoid"):
+        return sigmoid(logits)
+
+def encode_batches_fixed(tokenizer, texts, batch_size=4, max_length=512):
+    """Yields (row indices, padded batch): batch_size rows at a time in file order."""
+    for i in range(0, len(texts), batch_size):
+        batch_texts = texts[i:i+batch_size]
+        with get_profiler().stage("tokenize", rows=len(batch_texts)):
+            enc = tokenizer(batch_texts, truncation=True, padding=True, max_length=max_length, return_tensors="pt")
+        yield list(range(i, i + len(batch_texts))), enc
+
+def encode_batches_dynamic(tokenizer, texts, token_budget=4096, max_length=512, max_batch_size=64):
+    """Yields (row indices, padded batch): length-sorted batches packed up to token_budget."""
+    if not len(texts):
+        return
+    prof = get_profiler()
+    with prof.stage("tokenize", rows=len(texts)):
+        encoded = tokenizer(list(texts), truncation=True, max_length=max_length)
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+    keys = list(encoded.keys())
+    for batch in plan_token_batches(lengths, token_budget, max_batch_size=max_batch_size):
+        with prof.stage("pad", rows=len(batch)):
+            features = [{k: encoded[k][i] for k in keys} for i in batch]
+            enc = tokenizer.pad(features, padding=True, return_tensors="pt")
+        yield batch, enc
+
+def encode_batches(tokenizer, texts, batch_size=4, max_length=512, token_budget=None):
+    texts = list(texts)
+    if token_budget:
+        return encode_batches_dynamic(tokenizer, texts, token_budget=token_budget, max_length=max_length)
+    return encode_batches_fixed(tokenizer, texts, batch_size=batch_size, max_length=max_length)
+
+def collect_probs(model, batches, n_rows, forward=forward_probs):
+    """Run every (row indices, batch) through the model and scatter the probabilities back to row order."""
+    probs_all = None
+    for rows, enc in batches:
+        probs = forward(model, enc)
+        if probs_all is None:
+            probs_all = np.empty((n_rows, probs.shape[1]), dtype=probs.dtype)
+        probs_all[rows] = probs
+    return probs_all if probs_all is not None else np.empty((0, 0))
+
+def predict_labels_fixed(model, tokenizer, texts, batch_size=4, max_length=512):
+    return collect_probs(model, encode_batches_fixed(tokenizer, texts, batch_size=batch_size, max_length=max_length), len(texts))
+
+def predict_labels_dynamic(model, tokenizer, texts, token_budget=4096, max_length=512, max_batch_size=64):
+    batches = encode_batches_dynamic(tokenizer, texts, token_budget=token_budget, max_length=max_length, max_batch_size=max_batch_size)
+    return collect_probs(model, batches, len(texts))
+
+def prefetch(batches, device, depth=4):
+    """Produce batches (tokenize, pad, copy to device) on a background thread, at most `depth` ahead.
+
+    Tokenizers release the GIL (fast) or run pure Python (slow) while the forward pass
+    runs in torch with the GIL released, so the two overlap.
+    """
+    q = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+    non_blocking = torch.device(device).type == "cuda"
+    tags = dict(get_profiler().tags)
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        get_profiler().tags = tags  # producer stages carry the caller's file/model tags
+        try:
+            for rows, enc in batches:
+                if non_blocking:
+                    enc = {k: v.pin_memory() for k, v in enc.items()}
+                if not put((rows, {k: v.to(device, non_blocking=non_blocking) for k, v in enc.items()})):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Consumer stopped early (error or close): let the producer exit
+        stop.set()
+        thread.join()
+
+def predict_labels_pipelined(model, tokenizer, texts, threshold=0.5, batch_size=4, max_length=512, token_budget=None, depth=4):
+    """predict_labels with tokenization/padding/H2D copy on a background thread; same batches, same output."""
+    texts = list(texts)
+    batches = encode_batches(tokenizer, texts, batch_size=batch_size, max_length=max_length, token_budget=token_budget)
+    probs_all = collect_probs(model, prefetch(batches, model_device(model), depth=depth), len(texts))
+    binary_preds = (probs_all >= threshold).astype(int) if probs_all.size else np.empty((0, 0), dtype=int)
+    return probs_all, binary_preds
+
+def predict_labels(model, tokenizer, texts, threshold=0.5, batch_size=4, max_length=512, token_budget=None):
+    if token_budget:
+        probs_all = predict_labels_dynamic(model, tokenizer, texts, token_budget=token_budget, max_length=max_length)
+    else:
+        probs_all = predict_labels_fixed(model, tokenizer, texts, batch_size=batch_size, max_length=max_length)
+    binary_preds = (probs_all >= threshold).astype(int) if probs_all.size else np.empty((0, 0), dtype=int)
+    return probs_all, binary_preds
+
+# Sliding-window chunks
+def window_starts(n_tokens, size, overlap):
+    """Start offsets of size-token windows sharing `overlap` tokens; the last one ends at n_tokens."""
+    if n_tokens <= size:
+        return [0]
+    starts = list(range(0, n_tokens - size + 1, size - overlap))
+    if starts[-1] + size < n_tokens:
+        starts.append(n_tokens - size)
+    return starts
+
+def encode_windows(tokenizer, texts, max_length=512, overlap=128):
+    """(window input_ids incl. special tokens, article index per window), windows grouped by article."""
+    size = max_length - tokenizer.num_special_tokens_to_add(pair=False)
+    if overlap >= size:
+        raise ValueError(f"overlap ({overlap}) must be smaller than the window body ({size} tokens)")
+    with get_profiler().stage("tokenize", rows=len(texts)):
+        encoded = tokenizer(list(texts), add_special_tokens=False, truncation=False, verbose=False)["input_ids"]
+    windows, owner = [], []
+    for row, ids in enumerate(encoded):
+        for start in window_starts(len(ids), size, overlap):
+            windows.append(tokenizer.build_inputs_with_special_tokens(ids[start:start + size]))
+            owner.append(row)
+    return windows, np.asarray(owner, dtype=np.int64)
+
+def encode_window_batches(tokenizer, windows, token_budget=4096, max_batch_size=64):
+    """Yields (window indices, padded batch); full-length windows fill uniform batches, short ones share the rest."""
+    prof = get_profiler()
+    for batch in plan_token_batches([len(w) for w in windows], token_budget, max_batch_size=max_batch_size):
+        with prof.stage("pad", rows=len(batch)):
+            enc = tokenizer.pad({"input_ids": [windows[i] for i in batch]}, padding=True, return_tensors="pt")
+        yield batch, enc
+
+def pool_windows(values, owner, n_rows, pooling="max"):
+    """Per-article max or mean of window rows (owner is sorted, every article has ≥ 1 window)."""
+    starts = np.searchsorted(owner, np.arange(n_rows))
+    if pooling == "max":
+        return np.maximum.reduceat(values, starts, axis=0)
+    if pooling == "mean":
+        return np.add.reduceat(values, starts, axis=0) / np.bincount(owner, minlength=n_rows)[:, None]
+    raise ValueError(f"unknown pooling: {pooling}")
+
+def predict_labels_chunked(model, tokenizer, texts, threshold=0.5, batch_size=4, max_length=512, token_budget=None,
+                           overlap=128, pooling="max", depth=0):
+    """Same contract as predict_labels, over whole articles (see module docstring); depth > 0 prefetches batches."""
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0)), np.empty((0, 0), dtype=int)
+    windows, owner = encode_windows(tokenizer, texts, max_length=max_length, overlap=overlap)
+    batches = encode_window_batches(tokenizer, windows, token_budget=token_budget or batch_size * max_length)
+    if depth:
+        batches = prefetch(batches, model_device(model), depth=depth)
+    logits = collect_probs(model, batches, len(windows), forward=forward_logits)
+    with get_profiler().stage("pool", rows=len(texts), windows=len(windows)):
+        probs_all = sigmoid(pool_windows(logits, owner, len(texts), pooling))
+    binary_preds = (probs_all >= threshold).astype(int)
+    return probs_all, binary_preds
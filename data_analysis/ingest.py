@@ -0,0 +1,303 @@
+# ingest.py
+"""
+Incremental (delta) classification of newly scraped articles.
+
+Reads the per-outlet tokenized files in /data (clusters.OUTLET_FILES), classifies
+only rows whose URL is not yet in the manifest and appends them to date-partitioned
+Parquet files:
+
+  results/ingest/manifest.sqlite            classified URLs, per-outlet max Date (watermark), part files,
+                                            outlet file size/mtime at the last complete ingest
+  results/ingest/predictions/date=YYYY-MM/  <outlet>-<run>.parquet (prediction_output.py layout + outlet)
+  results/ingest/views/<cluster>[_tN].parquet
+
+After the new rows are written, only the cluster views (and t1–t5 slices) that
+contain an affected outlet and date are rebuilt from the partitions, so a daily run
+costs time proportional to the new articles, not the archive. Rows dated before an
+outlet's watermark that were never seen (late scrapes) are classified too and
+reported as late arrivals, as long as they are at most --late-days older than the
+watermark; older rows are skipped without a manifest lookup. An outlet file whose
+size and mtime have not changed since its last complete ingest is not read at all
+(--full-scan reads everything).
+
+A part file is only referenced once its manifest rows are committed; parts left
+behind by a crashed run are deleted on the next start, so reruns never duplicate.
+
+  python ingest.py                  # classify new rows, refresh affected views
+  python ingest.py --dry-run        # only count new rows per outlet
+  python ingest.py --rebuild-views  # rebuild every view from the partitions
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import argparse
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import finetuned_analysis as fa
+from clusters import CLUSTERS, OUTLET_FILES, PERIODS, clusters_of, period_of, view_names
+from prediction_cache import PredictionCache
+from prediction_output import write_table
+from profiling import add_profiling_args, configure_from_args, format_summary, get_profiler
+
+# Paths (under fa.RESULTS_DIR, resolved on use so --results-dir applies)
+def ingest_dir(*parts):
+    return os.path.join(fa.RESULTS_DIR, "ingest", *parts)
+
+def manifest_path():
+    return ingest_dir("manifest.sqlite")
+
+def partitions_dir():
+    return ingest_dir("predictions")
+
+def views_dir():
+    return ingest_dir("views")
+
+class Manifest:
+    """SQLite record of classified URLs, per-outlet date watermarks and committed part files."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS articles (url TEXT PRIMARY KEY, outlet TEXT NOT NULL, date TEXT, part TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS watermarks (outlet TEXT PRIMARY KEY, max_date TEXT, updated_at TEXT);"
+            "CREATE TABLE IF NOT EXISTS parts (part TEXT PRIMARY KEY, outlet TEXT NOT NULL, rows INTEGER, run TEXT, created_at TEXT);"
+            "CREATE TABLE IF NOT EXISTS files (outlet TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, scanned_at TEXT);"
+        )
+        self.conn.commit()
+
+    def known_urls(self, urls, chunk_size: int = 500) -> set:
+        urls = list(dict.fromkeys(urls))
+        known = set()
+        for i in range(0, len(urls), chunk_size):
+            chunk = urls[i:i+chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            known.update(u for (u,) in self.conn.execute(f"SELECT url FROM articles WHERE url IN ({placeholders})", chunk))
+        return known
+
+    def watermark(self, outlet: str):
+        row = self.conn.execute("SELECT max_date FROM watermarks WHERE outlet = ?", (outlet,)).fetchone()
+        return row[0] if row else None
+
+    def watermarks(self) -> dict:
+        return dict(self.conn.execute("SELECT outlet, max_date FROM watermarks"))
+
+    def file_unchanged(self, outlet: str, stat: os.stat_result) -> bool:
+        """True if the outlet file has the size and mtime it had when it was last fully ingested."""
+        row = self.conn.execute("SELECT size, mtime_ns FROM files WHERE outlet = ?", (outlet,)).fetchone()
+        return row == (stat.st_size, stat.st_mtime_ns)
+
+    def record_file(self, outlet: str, stat: os.stat_result):
+        """Remember the outlet file's size and mtime (taken before the scan) once all its new rows are committed."""
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO files (outlet, size, mtime_ns, scanned_at) VALUES (?, ?, ?, ?)",
+                              (outlet, stat.st_size, stat.st_mtime_ns, datetime.now().isoformat(timespec="seconds")))
+
+    def parts(self) -> set:
+        return {p for (p,) in self.conn.execute("SELECT part FROM parts")}
+
+    def commit_part(self, outlet: str, part: str, rows: pd.DataFrame, run: str):
+        """Record a written part file and its URLs in one transaction; advances the outlet watermark."""
+        now = datetime.now().isoformat(timespec="seconds")
+        dates = rows["Date"].dropna()
+        with self.conn:
+            self.conn.execute("INSERT INTO parts (part, outlet, rows, run, created_at) VALUES (?, ?, ?, ?, ?)",
+                              (part, outlet, len(rows), run, now))
+            self.conn.executemany("INSERT OR REPLACE INTO articles (url, outlet, date, part) VALUES (?, ?, ?, ?)",
+                                  [(u, outlet, d, part) for u, d in zip(rows["URL"], rows["Date"])])
+            if len(dates):
+                self.conn.execute(
+                    "INSERT INTO watermarks (outlet, max_date, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(outlet) DO UPDATE SET max_date = MAX(COALESCE(max_date, ''), excluded.max_date), updated_at = excluded.updated_at",
+                    (outlet, dates.max(), now))
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+def normalize_dates(series):
+    """YYYY-MM-DD strings (None if unparseable), so string order is date order."""
+    parsed = pd.to_datetime(series, errors="coerce")
+    return parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), None)
+
+def partition_of(dates, by="month"):
+    width = 7 if by == "month" else 10
+    return dates.fillna("unknown").str.slice(0, width)
+
+def remove_orphan_parts(manifest):
+    """Delete part files that a crashed run wrote but never committed to the manifest."""
+    parts_dir = partitions_dir()
+    if not os.path.isdir(parts_dir):
+        return 0
+    committed, removed = manifest.parts(), 0
+    for root, _, files in os.walk(parts_dir):
+        for name in files:
+            rel = os.path.relpath(os.path.join(root, name), parts_dir)
+            if name.endswith((".parquet", ".tmp")) and rel not in committed:
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
+
+def scan_since(watermark, late_days):
+    """Oldest date still scanned for an outlet: its watermark minus the late-arrival margin (None = everything)."""
+    if not watermark or late_days is None:
+        return None
+    return (date.fromisoformat(watermark) - timedelta(days=late_days)).isoformat()
+
+def new_rows(manifest, path, outlet, chunk_rows=5000, since=None):
+    """URL/Date/Text of rows not yet in the manifest (first occurrence per URL).
+
+    since: skip rows dated before this YYYY-MM-DD without looking them up (undated rows are always kept).
+    """
+    prof = get_profiler()
+    frames, seen = [], set()
+    for chunk in prof.iter_stage(fa.iter_csv_chunks(path, chunk_rows, columns=fa.STREAM_COLUMNS), "read_csv"):
+        if "URL" not in chunk.columns or "Text" not in chunk.columns:
+            raise ValueError(f"{path} needs URL and Text columns")
+        chunk = chunk.dropna(subset=["URL", "Text"])
+        if since and "Date" in chunk.columns:
+            dates = normalize_dates(chunk["Date"])
+            chunk = chunk[dates.isna() | (dates >= since)]
+        chunk = chunk[~chunk["URL"].isin(seen)].drop_duplicates("URL")
+        seen.update(chunk["URL"])
+        with prof.stage("manifest_lookup", rows=len(chunk)):
+            known = manifest.known_urls(chunk["URL"].tolist())
+        frames.append(chunk[~chunk["URL"].isin(known)])
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=fa.STREAM_COLUMNS)
+    df["Date"] = normalize_dates(df["Date"]) if "Date" in df.columns else None
+    df.insert(0, "outlet", outlet)
+    return df[["outlet", "URL", "Date", "Text"]]
+
+def ingest_outlet(predictor, manifest, outlet, df, run, partition_by="month"):
+    """Classify `df` and write one part file per date partition; returns the affected (cluster view) names."""
+    prof = get_profiler()
+    for partition, rows in df.groupby(partition_of(df["Date"], partition_by), sort=True):
+        part = os.path.join(f"date={partition}", f"{outlet}-{run}.parquet")
+        table = predictor.predictions_table(rows[["outlet", "URL", "Date"]], rows["Text"].astype(str).tolist(), source=OUTLET_FILES[outlet])
+        with prof.stage("write_parquet", rows=len(rows), partition=partition):
+            write_table(table, os.path.join(partitions_dir(), part))
+        manifest.commit_part(outlet, part, rows, run)
+        print(f"  {outlet}: {len(rows)} rows → {part}")
+    return affected_views(outlet, df["Date"])
+
+def affected_views(outlet, dates):
+    periods = {p for p in period_of(dates) if p}
+    return {f"{cluster}{suffix}" for cluster in clusters_of(outlet) for suffix in [""] + [f"_{p}" for p in sorted(periods)]}
+
+def view_filter(view):
+    """(cluster, period) of a view name such as cluster1_politicalcompliance_il_t3."""
+    cluster, _, period = view.rpartition("_")
+    return (cluster, period) if period in PERIODS else (view, None)
+
+def build_view(view):
+    """Rebuild one cluster (or cluster × period) view from the date partitions."""
+    cluster, period = view_filter(view)
+    dataset = ds.dataset(partitions_dir(), format="parquet", partitioning="hive")
+    expr = ds.field("outlet").isin(CLUSTERS[cluster])
+    if period:
+        start, end = PERIODS[period]
+        expr = expr & (ds.field("Date") >= start) & (ds.field("Date") <= end)
+    table = dataset.to_table(filter=expr)
+    if "date" in table.column_names:
+        table = table.drop_columns(["date"])  # hive partition column
+    # Newest first, as in the R cluster files
+    table = table.sort_by([("Date", "descending")])
+    first_part = next(iter(dataset.files), None)
+    if first_part is not None:
+        table = table.replace_schema_metadata(pq.read_schema(first_part).metadata)
+    write_table(table, os.path.join(views_dir(), f"{view}.parquet"))
+    return len(table)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    fa.add_path_args(parser)
+    parser.add_argument("--outlets", nargs="+", choices=sorted(OUTLET_FILES), default=None, help="Only ingest these outlets.")
+    parser.add_argument("--dry-run", action="store_true", help="Count new rows per outlet; classify and write nothing.")
+    parser.add_argument("--partition-by", choices=["month", "day"], default="month")
+    parser.add_argument("--rebuild-views", action="store_true", help="Rebuild every cluster view, not only the affected ones.")
+    parser.add_argument("--late-days", type=int, default=30,
+                        help="Only scan rows dated at most this many days before the outlet's watermark (late scrapes).")
+    parser.add_argument("--full-scan", action="store_true",
+                        help="Scan every row of every outlet file, even unchanged files and rows older than --late-days.")
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="Rows per CSV chunk while scanning for new URLs.")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update the persistent prediction store.")
+    parser.add_argument("--token-budget", type=int, default=4096)
+    parser.add_argument("--pipeline", action="store_true", help="Overlap tokenization with the forward pass (see finetuned_analysis.py).")
+    add_profiling_args(parser, fa.metrics_path("ingest"))
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    fa.apply_path_args(args, "ingest")
+    t0 = time.time()
+    prof = configure_from_args(args, "ingest")
+    run = f"{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:4]}"
+
+    manifest = Manifest(manifest_path())
+    removed = remove_orphan_parts(manifest)
+    if removed:
+        print(f"Removed {removed} uncommitted part file(s) from an earlier run")
+
+    outlets = args.outlets or sorted(OUTLET_FILES)
+    watermarks = manifest.watermarks()
+    pending, stats, unchanged = {}, {}, []
+    for outlet in outlets:
+        path = os.path.join(fa.DATA_DIR, OUTLET_FILES[outlet])
+        if not os.path.exists(path):
+            continue
+        stats[outlet] = os.stat(path)
+        if not args.full_scan and manifest.file_unchanged(outlet, stats[outlet]):
+            unchanged.append(outlet)
+            continue
+        mark = watermarks.get(outlet)
+        since = None if args.full_scan else scan_since(mark, args.late_days)
+        with prof.tagged(outlet=outlet):
+            df = new_rows(manifest, path, outlet, chunk_rows=args.chunk_rows, since=since)
+        if len(df):
+            late = int((df["Date"].notna() & (df["Date"] <= mark)).sum()) if mark else 0
+            print(f"{outlet}: {len(df)} new rows (watermark {mark or '—'}, {late} late arrivals)")
+            pending[outlet] = df
+        elif not args.dry_run:
+            manifest.record_file(outlet, stats[outlet])
+
+    total_new = sum(len(df) for df in pending.values())
+    print(f"\n{total_new} new rows across {len(pending)} outlets" + (f" ({len(unchanged)} outlet files unchanged)" if unchanged else ""))
+    if args.dry_run:
+        manifest.close()
+        raise SystemExit(0)
+
+    cache = None if args.no_cache else PredictionCache(fa.CACHE_PATH)
+    predictor = fa.FramePredictor(cache=cache, token_budget=args.token_budget, pipeline=args.pipeline) if pending else None
+
+    views = set(view_names()) if args.rebuild_views else set()
+    for outlet, df in pending.items():
+        with prof.tagged(outlet=outlet), prof.stage("outlet", rows=len(df)):
+            views |= ingest_outlet(predictor, manifest, outlet, df, run, partition_by=args.partition_by)
+        manifest.record_file(outlet, stats[outlet])
+    if predictor:
+        predictor.close()
+
+    for view in sorted(views):
+        with prof.stage("build_view", view=view) as rec:
+            rec["rows"] = build_view(view)
+        print(f"View {view}: {rec['rows']} rows")
+
+    notes = f"{total_new} new rows ({', '.join(f'{o}={len(d)}' for o, d in pending.items()) or 'none'}) | views refreshed: {len(views)} | manifest: {manifest.count()} URLs"
+    manifest.close()
+    if cache:
+        cache.close()
+    stages = prof.summary()
+    if prof.path:
+        notes += f" | slowest stages: {format_summary(stages)}"
+    prof.close()
+    fa.log_to_readme("Incremental ingest (new URLs only)", t0, notes=notes)
+    print("\nIngest complete.")
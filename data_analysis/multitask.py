@@ -0,0 +1,117 @@
+# multitask.py
+"""
+Shared-encoder model for LabelFrames + TopLabelFrames.
+
+One Longformer encoder, two classification heads. forward() returns a single
+`logits` tensor [LabelFrames logits | TopLabelFrames logits], so the model plugs
+into inference.predict_labels unchanged; split_probs() cuts the columns apart.
+Training expects `labels` in the same concatenated layout; the loss is the sum
+of one BCE-with-logits term per head so the small TopLabelFrames head is not
+drowned out by the fine-grained label count.
+
+Saved layout (results/longformer/trained_models/longformer_multitask):
+  - encoder config/weights + tokenizer (AutoModel / AutoTokenizer format)
+  - heads.safetensors, multitask_config.json
+  - label2id_longformer_multitask_labelframes.json
+  - label2id_longformer_multitask_topframes.json
+"""
+
+import os
+import json
+import inspect
+
+import torch
+from torch import nn
+from safetensors.torch import save_file, load_file
+from transformers import AutoModel
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+CONFIG_FILE = "multitask_config.json"
+HEADS_FILE = "heads.safetensors"
+LABEL_JSON = "label2id_longformer_multitask_labelframes.json"
+TOP_JSON = "label2id_longformer_multitask_topframes.json"
+
+class ClassificationHead(nn.Module):
+    """Same shape as the Longformer/RoBERTa sequence classification head (CLS → dense → tanh → out)."""
+
+    def __init__(self, hidden_size, num_labels, dropout):
+        super().__init__()
+        self.dense = nn.Linear(hidden_size, hidden_size)
+        self.dropout = nn.Dropout(dropout)
+        self.out_proj = nn.Linear(hidden_size, num_labels)
+
+    def forward(self, hidden_states):
+        x = self.dropout(hidden_states[:, 0, :])
+        x = torch.tanh(self.dense(x))
+        return self.out_proj(self.dropout(x))
+
+class MultiTaskClassifier(nn.Module):
+    def __init__(self, encoder, num_labels_label, num_labels_top):
+        super().__init__()
+        self.encoder = encoder
+        self.config = encoder.config
+        self.num_labels_label = num_labels_label
+        self.num_labels_top = num_labels_top
+        hidden, dropout = encoder.config.hidden_size, encoder.config.hidden_dropout_prob
+        self.head_label = ClassificationHead(hidden, num_labels_label, dropout)
+        self.head_top = ClassificationHead(hidden, num_labels_top, dropout)
+        self.uses_global_attention = "global_attention_mask" in inspect.signature(encoder.forward).parameters
+
+    def forward(self, input_ids=None, attention_mask=None, labels=None):
+        kwargs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if self.uses_global_attention:
+            # Global attention on <s>, as LongformerForSequenceClassification does
+            global_attention_mask = torch.zeros_like(input_ids)
+            global_attention_mask[:, 0] = 1
+            kwargs["global_attention_mask"] = global_attention_mask
+        hidden_states = self.encoder(**kwargs)[0]
+        logits_label = self.head_label(hidden_states)
+        logits_top = self.head_top(hidden_states)
+
+        loss = None
+        if labels is not None:
+            bce = nn.BCEWithLogitsLoss()
+            labels = labels.to(logits_label.dtype)
+            loss = (bce(logits_label, labels[:, :self.num_labels_label])
+                    + bce(logits_top, labels[:, self.num_labels_label:]))
+        return SequenceClassifierOutput(loss=loss, logits=torch.cat([logits_label, logits_top], dim=-1))
+
+    def gradient_checkpointing_enable(self, gradient_checkpointing_kwargs=None):
+        # Called by Trainer(gradient_checkpointing=True); only the encoder has checkpointable layers
+        self.encoder.gradient_checkpointing_enable(gradient_checkpointing_kwargs=gradient_checkpointing_kwargs)
+
+    def split_logits(self, logits):
+        return logits[..., :self.num_labels_label], logits[..., self.num_labels_label:]
+
+    def save_pretrained(self, save_path, label2id_label, label2id_top):
+        os.makedirs(save_path, exist_ok=True)
+        self.encoder.save_pretrained(save_path)
+        heads = {f"head_label.{k}": v.contiguous() for k, v in self.head_label.state_dict().items()}
+        heads.update({f"head_top.{k}": v.contiguous() for k, v in self.head_top.state_dict().items()})
+        save_file(heads, os.path.join(save_path, HEADS_FILE))
+        with open(os.path.join(save_path, CONFIG_FILE), "w") as f:
+            json.dump({"num_labels_label": self.num_labels_label, "num_labels_top": self.num_labels_top}, f, indent=2)
+        with open(os.path.join(save_path, LABEL_JSON), "w") as f:
+            json.dump(label2id_label, f, indent=2)
+        with open(os.path.join(save_path, TOP_JSON), "w") as f:
+            json.dump(label2id_top, f, indent=2)
+
+    @classmethod
+    def from_pretrained(cls, save_path):
+        with open(os.path.join(save_path, CONFIG_FILE), "r") as f:
+            cfg = json.load(f)
+        model = cls(AutoModel.from_pretrained(save_path), cfg["num_labels_label"], cfg["num_labels_top"])
+        heads = load_file(os.path.join(save_path, HEADS_FILE))
+        model.head_label.load_state_dict({k.split(".", 1)[1]: v for k, v in heads.items() if k.startswith("head_label.")})
+        model.head_top.load_state_dict({k.split(".", 1)[1]: v for k, v in heads.items() if k.startswith("head_top.")})
+        return model
+
+def load_label_maps(save_path):
+    with open(os.path.join(save_path, LABEL_JSON), "r") as f:
+        label2id_label = json.load(f)
+    with open(os.path.join(save_path, TOP_JSON), "r") as f:
+        label2id_top = json.load(f)
+    return label2id_label, label2id_top
+
+def split_probs(probs, num_labels_label):
+    return probs[:, :num_labels_label], probs[:, num_labels_label:]
@@ -0,0 +1,97 @@
+# parallel_inference.py
+"""
+Multi-process CPU inference for finetuned_analysis.py.
+
+Rows are sharded across N forked workers. Each worker inherits the already
+loaded models from the parent (fork, copy-on-write, so nothing is reloaded) and
+limits torch to cpu_count // N intra-op threads so cores are not oversubscribed.
+Shards are built round-robin over the length-sorted rows, so every worker gets a
+similar token load, and results are scattered back into the original row order.
+
+ShardedPredictor.predict_labels has the same signature and (probs, binary_preds)
+contract as inference.predict_labels, so it can be passed wherever that is used.
+Linux/macOS only (needs the fork start method); CPU only.
+"""
+
+import os
+import time
+import multiprocessing as mp
+
+import numpy as np
+import torch
+
+from inference import predict_labels
+
+# name → (model, tokenizer) and the predict function; set in the parent before forking, inherited by workers
+_MODELS = {}
+_PREDICT_FN = {"fn": predict_labels}
+
+def _init_worker(threads):
+    torch.set_num_threads(threads)
+
+def _predict_shard(name, texts, batch_size, max_length, token_budget):
+    model, tokenizer = _MODELS[name]
+    probs, _ = _PREDICT_FN["fn"](model, tokenizer, texts, batch_size=batch_size, max_length=max_length, token_budget=token_budget)
+    return probs
+
+def shard_indices(texts, n_shards):
+    """Round-robin over rows sorted by length (longest first) → balanced shards."""
+    order = np.argsort([len(t) for t in texts], kind="stable")[::-1]
+    return [order[i::n_shards] for i in range(n_shards) if len(order[i::n_shards])]
+
+class ShardedPredictor:
+    def __init__(self, models, workers, threads_per_worker=None, predict_fn=predict_labels):
+        """models: {name: (model, tokenizer)}; models must already be on the CPU and in eval mode.
+        predict_fn: what each worker runs on its shard (e.g. inference.predict_labels_chunked)."""
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.names = {id(model): name for name, (model, _) in models.items()}
+        _MODELS.update(models)
+        _PREDICT_FN["fn"] = predict_fn
+        # Forked children must not inherit a busy Rust tokenizer thread pool
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        ctx = mp.get_context("fork")
+        self.pool = ctx.Pool(workers, initializer=_init_worker, initargs=(self.threads_per_worker,))
+
+    def predict_labels(self, model, tokenizer, texts, threshold=0.5, batch_size=4, max_length=512, token_budget=None):
+        name = self.names[id(model)]
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0)), np.empty((0, 0), dtype=int)
+        shards = shard_indices(texts, self.workers)
+        results = self.pool.starmap(
+            _predict_shard,
+            [(name, [texts[i] for i in shard], batch_size, max_length, token_budget) for shard in shards],
+        )
+        probs_all = np.empty((len(texts), results[0].shape[1]), dtype=results[0].dtype)
+        for shard, probs in zip(shards, results):
+            probs_all[shard] = probs
+        binary_preds = (probs_all >= threshold).astype(int)
+        return probs_all, binary_preds
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+def scaling_table(models, texts, worker_counts, max_lengths, token_budget=None):
+    """Docs/sec over `texts` for each worker count; max_lengths: {name: max_length}."""
+    rows = []
+    for n in worker_counts:
+        sharded = ShardedPredictor(models, n)
+        t0 = time.perf_counter()
+        for name, (model, tokenizer) in models.items():
+            sharded.predict_labels(model, tokenizer, texts, max_length=max_lengths[name], token_budget=token_budget)
+        elapsed = time.perf_counter() - t0
+        sharded.close()
+        rows.append({"workers": n, "threads_per_worker": sharded.threads_per_worker,
+                     "docs_per_sec": len(texts) / elapsed if elapsed else float("nan")})
+    base = rows[0]["docs_per_sec"] if rows else float("nan")
+    for r in rows:
+        r["speedup"] = r["docs_per_sec"] / base if base else float("nan")
+    return rows
+
+def format_scaling_table(rows):
+    lines = ["| workers | threads/worker | docs/sec | speedup |", "|---|---|---|---|"]
+    for r in rows:
+        lines.append(f"| {r['workers']} | {r['threads_per_worker']} | {r['docs_per_sec']:.2f} | {r['speedup']:.2f}x |")
+    return lines
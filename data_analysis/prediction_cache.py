@@ -0,0 +1,133 @@
+# prediction_cache.py
+"""
+Persistent prediction store for finetuned_analysis.py.
+
+Probabilities are keyed by
+  - a hash of the normalized article text, and
+  - a fingerprint of the model directory plus the max_length used,
+so an article that appears in several cluster files (full cluster, t1–t5
+slices, cluster1/cluster2 regroupings) only goes through a model once.
+The store is a single SQLite file, so re-runs only pay for new articles.
+Model fingerprints are remembered next to the weights (fingerprint.cache) and
+only recomputed when a file's size or mtime changes.
+"""
+
+import os
+import re
+import json
+import sqlite3
+import threading
+import hashlib
+import unicodedata
+
+import numpy as np
+
+# Files in a model folder that define its predictions (weights, config, tokenizer, label maps)
+FINGERPRINT_SUFFIXES = (".json", ".safetensors", ".bin", ".txt", ".model")
+# Remembered fingerprints per model folder (its suffix keeps it out of the hash)
+FINGERPRINT_FILE = "fingerprint.cache"
+
+def normalize_text(text) -> str:
+    text = unicodedata.normalize("NFC", str(text))
+    return re.sub(r"\s+", " ", text).strip()
+
+def text_key(text) -> str:
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).hexdigest()
+
+def fingerprint_files(model_dir: str):
+    """(name, size, mtime_ns) of the files model_fingerprint hashes, in hashing order."""
+    files = []
+    for name in sorted(os.listdir(model_dir)):
+        path = os.path.join(model_dir, name)
+        if os.path.isfile(path) and name.endswith(FINGERPRINT_SUFFIXES):
+            st = os.stat(path)
+            files.append([name, st.st_size, st.st_mtime_ns])
+    return files
+
+def model_fingerprint(model_dir: str, max_length: int, backend: str = "torch", variant: str = None) -> str:
+    """Content hash of the model folder plus the inference max_length (and backend, if not plain torch;
+    variant for inference modes with different outputs, e.g. chunked pooling).
+
+    The result is remembered in <model_dir>/FINGERPRINT_FILE under the files' (name, size, mtime_ns),
+    so the weights are only re-read after they change.
+    """
+    files = fingerprint_files(model_dir)
+    setting = f"{max_length}|{backend}|{variant or ''}"
+    stored_path = os.path.join(model_dir, FINGERPRINT_FILE)
+    try:
+        with open(stored_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("files") != files:
+            stored = {"files": files, "fingerprints": {}}
+    except (OSError, ValueError):
+        stored = {"files": files, "fingerprints": {}}
+    if setting in stored["fingerprints"]:
+        return stored["fingerprints"][setting]
+
+    h = hashlib.blake2b(digest_size=16)
+    for name, _, _ in files:
+        h.update(name.encode("utf-8"))
+        with open(os.path.join(model_dir, name), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    h.update(f"max_length={max_length}".encode("utf-8"))
+    if backend != "torch":
+        h.update(f"backend={backend}".encode("utf-8"))
+    if variant:
+        h.update(f"variant={variant}".encode("utf-8"))
+    stored["fingerprints"][setting] = h.hexdigest()
+    try:
+        tmp = f"{stored_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2)
+        os.replace(tmp, stored_path)
+    except OSError:
+        pass  # read-only model folder: hash again next time
+    return stored["fingerprints"][setting]
+
+class PredictionCache:
+    """SQLite-backed map (model fingerprint, text key) → float32 probability row."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # Shared by the concurrently predicted models (--pipeline); every access holds the lock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, probs BLOB NOT NULL,"
+            " PRIMARY KEY (model, key)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def get_many(self, model: str, keys, chunk_size: int = 500) -> dict:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), chunk_size):
+                chunk = keys[i:i+chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, probs FROM predictions WHERE model = ? AND key IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, items: dict):
+        rows = [(model, key, np.asarray(probs, dtype=np.float32).tobytes()) for key, probs in items.items()]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO predictions (model, key, probs) VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+
+    def count(self, model: str = None) -> int:
+        with self.lock:
+            if model is None:
+                return self.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM predictions WHERE model = ?", (model,)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,132 @@
+# prediction_output.py
+"""
+Columnar prediction files for finetuned_analysis.py (--output-format parquet).
+
+Instead of a full copy of the input CSV, every output file holds one row per article:
+  row, key (text hash, see prediction_cache.text_key), URL, Date (if present),
+  LabelFrames_pred, TopLabelFrames_pred,
+  probs_label, probs_top — float16 fixed-size lists, one probability per label,
+  routed — with --cascade only: True where the transformers scored the row, False
+           where the TF-IDF + linear model's prediction was kept
+and the label names, threshold, source file (and the cascade model, band and top
+margin) in the Parquet schema metadata, so downstream analysis can re-threshold
+without running the models again:
+
+  df, probs_label, probs_top, meta = read_predictions("results/eval_data.parquet")
+  df["LabelFrames_pred"] = decode_label_frames(probs_label, probs_label >= 0.3, meta["labels_label"])
+
+--stream writes a directory of part-NNNNN.parquet files instead (one per chunk);
+read_predictions reads both layouts, and the date=YYYY-MM partitions written by ingest.py.
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+SEP = "|"
+META_KEY = b"framing_gaza"
+
+# Decoding (vectorized)
+def label_array(id2label):
+    """{id: name} (or a list of names) → object array indexed by label id."""
+    if isinstance(id2label, dict):
+        return np.array([id2label[i] for i in range(len(id2label))], dtype=object)
+    return np.asarray(id2label, dtype=object)
+
+def decode_label_frames(probs, preds, id2label):
+    """'|' joined labels where preds == 1 per row; rows with none fall back to the argmax label."""
+    if not len(probs):
+        return []
+    labels = label_array(id2label)
+    mask = np.asarray(preds).astype(bool)
+    empty = ~mask.any(axis=1)
+    mask[empty, np.argmax(probs[empty], axis=1)] = True
+    _, cols = np.nonzero(mask)
+    groups = np.split(labels[cols], np.cumsum(mask.sum(axis=1))[:-1])
+    return [SEP.join(g) for g in groups]
+
+def decode_top_frames(probs, id2label):
+    if not len(probs):
+        return []
+    return label_array(id2label)[np.argmax(probs, axis=1)].tolist()
+
+# Writing
+def probs_column(probs, width):
+    """(rows, labels) matrix → float16 fixed_size_list column."""
+    probs = np.asarray(probs, dtype=np.float16).reshape(-1, width)
+    return pa.FixedSizeListArray.from_arrays(pa.array(probs.ravel()), width)
+
+def predictions_table(base, label_strings, top_preds, probs_label, probs_top, labels_label, labels_top, threshold=0.5, source=None,
+                      routed=None, cascade=None):
+    """base: DataFrame with row, key and any passthrough columns (URL, Date).
+
+    A column whose predictions are None (task not run) is left out, as is routed without a cascade.
+    cascade: {"model", "band", "top_margin"} of the linear cascade, stored in the metadata.
+    """
+    table = pa.Table.from_pandas(base.reset_index(drop=True), preserve_index=False)
+    if label_strings is not None:
+        table = table.append_column("LabelFrames_pred", pa.array(label_strings, type=pa.string()))
+    if top_preds is not None:
+        table = table.append_column("TopLabelFrames_pred", pa.array(top_preds, type=pa.string()))
+    if label_strings is not None:
+        table = table.append_column("probs_label", probs_column(probs_label, len(labels_label)))
+    if top_preds is not None:
+        table = table.append_column("probs_top", probs_column(probs_top, len(labels_top)))
+    if routed is not None:
+        table = table.append_column("routed", pa.array(np.asarray(routed, dtype=bool)))
+    meta = {"labels_label": None if labels_label is None else list(labels_label),
+            "labels_top": None if labels_top is None else list(labels_top), "threshold": threshold, "source": source,
+            "cascade": cascade}
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: json.dumps(meta).encode("utf-8")})
+
+def write_table(table, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+def part_path(out_dir, index):
+    return os.path.join(out_dir, f"part-{index:05d}.parquet")
+
+def remove_parts_from(out_dir, first_index):
+    """Delete part files ≥ first_index (written after the last checkpoint)."""
+    if not os.path.isdir(out_dir):
+        return
+    for name in os.listdir(out_dir):
+        if name.startswith("part-") and name.endswith(".parquet") and int(name[5:10]) >= first_index:
+            os.remove(os.path.join(out_dir, name))
+
+# Reading
+def read_predictions(path, columns=None):
+    """Returns (df without prob columns, probs_label, probs_top, meta) from a file or a part directory."""
+    if os.path.isdir(path) and any(f.startswith("date=") for f in os.listdir(path)):
+        # Date-partitioned dataset written by ingest.py
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        table = dataset.to_table(columns=columns) if dataset.files else None
+        meta_source = dataset.files[0] if dataset.files else None
+        if table is not None and "date" in table.column_names:
+            table = table.drop_columns(["date"])
+    elif os.path.isdir(path):
+        parts = sorted(os.path.join(path, f) for f in os.listdir(path) if f.startswith("part-") and f.endswith(".parquet"))
+        table = pa.concat_tables([pq.read_table(p, columns=columns) for p in parts]) if parts else None
+        meta_source = parts[0] if parts else None
+    else:
+        table = pq.read_table(path, columns=columns)
+        meta_source = path
+    if table is None:
+        return pd.DataFrame(), np.empty((0, 0), np.float16), np.empty((0, 0), np.float16), {}
+    meta = json.loads(pq.read_schema(meta_source).metadata[META_KEY])
+
+    probs = {}
+    for name in ("probs_label", "probs_top"):
+        if name in table.column_names:
+            col = table.column(name).combine_chunks()
+            probs[name] = np.asarray(col.flatten()).reshape(len(col), col.type.list_size)
+            table = table.drop_columns([name])
+    df = table.to_pandas()
+    return df, probs.get("probs_label"), probs.get("probs_top"), meta
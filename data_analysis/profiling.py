@@ -0,0 +1,205 @@
+# profiling.py
+"""
+Per-stage instrumentation shared by finetuned_analysis.py, train_longformer.py and
+evaluate_zeroshot.py.
+
+Every timed stage becomes one JSON line in the metrics file:
+  {"ts", "run", "script", "pid", "event": "stage", "stage", "seconds", "peak_rss_mb", <tags>, <fields>}
+Tags (e.g. file=...) are attached with Profiler.tagged(); per-batch stages carry rows,
+tokens, padded_tokens and padding_ratio (see token_stats). A "summary" line with the
+total seconds per stage closes the run.
+
+--profile-batch N additionally records a torch.profiler trace (Chrome trace JSON,
+open in chrome://tracing or Perfetto) around the N-th forward batch / training step.
+
+Scripts call configure() once after parsing their flags; library code (inference.py,
+the zero-shot engine) calls get_profiler(), which is a no-op recorder until configured.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import resource
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+from datetime import datetime
+
+_PROFILER = None
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KiB on Linux
+
+def device_peak_mb():
+    """Peak CUDA allocation (MB) if torch with CUDA is already in use, else None."""
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        return torch.cuda.max_memory_allocated() / (1024 * 1024)
+    return None
+
+def token_stats(enc):
+    """rows, real tokens, padded tokens and padding ratio of a padded batch (needs attention_mask)."""
+    mask = enc["attention_mask"]
+    padded = int(mask.numel()) if hasattr(mask, "numel") else sum(len(m) for m in mask)
+    tokens = int(mask.sum()) if hasattr(mask, "sum") else sum(sum(m) for m in mask)
+    return {"rows": len(mask), "tokens": tokens, "padded_tokens": padded,
+            "padding_ratio": round(1 - tokens / padded, 4) if padded else 0.0}
+
+class Profiler:
+    def __init__(self, path=None, script=None, trace_batch=None, trace_dir=None):
+        self.path = path
+        self.script = script
+        self.run = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.trace_batch = trace_batch
+        self.trace_dir = trace_dir or (os.path.dirname(path) if path else ".")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.batches_seen = 0
+        self.file = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.file = open(path, "a", encoding="utf-8")
+
+    @property
+    def tags(self):
+        # Per thread, so models predicted concurrently (inference.prefetch, FramePredictor) keep their own tags
+        if not hasattr(self._local, "tags"):
+            self._local.tags = {}
+        return self._local.tags
+
+    @tags.setter
+    def tags(self, value):
+        self._local.tags = value
+
+    def add_total(self, name, seconds):
+        with self._lock:
+            self.totals[name] += seconds
+            self.counts[name] += 1
+
+    def emit(self, event, **fields):
+        if self.file is None:
+            return
+        record = {"ts": round(time.time(), 3), "run": self.run, "script": self.script, "pid": os.getpid(),
+                  "event": event, **self.tags, **fields, "peak_rss_mb": round(peak_rss_mb(), 1)}
+        gpu = device_peak_mb()
+        if gpu is not None:
+            record["device_peak_mb"] = round(gpu, 1)
+        # One write per line and a flush, so lines from forked workers do not interleave
+        with self._lock:
+            self.file.write(json.dumps(record, default=str) + "\n")
+            self.file.flush()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Time a block; the yielded dict can be filled with extra fields (rows, tokens, …)."""
+        extra = dict(fields)
+        t0 = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            seconds = time.perf_counter() - t0
+            self.add_total(name, seconds)
+            self.emit("stage", stage=name, seconds=round(seconds, 6), **extra)
+
+    @contextmanager
+    def tagged(self, **tags):
+        previous = dict(self.tags)
+        self.tags.update(tags)
+        try:
+            yield
+        finally:
+            self.tags = previous
+
+    def iter_stage(self, iterable, name):
+        """Yield from `iterable`, timing each step as a `name` stage (e.g. reading CSV chunks)."""
+        it = iter(iterable)
+        while True:
+            with self.stage(name) as rec:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    rec["exhausted"] = True
+                    return
+                rec["rows"] = len(item) if hasattr(item, "__len__") else None
+            yield item
+
+    @contextmanager
+    def trace_step(self):
+        """Counts forward batches / training steps; records a torch.profiler trace on the chosen one."""
+        with self._lock:
+            self.batches_seen += 1
+            batch = self.batches_seen
+        if self.trace_batch is None or batch != self.trace_batch:
+            yield
+            return
+        import torch
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        os.makedirs(self.trace_dir, exist_ok=True)
+        trace_path = os.path.join(self.trace_dir, f"trace_{self.script}_{self.run}_pid{os.getpid()}_batch{batch}.json")
+        with torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True) as prof:
+            yield
+        prof.export_chrome_trace(trace_path)
+        self.emit("trace", batch=batch, path=trace_path)
+        print(f"torch profiler trace (batch {batch}) → {trace_path}")
+
+    def summary(self):
+        """Emit and return total seconds and call counts per stage."""
+        stages = {name: {"seconds": round(self.totals[name], 3), "calls": self.counts[name]} for name in self.totals}
+        self.emit("summary", stages=stages)
+        return stages
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def format_summary(stages, top=6):
+    """Short 'stage=seconds' list of the slowest stages, for the README run log."""
+    ranked = sorted(stages.items(), key=lambda kv: kv[1]["seconds"], reverse=True)[:top]
+    return ", ".join(f"{name}={v['seconds']:.1f}s" for name, v in ranked)
+
+def configure(path=None, script=None, trace_batch=None, trace_dir=None):
+    global _PROFILER
+    if _PROFILER is not None:
+        _PROFILER.close()
+    _PROFILER = Profiler(path, script=script, trace_batch=trace_batch, trace_dir=trace_dir)
+    return _PROFILER
+
+def get_profiler():
+    global _PROFILER
+    if _PROFILER is None:
+        _PROFILER = Profiler()
+    return _PROFILER
+
+def add_profiling_args(parser, default_path):
+    parser.add_argument("--metrics", default=default_path, help=f"JSON-lines stage metrics file (default: {default_path}).")
+    parser.add_argument("--no-metrics", action="store_true", help="Do not write stage metrics.")
+    parser.add_argument("--profile-batch", type=int, default=None,
+                        help="Record a torch.profiler trace around the N-th forward batch / training step.")
+    parser.add_argument("--profile-dir", default=None, help="Where to write the trace (default: next to the metrics file).")
+
+def configure_from_args(args, script):
+    path = None if args.no_metrics else args.metrics
+    return configure(path, script=script, trace_batch=args.profile_batch, trace_dir=args.profile_dir)
+
+class ProfiledCollator:
+    """Wraps a data collator; records time, tokens and padding ratio of every training/eval batch."""
+
+    def __init__(self, collator, profiler=None):
+        self.collator = collator
+        self.profiler = profiler
+
+    def __call__(self, features):
+        prof = self.profiler or get_profiler()
+        with prof.stage("collate") as rec:
+            batch = self.collator(features)
+            if "attention_mask" in batch:
+                rec.update(token_stats(batch))
+        return batch
@@ -0,0 +1,282 @@
+# serve.py
+"""
+Warm local inference service: loads the Longformer (LabelFrames) and MPNet
+(TopLabelFrames) models once and answers over localhost HTTP, so R or a notebook
+can classify a handful of articles without paying torch/model startup each time.
+
+Concurrent requests are coalesced into micro-batches: the batcher thread waits at
+most --window-ms after the first queued request (or until --max-batch texts) and
+runs one FramePredictor.predict_routed over all of them, so batching, the prediction
+store and the outputs are the same as in finetuned_analysis.py.
+
+  python serve.py                                   # http://127.0.0.1:8765
+  python serve.py --window-ms 20 --max-batch 64 --cascade
+
+  POST /predict  {"text": "..."}  or  {"texts": ["...", ...], "tokens": [...optional TokenString...]}
+    → {"predictions": [{"LabelFrames_pred", "TopLabelFrames_pred", "probs_label", "probs_top"(, "routed")}, ...],
+       "labels_label": [...], "labels_top": [...]}
+  GET  /health   → model/label info and batching counters
+
+From R:  httr::POST("http://127.0.0.1:8765/predict", body = list(texts = df$Text), encode = "json")
+
+  python serve.py loadtest --clients 8 --requests 400    # against a running service
+    → throughput and p50/p95 latency, logged to READme.md
+"""
+
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import finetuned_analysis as fa
+from cascade import DEFAULT_BAND, DEFAULT_TOP_MARGIN, LinearFrames
+
+DEFAULT_HOST, DEFAULT_PORT = "127.0.0.1", 8765
+MAX_REQUEST_BYTES = 64 << 20
+
+class Request:
+    def __init__(self, texts, tokens=None):
+        self.texts = texts
+        self.tokens = tokens
+        self.future = Future()
+
+class MicroBatcher:
+    """Single consumer thread that coalesces queued requests and runs predict() once per micro-batch.
+
+    predict(texts, tokens=None) returns (LabelFrames_pred, TopLabelFrames_pred, probs_label, probs_top, routed),
+    like FramePredictor.predict_routed; routed is None without a cascade.
+    """
+
+    def __init__(self, predict, window_ms=10, max_batch=64):
+        self.predict = predict
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.stats = {"requests": 0, "texts": 0, "batches": 0}
+        self.thread = threading.Thread(target=self.run, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, texts, tokens=None):
+        request = Request(texts, tokens)
+        self.queue.put(request)
+        return request.future
+
+    def collect(self):
+        """Block for the first request, then take more until the window closes or max_batch texts."""
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # stop after this batch
+                break
+            batch.append(item)
+            size += len(item.texts)
+        return batch
+
+    def run(self):
+        from profiling import get_profiler
+        prof = get_profiler()
+        while True:
+            batch = self.collect()
+            if batch is None:
+                return
+            texts = [t for r in batch for t in r.texts]
+            tokens = None
+            if any(r.tokens is not None for r in batch):
+                tokens = [t for r in batch for t in (r.tokens if r.tokens is not None else r.texts)]
+            try:
+                with prof.stage("micro_batch", requests=len(batch), rows=len(texts)):
+                    label_strings, top_preds, probs_label, probs_top, routed = self.predict(texts, tokens=tokens)
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            self.stats["requests"] += len(batch)
+            self.stats["texts"] += len(texts)
+            self.stats["batches"] += 1
+            start = 0
+            for r in batch:
+                end = start + len(r.texts)
+                r.future.set_result([
+                    {"LabelFrames_pred": label_strings[i], "TopLabelFrames_pred": top_preds[i],
+                     "probs_label": probs_label[i].tolist(), "probs_top": probs_top[i].tolist(),
+                     **({} if routed is None else {"routed": bool(routed[i])})}
+                    for i in range(start, end)
+                ])
+                start = end
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+def make_handler(batcher, info, timeout=600):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                return self.send_json(404, {"error": "unknown path; use GET /health or POST /predict"})
+            self.send_json(200, {"status": "ok", **info, **batcher.stats, "queued": batcher.queue.qsize()})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                return self.send_json(404, {"error": "unknown path; use POST /predict"})
+            length = int(self.headers.get("Content-Length") or 0)
+            if not 0 < length <= MAX_REQUEST_BYTES:
+                return self.send_json(413 if length else 400, {"error": f"body must be 1 byte to {MAX_REQUEST_BYTES} bytes of JSON"})
+            try:
+                payload = json.loads(self.rfile.read(length))
+                texts = [payload["text"]] if "text" in payload else payload["texts"]
+                tokens = payload.get("tokens")
+                if not isinstance(texts, list) or (tokens is not None and len(tokens) != len(texts)):
+                    raise ValueError("texts must be a list (and tokens, if given, the same length)")
+            except (ValueError, KeyError, TypeError) as e:
+                return self.send_json(400, {"error": f"bad request: {e}"})
+            texts = ["" if t is None else str(t) for t in texts]
+            if not texts:
+                return self.send_json(200, {"predictions": [], **info})
+            try:
+                predictions = batcher.submit(texts, tokens).result(timeout=timeout)
+            except Exception as e:
+                return self.send_json(500, {"error": repr(e)})
+            self.send_json(200, {"predictions": predictions, "labels_label": info["labels_label"], "labels_top": info["labels_top"]})
+
+        def log_message(self, format, *args):
+            pass  # one line per request would drown the batch log
+
+    return Handler
+
+def serve(args):
+    from profiling import configure_from_args
+    prof = configure_from_args(args, "serve")
+    t0 = time.time()
+
+    cache = None if args.no_cache else fa.PredictionCache(fa.CACHE_PATH)
+    predictor = fa.FramePredictor(cache=cache, token_budget=args.token_budget, multitask=args.multitask, backend=args.backend,
+                                  pipeline=args.pipeline, cascade=LinearFrames.load() if args.cascade else None, band=tuple(args.band),
+                                  top_margin=args.top_margin)
+    predictor.models()  # models load lazily; load them (and export with --backend onnx) before the first request
+    labels_label, labels_top = predictor.label_names()
+    info = {"models": "multitask" if args.multitask else "longformer+mpnet", "backend": args.backend,
+            "labels_label": labels_label, "labels_top": labels_top, "window_ms": args.window_ms, "max_batch": args.max_batch,
+            "cascade": predictor.cascade_meta()}
+    batcher = MicroBatcher(predictor.predict_routed, window_ms=args.window_ms, max_batch=args.max_batch)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher, info))
+    server.daemon_threads = True
+    print(f"Models loaded in {time.time() - t0:.1f}s; serving on http://{args.host}:{args.port} "
+          f"(window {args.window_ms} ms, max batch {args.max_batch}). Ctrl-C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping.")
+    finally:
+        server.server_close()
+        batcher.close()
+        predictor.close()
+        if cache:
+            cache.close()
+        prof.close()
+
+# Load test
+def post_json(url, payload, timeout=600):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+def load_test(url, texts, clients=8, requests=400, batch=1):
+    """`clients` threads send `requests` POSTs of `batch` texts each; returns throughput and latency percentiles."""
+    rng = np.random.default_rng(0)
+    payloads = [[texts[i] for i in rng.integers(0, len(texts), batch)] for _ in range(requests)]
+
+    def one(p):
+        start = time.perf_counter()
+        out = post_json(url, {"texts": p})
+        assert len(out["predictions"]) == len(p)
+        return time.perf_counter() - start
+
+    post_json(url, {"texts": payloads[0]})  # warm-up
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = np.array(list(pool.map(one, payloads)))
+    wall = time.perf_counter() - start
+    return {"clients": clients, "requests": requests, "batch": batch, "seconds": wall,
+            "requests_per_sec": requests / wall, "docs_per_sec": requests * batch / wall,
+            "p50_ms": float(np.percentile(latencies, 50) * 1000), "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "max_ms": float(latencies.max() * 1000)}
+
+def run_load_test(args):
+    t0 = time.time()
+    base = args.url.rstrip("/")
+    with urllib.request.urlopen(base + "/health", timeout=10) as resp:
+        health = json.loads(resp.read())
+    texts = pd.read_csv(os.path.join(fa.DATA_DIR, args.texts_from), usecols=["Text"])["Text"].dropna().astype(str).tolist()
+    print(f"Service: {health['models']} ({health['backend']}), window {health['window_ms']} ms, max batch {health['max_batch']}")
+    lines = []
+    for clients in args.clients:
+        r = load_test(base + "/predict", texts, clients=clients, requests=args.requests, batch=args.batch)
+        lines.append(f"clients={clients} batch={args.batch}: {r['docs_per_sec']:.1f} docs/s, "
+                     f"p50={r['p50_ms']:.0f} ms, p95={r['p95_ms']:.0f} ms, max={r['max_ms']:.0f} ms")
+        print(lines[-1])
+    with urllib.request.urlopen(base + "/health", timeout=10) as resp:
+        after = json.loads(resp.read())
+    lines.append(f"micro-batches: {after['batches'] - health['batches']} for {after['requests'] - health['requests']} requests")
+    print(lines[-1])
+
+    fa.log_to_readme(f"Inference service load test ({args.requests} requests × {args.batch} texts, window {health['window_ms']} ms)", t0,
+                     notes=" | ".join(lines))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command")
+    p_lt = sub.add_parser("loadtest", help="Concurrent clients against a running service.")
+    p_lt.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+    p_lt.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8, 16])
+    p_lt.add_argument("--requests", type=int, default=400, help="Requests per client count.")
+    p_lt.add_argument("--batch", type=int, default=1, help="Texts per request.")
+    p_lt.add_argument("--texts-from", default="eval_data.csv", help="CSV in --data-dir to sample texts from.")
+
+    fa.add_path_args(parser)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--window-ms", type=float, default=10, help="How long the batcher waits for more requests after the first.")
+    parser.add_argument("--max-batch", type=int, default=64, help="Texts per micro-batch.")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update the persistent prediction store.")
+    parser.add_argument("--token-budget", type=int, default=4096)
+    parser.add_argument("--multitask", action="store_true")
+    parser.add_argument("--backend", default="torch", choices=fa.BACKENDS)
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--cascade", action="store_true", help="Linear model first (cascade.py); transformers only for uncertain texts.")
+    parser.add_argument("--band", type=float, nargs=2, default=list(DEFAULT_BAND), metavar=("LOW", "HIGH"))
+    parser.add_argument("--top-margin", type=float, default=DEFAULT_TOP_MARGIN)
+    from profiling import add_profiling_args
+    add_profiling_args(parser, fa.metrics_path("serve"))
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    fa.apply_path_args(args, "serve")
+    if args.command == "loadtest":
+        run_load_test(args)
+    else:
+        serve(args)
@@ -2,22 +2,42 @@
 
 import os
 import json
+import math
 import time
+import random
+import shutil
+import hashlib
+import argparse
+import itertools
 import platform
 from datetime import datetime
 
 import torch
 import pandas as pd
 import numpy as np
-from datasets import Dataset, Features, Value
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, TrainingArguments
+import pyarrow.compute as pc
+from datasets import Dataset, load_from_disk
+from functools import partial
+from contextlib import ExitStack
+from transformers import AutoTokenizer, AutoModel, AutoModelForSequenceClassification, DataCollatorWithPadding, EarlyStoppingCallback, Trainer, TrainerCallback, TrainingArguments
+from transformers.trainer_utils import get_last_checkpoint
 from sklearn.metrics import precision_recall_fscore_support, accuracy_score
 
+from inference import predict_labels
+from multitask import MultiTaskClassifier
+from prediction_cache import PredictionCache, model_fingerprint, text_key
+from profiling import ProfiledCollator, add_profiling_args, configure_from_args, device_peak_mb, format_summary, get_profiler, peak_rss_mb
+
 # Paths
 BASE_DIR = os.path.abspath("/Users/davidluu/Model Training & Performance Testing")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 RESULTS_DIR = os.path.join(BASE_DIR, "results", "longformer")
 README_MD = os.path.join(BASE_DIR, "READme.md")
+TOKENIZED_CACHE_DIR = os.path.join(RESULTS_DIR, "tokenized_cache")
+METRICS_PATH = os.path.join(BASE_DIR, "results", "metrics", "train_longformer.jsonl")
+CACHE_PATH = os.path.join(BASE_DIR, "results", "prediction_cache.sqlite")
+# Unlabeled corpora for distillation: together the two political-system clusters cover all 22 outlets
+DISTILL_CORPORA = ["cluster2_politicalsystem_democratic_tokenized.csv", "cluster2_politicalsystem_nondemocratic_tokenized.csv"]
 
 os.makedirs(os.path.join(RESULTS_DIR, "trained_models"), exist_ok=True)
 os.makedirs(os.path.join(RESULTS_DIR, "logs"), exist_ok=True)
@@ -64,8 +84,8 @@ def log_to_readme(action: str, started_at: float, notes: str = ""):
     try:
         with open(README_MD, "a", encoding="utf-8") as f:
             f.write(text)
-    except Exception:
-        pass
+    except OSError as e:
+        print(f"Could not append run log to {README_MD}: {e}")
 
 # Load data
 train_df = pd.read_csv(os.path.join(DATA_DIR, "train_data.csv"))
@@ -78,47 +98,251 @@ eval_df = eval_df[["Text", "LabelFrames", "TopLabelFrames"]]
 
 # Tokenizer
 model_name = "allenai/longformer-base-4096"
+MAX_LENGTH = 1024
 tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
 
-def tokenize(batch):
-    return tokenizer(batch["Text"], truncation=True, padding="max_length", max_length=1024)
+def tokenize(batch, max_length=MAX_LENGTH):
+    # No padding here: DataCollatorWithPadding pads per batch, so short articles stay short
+    return tokenizer(batch["Text"], truncation=True, max_length=max_length)
+
+def tokenized_cache_path(split_name, df, max_length=MAX_LENGTH):
+    """Cache folder keyed by tokenizer, max_length and the exact texts of the split."""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(f"{model_name}|{type(tokenizer).__name__}|{len(tokenizer)}|{max_length}".encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df["Text"], index=False).values.tobytes())
+    return os.path.join(TOKENIZED_CACHE_DIR, f"{split_name}_{h.hexdigest()}")
+
+def load_tokenized(split_name, df, max_length=MAX_LENGTH):
+    """Tokenize once and keep input_ids/attention_mask as memory-mapped Arrow on disk."""
+    path = tokenized_cache_path(split_name, df, max_length)
+    with get_profiler().stage("tokenize", split=split_name, rows=len(df)) as rec:
+        rec["cached"] = os.path.exists(path)
+        if not rec["cached"]:
+            print(f"Tokenizing {split_name} ({len(df)} rows) → {path}")
+            ds = Dataset.from_pandas(df[["Text"]], preserve_index=False)
+            ds = ds.map(tokenize, batched=True, remove_columns=["Text"], fn_kwargs={"max_length": max_length})
+            ds.save_to_disk(path)
+        return load_from_disk(path)
+
+def multi_hot(series, label2id):
+    """Vectorized multi-hot encoding of '|' delimited label strings."""
+    exploded = series.fillna("").astype(str).reset_index(drop=True).str.split(SEP).explode().str.strip()
+    ids = exploded.map(label2id)
+    known = ids.notna().to_numpy()
+    labels = np.zeros((len(series), len(label2id)), dtype=np.float32)
+    labels[exploded.index[known], ids[known].astype(int)] = 1
+    return labels
 
 def short_name(column):
     return "labelframes" if column == "LabelFrames" else "topframes"
 
-def train_for(column_name):
-    t0 = time.time()
-    print(f"\n==============================\nTraining Longformer on {column_name}\n==============================")
-
+def build_label2id(column_name):
     all_labels = sorted({
         label
         for sub in pd.concat([train_df[column_name], eval_df[column_name]]).fillna("")
         for label in split_labels(sub)
     })
-    label2id = {label: i for i, label in enumerate(all_labels)}
-    id2label = {i: label for label, i in label2id.items()}
-    num_labels = len(all_labels)
+    return {label: i for i, label in enumerate(all_labels)}
 
-    save_path = os.path.join(RESULTS_DIR, "trained_models", f"longformer_{short_name(column_name)}")
-    os.makedirs(save_path, exist_ok=True)
+def multilabel_metrics(labels, logits):
+    return prediction_metrics(labels, (logits > 0).astype(int))
+
+def prediction_metrics(labels, preds):
+    labels = labels.astype(int)
+    precision, recall, f1, _ = precision_recall_fscore_support(labels, preds, average="micro", zero_division=0)
+    precision_w, recall_w, f1_w, _ = precision_recall_fscore_support(labels, preds, average="weighted", zero_division=0)
+    acc = accuracy_score(labels.flatten(), preds.flatten())
+    return {
+        "precision_micro": precision, "recall_micro": recall, "f1_micro": f1,
+        "precision_weighted": precision_w, "recall_weighted": recall_w, "f1_weighted": f1_w,
+        "flat_accuracy": acc,
+    }
+
+def compute_metrics(pred):
+    return multilabel_metrics(pred.label_ids, pred.predictions)
+
+class StepProfiler(TrainerCallback):
+    """Times every optimizer step, forwards Trainer logs to the metrics file and traces --profile-batch."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.stack = None
+        self.t0 = None
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self.stack = ExitStack()
+        self.stack.enter_context(self.profiler.trace_step())
+        self.t0 = time.perf_counter()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        seconds = time.perf_counter() - self.t0
+        self.stack.close()
+        self.profiler.add_total("train_step", seconds)
+        self.profiler.emit("stage", stage="train_step", seconds=round(seconds, 6), step=state.global_step, epoch=state.epoch)
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        self.profiler.emit("trainer_log", step=state.global_step, **(logs or {}))
 
-    features = Features({"Text": Value("string"), "LabelFrames": Value("string"), "TopLabelFrames": Value("string")})
+def token_lengths(dataset):
+    """input_ids length per row, straight from the Arrow list offsets (no per-row decoding)."""
+    return pc.list_value_length(dataset.with_format("arrow")["input_ids"]).to_numpy().tolist()
 
-    def set_labels(example):
-        multi = np.zeros(num_labels, dtype=np.float32)
-        for l in split_labels(example[column_name]):
-            if l in label2id:
-                multi[label2id[l]] = 1
-        example["labels"] = multi.tolist()
-        return example
+def with_lengths(dataset, column):
+    """Dataset plus a token-length column, so group_by_length reads it instead of decoding every row."""
+    if not isinstance(dataset, Dataset) or column in dataset.column_names:
+        return dataset
+    return dataset.add_column(column, token_lengths(dataset))
+
+def drop_columns(collator, columns, features):
+    return collator([{k: v for k, v in f.items() if k not in columns} for f in features])
+
+def profiled_trainer(**kwargs):
+    """Trainer with per-batch collate stats (tokens, padding ratio) and per-step timings."""
+    prof = get_profiler()
+    collator = DataCollatorWithPadding(tokenizer)
+    args = kwargs["args"]
+    if args.group_by_length:
+        # Trainer would drop the length column before the sampler sees it (batch_settings turns
+        # remove_unused_columns off), so the collator drops it instead
+        for split in ("train_dataset", "eval_dataset"):
+            if kwargs.get(split) is not None:
+                kwargs[split] = with_lengths(kwargs[split], args.length_column_name)
+        collator = partial(drop_columns, collator, {args.length_column_name})
+    kwargs["data_collator"] = ProfiledCollator(collator, prof)
+    return Trainer(callbacks=[StepProfiler(prof), *kwargs.pop("callbacks", [])], **kwargs)
+
+# Memory-bounded training (--memory-bounded)
+DEFAULT_BATCH = {"per_device_train_batch_size": 1, "per_device_eval_batch_size": 1, "gradient_accumulation_steps": 2}
+
+def bf16_supported(device):
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    if device.type == "cpu":
+        # Only with native bf16 instructions; elsewhere CPU autocast emulates bf16 and is slower than fp32
+        return any(getattr(torch.cpu, name, lambda: False)() for name in ("_is_avx512_bf16_supported", "_is_amx_tile_supported"))
+    return False
+
+def allocated_mb(device):
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated() / (1024 * 1024)
+    if device.type == "mps":
+        return torch.mps.driver_allocated_memory() / (1024 * 1024)
+    return peak_rss_mb()
+
+def training_step_mb(model, batch_size, num_labels, device, bf16, max_length=MAX_LENGTH):
+    """Memory (MB) of one forward + backward on a batch_size × max_length batch, plus the AdamW moments."""
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+    input_ids = torch.randint(0, model.config.vocab_size, (batch_size, max_length), device=device)
+    batch = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids),
+             "labels": torch.zeros(batch_size, num_labels, device=device)}
+    model.train()
+    with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=bf16):
+        loss = model(**batch).loss
+    peak = allocated_mb(device)  # activations are largest right before backward
+    loss.backward()
+    peak = max(peak, allocated_mb(device))
+    model.zero_grad(set_to_none=True)
+    optimizer_mb = 2 * sum(p.numel() * 4 for p in model.parameters() if p.requires_grad) / (1024 * 1024)
+    return peak + optimizer_mb
+
+def probe_batch_size(model, batch_size, num_labels, device, bf16, max_length=MAX_LENGTH):
+    """Peak MB of one training step, or None if it runs out of memory.
+
+    On CPU the step runs in a forked child so its peak RSS does not raise ours
+    (ru_maxrss never goes down) and an OOM kill only takes the child. The child
+    runs single-threaded: torch's intra-op thread pool does not survive fork()
+    once the parent has used it, and the first parallel op would block forever.
+    """
+    if device.type != "cpu":
+        try:
+            return training_step_mb(model, batch_size, num_labels, device, bf16, max_length)
+        except torch.OutOfMemoryError:
+            return None
+        finally:
+            model.zero_grad(set_to_none=True)
+            getattr(torch, device.type).empty_cache()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            torch.set_num_threads(1)
+            os.write(write_fd, f"{training_step_mb(model, batch_size, num_labels, device, bf16, max_length):.1f}".encode())
+        except MemoryError:
+            pass
+        except Exception as e:
+            os.write(write_fd, f"error: {e!r}".encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        out = f.read()
+    os.waitpid(pid, 0)
+    if out.startswith("error: "):
+        raise RuntimeError(f"Batch-size probe failed: {out[7:]}")
+    return float(out) if out else None  # empty: MemoryError or killed by the OOM killer
+
+def search_batch_size(model, num_labels, device, memory_budget_mb, effective_batch_size, bf16, max_length=MAX_LENGTH):
+    """Largest per-device batch that fits the budget; accumulation keeps batch × steps = effective_batch_size."""
+    prof = get_profiler()
+    best = None
+    for batch_size in [b for b in range(1, effective_batch_size + 1) if effective_batch_size % b == 0]:
+        with prof.stage("batch_probe", batch_size=batch_size, max_length=max_length) as rec:
+            peak = probe_batch_size(model, batch_size, num_labels, device, bf16, max_length)
+            rec.update(step_mb=peak, budget_mb=memory_budget_mb)
+        print(f"  batch {batch_size} × {max_length} tokens: " + (f"{peak:,.0f} MB" if peak else "out of memory"))
+        if peak is None or peak > memory_budget_mb:
+            break
+        best = batch_size
+    if best is None:
+        print(f"  Even batch 1 exceeds the {memory_budget_mb:,.0f} MB budget; training with batch 1 anyway.")
+        best = 1
+    return best, effective_batch_size // best
+
+def batch_settings(model, num_labels, device, memory=None, max_length=MAX_LENGTH):
+    """TrainingArguments for the batch/precision profile and a short description for the run log.
+
+    memory=None keeps the original settings (batch 1 × 2 accumulation, fp32).
+    """
+    if memory is None:
+        return dict(DEFAULT_BATCH), "batch=1×2, fp32"
+    bf16 = not memory.no_bf16 and bf16_supported(device)
+    model.gradient_checkpointing_enable()
+    print(f"Searching batch size (budget {memory.memory_budget_gb:g} GB, effective batch {memory.effective_batch_size}, bf16={bf16})")
+    batch_size, accumulation = search_batch_size(model, num_labels, device, memory.memory_budget_gb * 1024,
+                                                 memory.effective_batch_size, bf16, max_length)
+    settings = dict(per_device_train_batch_size=batch_size, per_device_eval_batch_size=batch_size,
+                    gradient_accumulation_steps=accumulation, gradient_checkpointing=True, bf16=bf16, group_by_length=True,
+                    remove_unused_columns=False)
+    if bf16 and device.type == "cpu":
+        settings["use_cpu"] = True  # TrainingArguments only accepts bf16 without an accelerator when told so
+    return settings, f"batch={batch_size}×{accumulation}, {'bf16' if bf16 else 'fp32'}, gradient checkpointing, grouped by length"
+
+def throughput_notes(train_out, device):
+    samples = train_out.metrics.get("train_samples_per_second", float("nan"))
+    notes = f"{samples:.2f} samples/s | peak RSS {peak_rss_mb():,.0f} MB"
+    gpu = device_peak_mb()
+    if gpu is not None:
+        notes += f" | peak CUDA {gpu:,.0f} MB"
+    elif device.type == "mps":
+        notes += f" | MPS driver {torch.mps.driver_allocated_memory() / (1024 * 1024):,.0f} MB"
+    return notes
+
+def train_for(column_name, memory=None):
+    t0 = time.time()
+    print(f"\n==============================\nTraining Longformer on {column_name}\n==============================")
+
+    label2id = build_label2id(column_name)
+    id2label = {i: label for label, i in label2id.items()}
+    num_labels = len(label2id)
 
-    train_dataset = Dataset.from_pandas(train_df, features=features, preserve_index=False)
-    eval_dataset = Dataset.from_pandas(eval_df, features=features, preserve_index=False)
+    save_path = os.path.join(RESULTS_DIR, "trained_models", f"longformer_{short_name(column_name)}")
+    os.makedirs(save_path, exist_ok=True)
 
-    train_dataset = train_dataset.map(tokenize, batched=True, remove_columns=["Text"], load_from_cache_file=False)
-    eval_dataset = eval_dataset.map(tokenize, batched=True, remove_columns=["Text"], load_from_cache_file=False)
-    train_dataset = train_dataset.map(set_labels, batched=False)
-    eval_dataset = eval_dataset.map(set_labels, batched=False)
+    # Tokenized text is shared across label columns and runs; only the labels differ
+    train_dataset = load_tokenized("train", train_df).add_column("labels", multi_hot(train_df[column_name], label2id).tolist())
+    eval_dataset = load_tokenized("eval", eval_df).add_column("labels", multi_hot(eval_df[column_name], label2id).tolist())
 
     model = AutoModelForSequenceClassification.from_pretrained(
         model_name,
@@ -128,26 +352,16 @@ def train_for(column_name):
         label2id=label2id,
     )
 
-    def compute_metrics(pred):
-        labels = pred.label_ids.astype(int)
-        preds = (pred.predictions > 0).astype(int)
-        precision, recall, f1, _ = precision_recall_fscore_support(labels, preds, average="micro", zero_division=0)
-        precision_w, recall_w, f1_w, _ = precision_recall_fscore_support(labels, preds, average="weighted", zero_division=0)
-        acc = accuracy_score(labels.flatten(), preds.flatten())
-        return {
-            "precision_micro": precision, "recall_micro": recall, "f1_micro": f1,
-            "precision_weighted": precision_w, "recall_weighted": recall_w, "f1_weighted": f1_w,
-            "flat_accuracy": acc,
-        }
+    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    print(f"Using device: {device}")
+    batch_args, batch_notes = batch_settings(model.to(device), num_labels, device, memory)
 
     lr = 2e-5 if column_name == "LabelFrames" else 1e-5
     training_args = TrainingArguments(
         output_dir=save_path,
         learning_rate=lr,
         save_strategy="no",
-        per_device_train_batch_size=1,
-        per_device_eval_batch_size=1,
-        gradient_accumulation_steps=2,
+        **batch_args,
         num_train_epochs=3,
         weight_decay=0.01,
         logging_dir=os.path.join(RESULTS_DIR, "logs", f"longformer_{short_name(column_name)}"),
@@ -158,32 +372,529 @@ def train_for(column_name):
         max_grad_norm=1.0,
     )
 
+    prof = get_profiler()
+    trainer = profiled_trainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=eval_dataset,
+        compute_metrics=compute_metrics,
+    )
+    with prof.tagged(column=column_name), prof.stage("train", rows=len(train_dataset)):
+        train_out = trainer.train()
+
+    with prof.stage("save"):
+        model.to("cpu").save_pretrained(save_path)
+        tokenizer.save_pretrained(save_path)
+        with open(os.path.join(save_path, f"label2id_longformer_{short_name(column_name)}.json"), "w") as f:
+            json.dump(label2id, f, indent=2)
+        with open(os.path.join(save_path, f"id2label_longformer_{short_name(column_name)}.json"), "w") as f:
+            json.dump(id2label, f, indent=2)
+
+    print(f"Model and label maps saved to {save_path}")
+    log_to_readme(
+        action=f"Train Longformer on {column_name}",
+        started_at=t0,
+        notes=f"Saved → {save_path} | labels={num_labels} | {batch_notes} | {throughput_notes(train_out, device)}"
+    )
+
+def train_multitask(compare=True, memory=None):
+    """One Longformer encoder with a LabelFrames head and a TopLabelFrames head, trained jointly."""
+    t0 = time.time()
+    print("\n==============================\nTraining multi-task Longformer on LabelFrames + TopLabelFrames\n==============================")
+
+    label2id_label = build_label2id("LabelFrames")
+    label2id_top = build_label2id("TopLabelFrames")
+    num_labels_label = len(label2id_label)
+
+    save_path = os.path.join(RESULTS_DIR, "trained_models", "longformer_multitask")
+    os.makedirs(save_path, exist_ok=True)
+
+    # labels = [LabelFrames multi-hot | TopLabelFrames multi-hot], split again inside the model
+    def joint_labels(df):
+        return np.hstack([multi_hot(df["LabelFrames"], label2id_label), multi_hot(df["TopLabelFrames"], label2id_top)]).tolist()
+
+    train_dataset = load_tokenized("train", train_df).add_column("labels", joint_labels(train_df))
+    eval_dataset = load_tokenized("eval", eval_df).add_column("labels", joint_labels(eval_df))
+
+    model = MultiTaskClassifier(AutoModel.from_pretrained(model_name), num_labels_label, len(label2id_top))
+
+    def compute_multitask_metrics(pred):
+        metrics = {}
+        for prefix, cols in (("labelframes", slice(None, num_labels_label)), ("topframes", slice(num_labels_label, None))):
+            for k, v in multilabel_metrics(pred.label_ids[:, cols], pred.predictions[:, cols]).items():
+                metrics[f"{prefix}_{k}"] = v
+        return metrics
+
     device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
     print(f"Using device: {device}")
+    batch_args, batch_notes = batch_settings(model.to(device), num_labels_label + len(label2id_top), device, memory)
 
-    trainer = Trainer(
-        model=model.to(device),
+    training_args = TrainingArguments(
+        output_dir=save_path,
+        learning_rate=2e-5,
+        save_strategy="no",
+        **batch_args,
+        num_train_epochs=3,
+        weight_decay=0.01,
+        logging_dir=os.path.join(RESULTS_DIR, "logs", "longformer_multitask"),
+        report_to="none",
+        push_to_hub=False,
+        dataloader_pin_memory=False if torch.backends.mps.is_available() else True,
+        load_best_model_at_end=False,
+        max_grad_norm=1.0,
+    )
+
+    prof = get_profiler()
+    trainer = profiled_trainer(
+        model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=eval_dataset,
+        compute_metrics=compute_multitask_metrics,
+    )
+    with prof.tagged(column="multitask"), prof.stage("train", rows=len(train_dataset)):
+        train_out = trainer.train()
+
+    notes = f"Saved → {save_path} | labels={num_labels_label}+{len(label2id_top)} | train_runtime={train_out.metrics.get('train_runtime', float('nan')):.1f}s | {batch_notes} | {throughput_notes(train_out, device)}"
+    if compare:
+        with prof.stage("compare"):
+            report = compare_with_single_task(trainer, eval_dataset, num_labels_label)
+        with open(os.path.join(RESULTS_DIR, "multitask_comparison.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        lines = format_comparison(report)
+        print("\n".join(lines))
+        notes += " | " + "; ".join(lines)
+
+    with prof.stage("save"):
+        model.to("cpu").save_pretrained(save_path, label2id_label, label2id_top)
+        tokenizer.save_pretrained(save_path)
+    print(f"Multi-task model and label maps saved to {save_path}")
+    log_to_readme(action="Train multi-task Longformer on LabelFrames + TopLabelFrames", started_at=t0, notes=notes)
+
+def compare_with_single_task(mt_trainer, mt_eval_dataset, num_labels_label):
+    """Evaluate the multi-task model and the saved single-task models on eval_data.csv with the same metrics."""
+    mt_out = mt_trainer.predict(mt_eval_dataset)
+    mt_logits, mt_labels = mt_out.predictions, mt_out.label_ids
+    report = {"multitask_eval_runtime": mt_out.metrics.get("test_runtime")}
+
+    single_runtime = 0.0
+    for column, cols in (("LabelFrames", slice(None, num_labels_label)), ("TopLabelFrames", slice(num_labels_label, None))):
+        entry = {"multitask": multilabel_metrics(mt_labels[:, cols], mt_logits[:, cols])}
+        single_path = os.path.join(RESULTS_DIR, "trained_models", f"longformer_{short_name(column)}")
+        label_json = os.path.join(single_path, f"label2id_longformer_{short_name(column)}.json")
+        if os.path.exists(label_json):
+            with open(label_json, "r") as f:
+                label2id = json.load(f)
+            eval_dataset = load_tokenized("eval", eval_df).add_column("labels", multi_hot(eval_df[column], label2id).tolist())
+            single_trainer = Trainer(
+                model=AutoModelForSequenceClassification.from_pretrained(single_path),
+                args=TrainingArguments(output_dir=single_path, per_device_eval_batch_size=1, report_to="none"),
+                data_collator=DataCollatorWithPadding(tokenizer),
+            )
+            single_out = single_trainer.predict(eval_dataset)
+            entry["single_task"] = multilabel_metrics(single_out.label_ids, single_out.predictions)
+            single_runtime += single_out.metrics.get("test_runtime", 0.0)
+        else:
+            print(f"No single-task model for {column} at {single_path}; run the default training first to compare.")
+        report[column] = entry
+    report["single_task_eval_runtime"] = single_runtime or None
+    return report
+
+def format_comparison(report):
+    lines = []
+    for column in ("LabelFrames", "TopLabelFrames"):
+        entry = report[column]
+        for metric in ("f1_micro", "f1_weighted", "flat_accuracy"):
+            mt = entry["multitask"][metric]
+            if "single_task" in entry:
+                st = entry["single_task"][metric]
+                lines.append(f"{column} {metric}: single={st:.4f} multi={mt:.4f} Δ={mt - st:+.4f}")
+            else:
+                lines.append(f"{column} {metric}: multi={mt:.4f}")
+    if report.get("single_task_eval_runtime"):
+        lines.append(f"eval runtime: single-task total={report['single_task_eval_runtime']:.1f}s multi={report['multitask_eval_runtime']:.1f}s")
+    return lines
+
+# Distillation (distill subcommand)
+def truncate_layers(model, num_layers):
+    """Keep num_layers evenly spaced encoder layers (first and last included) of a Longformer classifier."""
+    base = getattr(model, model.base_model_prefix)
+    layers = base.encoder.layer
+    keep = sorted({int(round(i)) for i in np.linspace(0, len(layers) - 1, num_layers)})
+    base.encoder.layer = torch.nn.ModuleList([layers[i] for i in keep])
+    model.config.num_hidden_layers = len(keep)
+    if isinstance(model.config.attention_window, (list, tuple)):
+        model.config.attention_window = [model.config.attention_window[i] for i in keep]
+    return model, keep
+
+def teacher_probs(model, texts, fingerprint, cache=None, token_budget=8192):
+    """Teacher sigmoid outputs at MAX_LENGTH, read from / added to the prediction store shared with finetuned_analysis.py."""
+    keys = [text_key(t) for t in texts]
+    found = cache.get_many(fingerprint, keys) if cache else {}
+    missing = {k: t for k, t in zip(keys, texts) if k not in found}
+    print(f"  teacher: {len(keys) - len(missing)}/{len(keys)} rows from the prediction store, {len(missing)} to infer")
+    if missing:
+        probs, _ = predict_labels(model, tokenizer, list(missing.values()), max_length=MAX_LENGTH, token_budget=token_budget)
+        new = dict(zip(missing.keys(), probs))
+        if cache:
+            cache.put_many(fingerprint, new)
+        found.update(new)
+    return np.vstack([found[k] for k in keys]).astype(np.float32)
+
+def unlabeled_corpus(exclude, max_rows=None):
+    """Texts of DISTILL_CORPORA (deduplicated, without any text in `exclude`)."""
+    frames = []
+    for name in DISTILL_CORPORA:
+        path = os.path.join(DATA_DIR, name)
+        if os.path.exists(path):
+            frames.append(pd.read_csv(path, usecols=["Text"]))
+        else:
+            print(f"Unlabeled corpus not found, skipping: {path}")
+    if not frames:
+        return pd.Series([], dtype=str)
+    texts = pd.concat(frames, ignore_index=True)["Text"].dropna().astype(str)
+    texts = texts[~texts.map(text_key).isin(exclude)].drop_duplicates(ignore_index=True)
+    return texts.sample(n=max_rows, random_state=42, ignore_index=True) if max_rows and len(texts) > max_rows else texts
+
+def timed_predict(model, texts, max_length, token_budget=8192):
+    t0 = time.perf_counter()
+    probs, preds = predict_labels(model, tokenizer, texts, max_length=max_length, token_budget=token_budget)
+    return probs, preds, len(texts) / (time.perf_counter() - t0)
+
+def distill(column_name="LabelFrames", num_layers=4, student_max_length=512, hard_weight=0.5, max_unlabeled=None, epochs=3, memory=None):
+    """Train a layer-truncated student at student_max_length on the teacher's soft labels.
+
+    Targets are the teacher's sigmoid outputs for train_data.csv and the unlabeled
+    cluster corpora; on train_data.csv they are mixed with the gold labels
+    (hard_weight). eval_data.csv is held out and only used for the report.
+    """
+    t0 = time.time()
+    print(f"\n==============================\nDistilling Longformer ({column_name}) into a {num_layers}-layer student at {student_max_length} tokens\n==============================")
+    prof = get_profiler()
+    short = short_name(column_name)
+    teacher_path = os.path.join(RESULTS_DIR, "trained_models", f"longformer_{short}")
+    label_json = os.path.join(teacher_path, f"label2id_longformer_{short}.json")
+    if not os.path.exists(label_json):
+        raise FileNotFoundError(f"Teacher model not found: {teacher_path} (run the default training first)")
+    with open(label_json, "r") as f:
+        label2id = json.load(f)
+    save_path = os.path.join(RESULTS_DIR, "trained_models", f"longformer_{short}_student")
+    os.makedirs(save_path, exist_ok=True)
+
+    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    print(f"Using device: {device}")
+    teacher = AutoModelForSequenceClassification.from_pretrained(teacher_path).to(device).eval()
+
+    # Soft targets; eval texts never enter the student's training set
+    eval_keys = set(eval_df["Text"].astype(str).map(text_key))
+    unlabeled = unlabeled_corpus(eval_keys, max_unlabeled)
+    cache = PredictionCache(CACHE_PATH)
+    fingerprint = model_fingerprint(teacher_path, MAX_LENGTH)
+    with prof.stage("teacher_labels", rows=len(train_df) + len(unlabeled)):
+        soft_train = teacher_probs(teacher, train_df["Text"].astype(str).tolist(), fingerprint, cache)
+        soft_unlabeled = teacher_probs(teacher, unlabeled.tolist(), fingerprint, cache) if len(unlabeled) else np.empty((0, len(label2id)), np.float32)
+    cache.close()
+    targets_train = hard_weight * multi_hot(train_df[column_name], label2id) + (1 - hard_weight) * soft_train
+
+    distill_df = pd.concat([train_df[["Text"]], pd.DataFrame({"Text": unlabeled})], ignore_index=True)
+    train_dataset = load_tokenized("distill", distill_df, max_length=student_max_length).add_column(
+        "labels", np.vstack([targets_train, soft_unlabeled]).tolist())
+    eval_dataset = load_tokenized("eval", eval_df, max_length=student_max_length).add_column(
+        "labels", multi_hot(eval_df[column_name], label2id).tolist())
+    print(f"Student training set: {len(train_df)} labeled + {len(unlabeled)} unlabeled articles")
+
+    student, kept = truncate_layers(AutoModelForSequenceClassification.from_pretrained(teacher_path), num_layers)
+    print(f"Student keeps teacher layers {kept}")
+    batch_args, batch_notes = batch_settings(student.to(device), len(label2id), device, memory, max_length=student_max_length)
+    training_args = TrainingArguments(
+        output_dir=save_path,
+        learning_rate=5e-5,
+        save_strategy="no",
+        **batch_args,
+        num_train_epochs=epochs,
+        weight_decay=0.01,
+        logging_dir=os.path.join(RESULTS_DIR, "logs", f"longformer_{short}_student"),
+        report_to="none",
+        push_to_hub=False,
+        dataloader_pin_memory=False if torch.backends.mps.is_available() else True,
+        load_best_model_at_end=False,
+        max_grad_norm=1.0,
+    )
+    trainer = profiled_trainer(model=student, args=training_args, train_dataset=train_dataset, eval_dataset=eval_dataset, compute_metrics=compute_metrics)
+    with prof.tagged(column=column_name, model="student"), prof.stage("train", rows=len(train_dataset)):
+        train_out = trainer.train()
+
+    # Same layout and label maps as the teacher; the tokenizer carries the student's max_length
+    with prof.stage("save"):
+        student.to("cpu").save_pretrained(save_path)
+        tokenizer.save_pretrained(save_path)
+        with open(os.path.join(save_path, "tokenizer_config.json"), "r") as f:
+            tok_config = json.load(f)
+        tok_config["model_max_length"] = student_max_length
+        with open(os.path.join(save_path, "tokenizer_config.json"), "w") as f:
+            json.dump(tok_config, f, indent=2)
+        id2label = {i: label for label, i in label2id.items()}
+        with open(os.path.join(save_path, f"label2id_longformer_{short}.json"), "w") as f:
+            json.dump(label2id, f, indent=2)
+        with open(os.path.join(save_path, f"id2label_longformer_{short}.json"), "w") as f:
+            json.dump(id2label, f, indent=2)
+
+    with prof.stage("compare"):
+        eval_texts = eval_df["Text"].astype(str).tolist()
+        _, teacher_preds, teacher_dps = timed_predict(teacher, eval_texts, MAX_LENGTH)
+        _, student_preds, student_dps = timed_predict(student.to(device).eval(), eval_texts, student_max_length)
+    gold = multi_hot(eval_df[column_name], label2id)
+    report = {
+        "column": column_name, "teacher_layers": teacher.config.num_hidden_layers, "student_layers": len(kept),
+        "teacher_max_length": MAX_LENGTH, "student_max_length": student_max_length,
+        "train_rows": len(train_df), "unlabeled_rows": len(unlabeled),
+        "teacher_docs_per_sec": teacher_dps, "student_docs_per_sec": student_dps,
+        "student_vs_teacher": prediction_metrics(teacher_preds, student_preds),
+        "student_vs_gold": prediction_metrics(gold, student_preds),
+        "teacher_vs_gold": prediction_metrics(gold, teacher_preds),
+    }
+    with open(os.path.join(RESULTS_DIR, f"distill_report_{short}.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    lines = [
+        f"throughput: teacher={teacher_dps:.1f} docs/s student={student_dps:.1f} docs/s (×{student_dps / teacher_dps:.1f})",
+        f"student vs teacher: f1_micro={report['student_vs_teacher']['f1_micro']:.4f} f1_weighted={report['student_vs_teacher']['f1_weighted']:.4f}",
+        f"vs gold f1_micro: teacher={report['teacher_vs_gold']['f1_micro']:.4f} student={report['student_vs_gold']['f1_micro']:.4f}",
+    ]
+    print("\n".join(lines))
+    print(f"Student and label maps saved to {save_path}")
+    log_to_readme(
+        action=f"Distill Longformer {column_name} into a {len(kept)}-layer student",
+        started_at=t0,
+        notes=f"Saved → {save_path} | {batch_notes} | {throughput_notes(train_out, device)} | " + "; ".join(lines),
+    )
+
+# Hyperparameter search (search subcommand)
+SEARCH_GRID = {"learning_rate": [1e-5, 2e-5, 3e-5, 5e-5], "weight_decay": [0.0, 0.01, 0.1], "max_length": [512, 1024]}
+
+class RungStop(TrainerCallback):
+    """Evaluates, checkpoints and pauses a trial once it has used its rung's step budget."""
+
+    def __init__(self, stop_step):
+        self.stop_step = stop_step
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if state.global_step >= self.stop_step:
+            control.should_evaluate = True
+            control.should_save = True
+            control.should_training_stop = True
+        return control
+
+def steps_per_epoch(n_rows, batch_args):
+    batches = math.ceil(n_rows / batch_args["per_device_train_batch_size"])
+    return max(1, math.ceil(batches / batch_args["gradient_accumulation_steps"]))
+
+def sample_configs(grid, max_trials, seed=42):
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    if max_trials and max_trials < len(configs):
+        configs = random.Random(seed).sample(configs, max_trials)
+    return configs
+
+def run_trial(trial, stop_epochs, column_name, label2id, device, patience, eval_every):
+    """Train (or resume) one trial up to stop_epochs; returns when the rung budget is spent or early stopping fires."""
+    cfg, batch_args = trial["config"], trial["batch_args"]
+    per_epoch = steps_per_epoch(len(train_df), batch_args)
+    stop_step = math.ceil(stop_epochs * per_epoch)
+    eval_steps = max(1, round(eval_every * per_epoch))
+    id2label = {i: label for label, i in label2id.items()}
+    model = AutoModelForSequenceClassification.from_pretrained(
+        model_name, num_labels=len(label2id), problem_type="multi_label_classification", id2label=id2label, label2id=label2id)
+    training_args = TrainingArguments(
+        output_dir=trial["dir"],
+        learning_rate=cfg["learning_rate"],
+        weight_decay=cfg["weight_decay"],
+        **batch_args,
+        num_train_epochs=trial["max_epochs"],  # same schedule whatever rung the trial stops at
+        eval_strategy="steps",
+        eval_steps=eval_steps,
+        save_strategy="steps",
+        save_steps=eval_steps,
+        save_total_limit=1,  # plus the best checkpoint, kept by load_best_model_at_end
+        load_best_model_at_end=True,
+        metric_for_best_model="f1_micro",
+        greater_is_better=True,
+        restore_callback_states_from_checkpoint=True,
+        logging_dir=os.path.join(trial["dir"], "logs"),
+        report_to="none",
+        push_to_hub=False,
+        dataloader_pin_memory=False if torch.backends.mps.is_available() else True,
+        max_grad_norm=1.0,
+        seed=42,
+    )
+    length = cfg["max_length"]
+    trainer = profiled_trainer(
+        model=model.to(device),
+        args=training_args,
+        train_dataset=load_tokenized("train", train_df, max_length=length).add_column("labels", multi_hot(train_df[column_name], label2id).tolist()),
+        eval_dataset=load_tokenized("eval", eval_df, max_length=length).add_column("labels", multi_hot(eval_df[column_name], label2id).tolist()),
         compute_metrics=compute_metrics,
+        callbacks=[RungStop(stop_step), EarlyStoppingCallback(early_stopping_patience=patience)],
     )
-    trainer.train()
+    resume = get_last_checkpoint(trial["dir"]) if os.path.isdir(trial["dir"]) else None
+    start = time.perf_counter()
+    with get_profiler().tagged(column=column_name, trial=trial["id"]), get_profiler().stage("search_trial", rows=len(train_df)):
+        trainer.train(resume_from_checkpoint=resume)
+    state = trainer.state
+    trial["seconds"] += time.perf_counter() - start
+    trial["steps"] = state.global_step
+    trial["samples"] = state.global_step * batch_args["per_device_train_batch_size"] * batch_args["gradient_accumulation_steps"]
+    trial["best_f1"] = state.best_metric if state.best_metric is not None else float("-inf")
+    trial["best_checkpoint"] = state.best_model_checkpoint
+    trial["early_stopped"] = state.global_step < min(stop_step, state.max_steps)
+    trial["done"] = trial["early_stopped"] or state.global_step >= state.max_steps
+    del trainer, model
 
-    model.to("cpu").save_pretrained(save_path)
+def format_trial(trial):
+    cfg = trial["config"]
+    status = "early-stopped" if trial["early_stopped"] else ("done" if trial["done"] else "paused")
+    return (f"  trial {trial['id']:>2}: lr={cfg['learning_rate']:g} wd={cfg['weight_decay']:g} len={cfg['max_length']} | "
+            f"steps={trial['steps']} samples={trial['samples']} | best f1_micro={trial['best_f1']:.4f} | {status}")
+
+def search(column_name="LabelFrames", max_trials=8, min_epochs=0.5, max_epochs=3.0, eta=3, eval_every=0.25, patience=2, memory=None, grid=None):
+    """Successive halving over learning rate × weight decay × max_length, scored by eval_data.csv f1_micro.
+
+    All trials train for min_epochs; the best 1/eta continue for eta× the budget,
+    until max_epochs. Within a trial, eval every eval_every epochs and stop after
+    `patience` evaluations without improvement. Only the winner's best checkpoint
+    is kept (longformer_<short>_search); the other trial directories are removed.
+    """
+    t0 = time.time()
+    print(f"\n==============================\nHyperparameter search for Longformer on {column_name}\n==============================")
+    label2id = build_label2id(column_name)
+    short = short_name(column_name)
+    work_dir = os.path.join(RESULTS_DIR, "search", short)
+    save_path = os.path.join(RESULTS_DIR, "trained_models", f"longformer_{short}_search")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    print(f"Using device: {device}")
+
+    # Batch profile per max_length (the --memory-bounded search depends on the sequence length)
+    configs = sample_configs(grid or SEARCH_GRID, max_trials)
+    batch_by_length = {}
+    for length in sorted({c["max_length"] for c in configs}):
+        probe = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=len(label2id), problem_type="multi_label_classification")
+        batch_by_length[length] = batch_settings(probe.to(device), len(label2id), device, memory, max_length=length)
+        del probe
+    trials = [{"id": i, "config": c, "batch_args": batch_by_length[c["max_length"]][0], "dir": os.path.join(work_dir, f"trial_{i:02d}"),
+               "max_epochs": max_epochs, "seconds": 0.0, "steps": 0, "samples": 0, "best_f1": float("-inf"),
+               "best_checkpoint": None, "early_stopped": False, "done": False} for i, c in enumerate(configs)]
+
+    active, rungs, budget = list(trials), [], min_epochs
+    while True:
+        stop = min(budget, max_epochs)
+        print(f"\nRung {len(rungs)}: {len(active)} trial(s) → {stop:g} epoch(s)")
+        for trial in active:
+            if not trial["done"]:
+                run_trial(trial, stop, column_name, label2id, device, patience, eval_every)
+            print(format_trial(trial))
+        active.sort(key=lambda t: t["best_f1"], reverse=True)
+        rungs.append({"epochs": stop, "trials": len(active), "samples": sum(t["samples"] for t in trials),
+                      "seconds": sum(t["seconds"] for t in trials), "best_f1": active[0]["best_f1"]})
+        if stop >= max_epochs or len(active) == 1 or all(t["done"] for t in active):
+            break
+        keep = max(1, len(active) // eta)
+        for trial in active[keep:]:
+            shutil.rmtree(trial["dir"], ignore_errors=True)
+        active, budget = active[:keep], budget * eta
+
+    # Keep only the winner's best checkpoint, with label maps and its max_length in the tokenizer config
+    best = active[0]
+    id2label = {i: label for label, i in label2id.items()}
+    shutil.rmtree(save_path, ignore_errors=True)
+    AutoModelForSequenceClassification.from_pretrained(best["best_checkpoint"]).save_pretrained(save_path)
     tokenizer.save_pretrained(save_path)
-    with open(os.path.join(save_path, f"label2id_longformer_{short_name(column_name)}.json"), "w") as f:
+    with open(os.path.join(save_path, "tokenizer_config.json"), "r") as f:
+        tok_config = json.load(f)
+    tok_config["model_max_length"] = best["config"]["max_length"]
+    with open(os.path.join(save_path, "tokenizer_config.json"), "w") as f:
+        json.dump(tok_config, f, indent=2)
+    with open(os.path.join(save_path, f"label2id_longformer_{short}.json"), "w") as f:
         json.dump(label2id, f, indent=2)
-    with open(os.path.join(save_path, f"id2label_longformer_{short_name(column_name)}.json"), "w") as f:
+    with open(os.path.join(save_path, f"id2label_longformer_{short}.json"), "w") as f:
         json.dump(id2label, f, indent=2)
+    shutil.rmtree(work_dir, ignore_errors=True)
 
-    print(f"Model and label maps saved to {save_path}")
+    # Compute spent vs. training every configuration for max_epochs
+    spent = sum(t["samples"] for t in trials)
+    full_grid = sum(math.ceil(max_epochs * steps_per_epoch(len(train_df), t["batch_args"])) * t["batch_args"]["per_device_train_batch_size"]
+                    * t["batch_args"]["gradient_accumulation_steps"] for t in trials)
+    report = {
+        "column": column_name, "trials": [{k: v for k, v in t.items() if k not in ("dir", "batch_args")} for t in trials],
+        "rungs": rungs, "eta": eta, "min_epochs": min_epochs, "max_epochs": max_epochs, "patience": patience,
+        "best": {"config": best["config"], "f1_micro": best["best_f1"], "saved_to": save_path},
+        "samples_spent": spent, "samples_full_grid": full_grid,
+    }
+    with open(os.path.join(RESULTS_DIR, f"search_report_{short}.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    lines = [f"best: lr={best['config']['learning_rate']:g} wd={best['config']['weight_decay']:g} len={best['config']['max_length']} f1_micro={best['best_f1']:.4f}",
+             f"compute: {spent} training samples vs. {full_grid} for every trial × {max_epochs:g} epochs ({spent / max(full_grid, 1):.0%})"]
+    lines += [f"  rung {i} ({r['epochs']:g} ep, {r['trials']} trials): {r['samples']} samples, {r['seconds']:.0f}s → best f1_micro {r['best_f1']:.4f}"
+              for i, r in enumerate(rungs)]
+    print("\n" + "\n".join(lines))
+    print(f"Best checkpoint saved to {save_path}")
     log_to_readme(
-        action=f"Train Longformer on {column_name}",
+        action=f"Hyperparameter search (successive halving) for Longformer on {column_name}",
         started_at=t0,
-        notes=f"Saved → {save_path} | labels={num_labels}"
+        notes=f"Saved → {save_path} | {len(trials)} trials, eta={eta}, patience={patience} | "
+              f"{batch_by_length[best['config']['max_length']][1]} | " + "; ".join(lines[:2]),
     )
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fine-tune Longformer on LabelFrames / TopLabelFrames.")
+    add_profiling_args(parser, METRICS_PATH)
+    parser.add_argument("--memory-bounded", action="store_true",
+                        help="Gradient checkpointing, bf16 where supported, length-grouped batches and the largest batch that fits --memory-budget-gb.")
+    parser.add_argument("--memory-budget-gb", type=float, default=8.0, help="Memory budget for the batch-size search (--memory-bounded).")
+    parser.add_argument("--effective-batch-size", type=int, default=2,
+                        help="Batch × accumulation steps kept constant by the search (default 2, as the fp32 profile).")
+    parser.add_argument("--no-bf16", action="store_true", help="Stay in fp32 with --memory-bounded.")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("train", help="Train one single-task model per label column (default).")
+    p_mt = sub.add_parser("multitask", help="Train one shared encoder with a LabelFrames and a TopLabelFrames head.")
+    p_mt.add_argument("--no-compare", action="store_true", help="Skip the side-by-side report against the single-task models.")
+    p_ds = sub.add_parser("distill", help="Train a smaller, shorter-context student on the trained model's soft labels.")
+    p_ds.add_argument("--column", choices=["LabelFrames", "TopLabelFrames"], default="LabelFrames")
+    p_ds.add_argument("--layers", type=int, default=4, help="Teacher layers kept in the student (evenly spaced).")
+    p_ds.add_argument("--student-max-length", type=int, default=512)
+    p_ds.add_argument("--hard-weight", type=float, default=0.5, help="Weight of the gold labels in the train_data.csv targets (rest: teacher).")
+    p_ds.add_argument("--max-unlabeled", type=int, default=None, help="Sample at most this many unlabeled cluster articles.")
+    p_ds.add_argument("--epochs", type=int, default=3)
+    p_se = sub.add_parser("search", help="Successive-halving search over learning rate, weight decay and max_length, with early stopping.")
+    p_se.add_argument("--column", choices=["LabelFrames", "TopLabelFrames"], default="LabelFrames")
+    p_se.add_argument("--learning-rates", type=float, nargs="+", default=SEARCH_GRID["learning_rate"])
+    p_se.add_argument("--weight-decays", type=float, nargs="+", default=SEARCH_GRID["weight_decay"])
+    p_se.add_argument("--max-lengths", type=int, nargs="+", default=SEARCH_GRID["max_length"])
+    p_se.add_argument("--max-trials", type=int, default=8, help="Sample this many configurations from the grid (0 = all).")
+    p_se.add_argument("--min-epochs", type=float, default=0.5, help="Budget of the first rung.")
+    p_se.add_argument("--max-epochs", type=float, default=3.0, help="Budget of the last rung (the fixed-length runs use 3).")
+    p_se.add_argument("--eta", type=int, default=3, help="Keep the best 1/eta of the trials per rung, with eta× the budget.")
+    p_se.add_argument("--eval-every", type=float, default=0.25, help="Evaluate on eval_data.csv every this many epochs.")
+    p_se.add_argument("--patience", type=int, default=2, help="Stop a trial after this many evaluations without improvement.")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    train_for("LabelFrames")
-    train_for("TopLabelFrames")
+    args = parse_args()
+    prof = configure_from_args(args, "train_longformer")
+    memory = args if args.memory_bounded else None
+    if args.command == "multitask":
+        train_multitask(compare=not args.no_compare, memory=memory)
+    elif args.command == "distill":
+        distill(args.column, num_layers=args.layers, student_max_length=args.student_max_length, hard_weight=args.hard_weight,
+                max_unlabeled=args.max_unlabeled, epochs=args.epochs, memory=memory)
+    elif args.command == "search":
+        grid = {"learning_rate": args.learning_rates, "weight_decay": args.weight_decays, "max_length": args.max_lengths}
+        search(args.column, max_trials=args.max_trials, min_epochs=args.min_epochs, max_epochs=args.max_epochs, eta=args.eta,
+               eval_every=args.eval_every, patience=args.patience, memory=memory, grid=grid)
+    else:
+        train_for("LabelFrames", memory=memory)
+        train_for("TopLabelFrames", memory=memory)
+    stages = prof.summary()
+    if prof.path:
+        print(f"Slowest stages: {format_summary(stages)} (metrics → {prof.path})")
+    prof.close()
@@ -0,0 +1,52 @@
+import numpy as np
+
+from dedup import near_duplicate_clusters, representatives
+
+NUM_PERM = 128
+
+def signatures(groups, seed=0):
+    """Signature matrix where rows listed together in `groups` are exact copies; every other row is random."""
+    n = max(i for g in groups for i in g) + 1
+    rng = np.random.default_rng(seed)
+    sig = rng.integers(0, 2 ** 32, size=(n, NUM_PERM), dtype=np.uint32)
+    for group in groups:
+        sig[group] = sig[group[0]]
+    return sig
+
+def test_copies_collapse_to_smallest_index():
+    sig = signatures([[5, 1, 8], [6, 2]])
+    rep = near_duplicate_clusters(sig, threshold=0.8)
+    assert rep[[1, 5, 8]].tolist() == [1, 1, 1]
+    assert rep[[2, 6]].tolist() == [2, 2]
+
+def test_unrelated_rows_stay_apart():
+    sig = signatures([[0], [9]])
+    rep = near_duplicate_clusters(sig, threshold=0.8)
+    assert rep.tolist() == list(range(10))
+
+def test_near_copies_above_threshold_merge():
+    sig = signatures([[0, 3]])
+    sig[3, :10] += 1  # ~92% of the signature still agrees
+    rep = near_duplicate_clusters(sig, threshold=0.8)
+    assert rep[3] == 0
+
+def test_oversized_bucket_still_merges_copies():
+    copies = list(range(2, 40, 3))
+    sig = signatures([copies, [40]])
+    rep = near_duplicate_clusters(sig, threshold=0.8, max_bucket=4)
+    assert set(rep[copies]) == {2}
+    others = [i for i in range(len(sig)) if i not in copies]
+    assert rep[others].tolist() == others
+
+def test_representatives_inverse_rebuilds_rows():
+    base = [f"word{i} token{i} shingle{i} extra{i} more{i}".split() for i in range(6)]
+    lists = [base[0], base[1], base[0], base[2], base[1], base[3], base[0], base[4], base[5]]
+    keep, inverse = representatives(lists)
+    assert keep.tolist() == [0, 1, 3, 5, 7, 8]
+    assert len(inverse) == len(lists)
+    # Results computed for the kept rows, copied back to every row
+    assert [lists[i] for i in keep[inverse]] == lists
+
+def test_representatives_single_row():
+    keep, inverse = representatives([["only", "row"]])
+    assert keep.tolist() == [0] and inverse.tolist() == [0]
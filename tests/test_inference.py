@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from inference import collect_probs, plan_token_batches, pool_windows, window_starts
+
+LENGTHS = [512, 37, 200, 512, 8, 130, 130, 64, 900, 1, 300, 256]
+
+@pytest.mark.parametrize("budget", [64, 512, 1024, 4096])
+def test_plan_token_batches_uses_every_row_once(budget):
+    batches = plan_token_batches(LENGTHS, budget)
+    rows = [i for batch in batches for i in batch]
+    assert sorted(rows) == list(range(len(LENGTHS)))
+
+@pytest.mark.parametrize("budget", [64, 512, 1024, 4096])
+def test_plan_token_batches_stays_within_budget(budget):
+    for batch in plan_token_batches(LENGTHS, budget):
+        longest = max(LENGTHS[i] for i in batch)
+        # Only a row longer than the budget on its own may exceed it
+        assert len(batch) * longest <= budget or len(batch) == 1
+
+def test_plan_token_batches_caps_batch_size():
+    batches = plan_token_batches([10] * 100, 10_000, max_batch_size=16)
+    assert max(len(b) for b in batches) == 16
+    assert sum(len(b) for b in batches) == 100
+
+def test_plan_token_batches_empty():
+    assert plan_token_batches([], 4096) == []
+
+def test_collect_probs_restores_row_order():
+    values = np.arange(len(LENGTHS), dtype=np.float32)[:, None] * [1.0, -1.0]
+    batches = [(batch, values[batch]) for batch in plan_token_batches(LENGTHS, 1024)]
+    out = collect_probs(None, batches, len(LENGTHS), forward=lambda model, enc: enc)
+    np.testing.assert_array_equal(out, values)
+
+@pytest.mark.parametrize("n_tokens, size, overlap", [(1000, 510, 128), (511, 510, 0), (4096, 510, 255), (2000, 100, 99)])
+def test_window_starts_cover_text_with_overlap(n_tokens, size, overlap):
+    starts = window_starts(n_tokens, size, overlap)
+    assert starts[0] == 0
+    assert starts[-1] + size == n_tokens
+    # Consecutive windows share at least `overlap` tokens, so no token is left out
+    assert all(0 < b - a <= size - overlap for a, b in zip(starts, starts[1:]))
+
+@pytest.mark.parametrize("n_tokens", [0, 1, 300, 510])
+def test_window_starts_short_text_is_one_window(n_tokens):
+    assert window_starts(n_tokens, 510, 128) == [0]
+
+@pytest.mark.parametrize("pooling, reduce", [("max", np.max), ("mean", np.mean)])
+def test_pool_windows_matches_per_row_reference(pooling, reduce):
+    rng = np.random.default_rng(0)
+    owner = np.array([0, 0, 0, 1, 2, 2, 3, 3, 3, 3])
+    values = rng.normal(size=(len(owner), 5)).astype(np.float32)
+    expected = np.stack([reduce(values[owner == row], axis=0) for row in range(4)])
+    np.testing.assert_allclose(pool_windows(values, owner, 4, pooling), expected, rtol=1e-6)
+
+def test_pool_windows_rejects_unknown_pooling():
+    with pytest.raises(ValueError):
+        pool_windows(np.zeros((1, 2)), np.array([0]), 1, "median")
@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+import pytest
+
+import finetuned_analysis as fa
+import ingest
+from ingest import Manifest, new_rows, remove_orphan_parts, scan_since
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(fa, "RESULTS_DIR", str(tmp_path / "results"))
+    m = Manifest(ingest.manifest_path())
+    yield m
+    m.close()
+
+def rows(urls, dates):
+    return pd.DataFrame({"URL": urls, "Date": dates})
+
+def write_csv(path, n, start="2024-01-01"):
+    dates = pd.date_range(start, periods=n, freq="D").strftime("%Y-%m-%d")
+    pd.DataFrame({"URL": [f"https://x/{i}" for i in range(n)], "Date": dates, "Text": [f"article {i}" for i in range(n)],
+                  "TokenList": "a|b"}).to_csv(path, index=False)
+
+def test_commit_part_advances_watermark_only_forward(manifest):
+    manifest.commit_part("bbc", "date=2024-03/bbc-1.parquet", rows(["u1", "u2"], ["2024-03-01", "2024-03-09"]), "1")
+    assert manifest.watermark("bbc") == "2024-03-09"
+    manifest.commit_part("bbc", "date=2024-01/bbc-2.parquet", rows(["u3"], ["2024-01-15"]), "2")
+    assert manifest.watermark("bbc") == "2024-03-09"
+    manifest.commit_part("bbc", "date=2024-05/bbc-3.parquet", rows(["u4"], ["2024-05-02"]), "3")
+    manifest.commit_part("bbc", "date=unknown/bbc-4.parquet", rows(["u5"], [None]), "4")
+    assert manifest.watermarks() == {"bbc": "2024-05-02"}
+    assert manifest.count() == 5 and len(manifest.parts()) == 4
+
+def test_known_urls_beyond_one_query(manifest):
+    urls = [f"https://x/{i}" for i in range(1200)]
+    manifest.commit_part("cnn", "date=2024-01/cnn-1.parquet", rows(urls[::2], ["2024-01-01"] * 600), "1")
+    assert manifest.known_urls(urls + urls[:10]) == set(urls[::2])
+
+def test_remove_orphan_parts(manifest):
+    committed = "date=2024-01/bbc-1.parquet"
+    manifest.commit_part("bbc", committed, rows(["u1"], ["2024-01-01"]), "1")
+    for part in (committed, "date=2024-01/bbc-2.parquet", "date=2024-02/bbc-2.parquet.tmp"):
+        path = os.path.join(ingest.partitions_dir(), part)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "w").close()
+    assert remove_orphan_parts(manifest) == 2
+    assert os.path.exists(os.path.join(ingest.partitions_dir(), committed))
+    assert not os.path.exists(os.path.join(ingest.partitions_dir(), "date=2024-01", "bbc-2.parquet"))
+
+def test_second_run_finds_no_new_rows(manifest, tmp_path):
+    path = str(tmp_path / "bbc.csv")
+    write_csv(path, 25)
+    df = new_rows(manifest, path, "bbc", chunk_rows=7)
+    assert len(df) == 25 and df["outlet"].eq("bbc").all()
+    manifest.commit_part("bbc", "date=2024-01/bbc-1.parquet", df, "1")
+    assert len(new_rows(manifest, path, "bbc", chunk_rows=7)) == 0
+
+def test_rows_before_late_margin_are_skipped(manifest, tmp_path):
+    path = str(tmp_path / "bbc.csv")
+    write_csv(path, 40)
+    df = new_rows(manifest, path, "bbc")
+    assert len(new_rows(manifest, path, "bbc", since="2024-02-01")) == 9
+    manifest.commit_part("bbc", "date=2024-01/bbc-1.parquet", df.iloc[:30], "1")
+    since = scan_since(manifest.watermark("bbc"), 5)
+    assert since == "2024-01-25"
+    assert new_rows(manifest, path, "bbc", since=since)["URL"].tolist() == [f"https://x/{i}" for i in range(30, 40)]
+    assert scan_since(None, 5) is None and scan_since("2024-01-30", None) is None
+
+def test_file_unchanged(manifest, tmp_path):
+    path = str(tmp_path / "bbc.csv")
+    write_csv(path, 3)
+    assert not manifest.file_unchanged("bbc", os.stat(path))
+    manifest.record_file("bbc", os.stat(path))
+    assert manifest.file_unchanged("bbc", os.stat(path))
+    write_csv(path, 4)
+    assert not manifest.file_unchanged("bbc", os.stat(path))
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from prediction_output import (decode_label_frames, decode_top_frames, part_path, predictions_table, read_predictions,
+                               write_table)
+
+LABELS = ["Humanitarian", "Military", "Political", "Legal"]
+TOP = ["Conflict", "Diplomacy", "Aid"]
+
+def sample(n=5, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.DataFrame({"row": np.arange(n), "key": [f"k{i}" for i in range(n)], "URL": [f"https://x/{i}" for i in range(n)]})
+    return base, rng.random((n, len(LABELS))).astype(np.float32), rng.random((n, len(TOP))).astype(np.float32)
+
+def test_decode_label_frames_falls_back_to_argmax():
+    probs = np.array([[0.9, 0.2, 0.6, 0.1], [0.1, 0.4, 0.3, 0.2], [0.0, 0.0, 0.0, 0.7]])
+    assert decode_label_frames(probs, probs >= 0.5, LABELS) == ["Humanitarian|Political", "Military", "Legal"]
+    assert decode_label_frames(probs, probs >= 0.5, dict(enumerate(LABELS))) == ["Humanitarian|Political", "Military", "Legal"]
+    assert decode_label_frames(np.empty((0, 4)), np.empty((0, 4)), LABELS) == []
+
+def test_round_trip(tmp_path):
+    base, probs_label, probs_top = sample()
+    strings = decode_label_frames(probs_label, probs_label >= 0.3, LABELS)
+    top = decode_top_frames(probs_top, TOP)
+    path = str(tmp_path / "out.parquet")
+    write_table(predictions_table(base, strings, top, probs_label, probs_top, LABELS, TOP, threshold=0.3, source="eval.csv"), path)
+
+    df, read_label, read_top, meta = read_predictions(path)
+    assert df.columns.tolist() == ["row", "key", "URL", "LabelFrames_pred", "TopLabelFrames_pred"]
+    assert df["LabelFrames_pred"].tolist() == strings and df["TopLabelFrames_pred"].tolist() == top
+    assert read_label.dtype == np.float16 and read_top.dtype == np.float16
+    np.testing.assert_array_equal(read_label, probs_label.astype(np.float16))
+    np.testing.assert_array_equal(read_top, probs_top.astype(np.float16))
+    assert meta["labels_label"] == LABELS and meta["labels_top"] == TOP
+    assert meta["threshold"] == 0.3 and meta["source"] == "eval.csv" and meta["cascade"] is None
+    # Re-thresholding from the stored probabilities reproduces the written labels
+    assert decode_label_frames(read_label, read_label >= meta["threshold"], meta["labels_label"]) == strings
+
+def test_part_directory_and_routed(tmp_path):
+    out_dir = str(tmp_path / "parts")
+    frames = []
+    for index, seed in enumerate([1, 2]):
+        base, probs_label, probs_top = sample(seed=seed)
+        routed = np.arange(len(base)) % 2 == 0
+        cascade = {"model": "linear_frames.joblib", "band": [0.2, 0.8], "top_margin": 0.2}
+        write_table(predictions_table(base, decode_label_frames(probs_label, probs_label >= 0.5, LABELS),
+                                      decode_top_frames(probs_top, TOP), probs_label, probs_top, LABELS, TOP,
+                                      routed=routed, cascade=cascade), part_path(out_dir, index))
+        frames.append(probs_label)
+    df, read_label, _, meta = read_predictions(out_dir)
+    assert len(df) == 10 and df["routed"].dtype == bool
+    assert df["routed"].tolist() == [True, False, True, False, True] * 2
+    np.testing.assert_array_equal(read_label, np.concatenate(frames).astype(np.float16))
+    assert meta["cascade"]["band"] == [0.2, 0.8]
+
+def test_single_task_leaves_other_columns_out(tmp_path):
+    base, probs_label, _ = sample()
+    path = str(tmp_path / "label_only.parquet")
+    write_table(predictions_table(base, decode_label_frames(probs_label, probs_label >= 0.5, LABELS), None, probs_label, None,
+                                  LABELS, None), path)
+    df, read_label, read_top, meta = read_predictions(path)
+    assert "TopLabelFrames_pred" not in df.columns and read_top is None
+    assert read_label.shape == (5, len(LABELS)) and meta["labels_top"] is None
@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+import pytest
+
+from serve import MicroBatcher
+
+def fake_predict(calls):
+    """Deterministic stand-in for FramePredictor.predict_routed: every output row is derived from its text."""
+    def predict(texts, tokens=None):
+        calls.append(list(texts))
+        if "boom" in texts:
+            raise RuntimeError("model failed")
+        probs = np.array([[len(t), len(t) / 2] for t in texts], dtype=np.float32)
+        routed = None if tokens is None else np.array([tok.startswith("route") for tok in tokens])
+        return [t.upper() for t in texts], [t[::-1] for t in texts], probs, probs[:, :1], routed
+    return predict
+
+@pytest.fixture
+def calls():
+    return []
+
+def test_concurrent_clients_get_their_own_results(calls):
+    batcher = MicroBatcher(fake_predict(calls), window_ms=50, max_batch=8)
+    results, start = {}, threading.Barrier(20)
+
+    def client(c):
+        texts = [f"client{c}-text{j}" for j in range(1 + c % 3)]
+        start.wait()
+        results[c] = (texts, batcher.submit(texts).result(timeout=10))
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    for texts, predictions in results.values():
+        assert [p["LabelFrames_pred"] for p in predictions] == [t.upper() for t in texts]
+        assert [p["TopLabelFrames_pred"] for p in predictions] == [t[::-1] for t in texts]
+        assert [p["probs_label"][0] for p in predictions] == [len(t) for t in texts]
+        assert all("routed" not in p for p in predictions)
+    assert len(results) == 20
+    assert sum(len(c) for c in calls) == sum(len(texts) for texts, _ in results.values())
+    # Requests are coalesced; a batch stops taking requests once it holds max_batch texts
+    assert len(calls) < 20
+    assert max(len(c) for c in calls) <= 8 + 2
+    assert batcher.stats["requests"] == 20 and batcher.stats["batches"] == len(calls)
+
+def test_exception_reaches_every_request_in_the_batch(calls):
+    batcher = MicroBatcher(fake_predict(calls), window_ms=500, max_batch=64)
+    futures = [batcher.submit(["a"]), batcher.submit(["boom"]), batcher.submit(["b", "c"])]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model failed"):
+            future.result(timeout=10)
+    assert calls == [["a", "boom", "b", "c"]]
+    # The batcher keeps serving after a failed batch
+    assert batcher.submit(["d"]).result(timeout=10)[0]["LabelFrames_pred"] == "D"
+    batcher.close()
+    assert batcher.stats["requests"] == 1
+
+def test_tokens_and_routed_flags(calls):
+    batcher = MicroBatcher(fake_predict(calls), window_ms=500, max_batch=64)
+    with_tokens = batcher.submit(["x", "y"], tokens=["route-x", "keep-y"])
+    without = batcher.submit(["route-z"])
+    assert [p["routed"] for p in with_tokens.result(timeout=10)] == [True, False]
+    # Requests without tokens fall back to their texts for the linear model
+    assert [p["routed"] for p in without.result(timeout=10)] == [True]
+    batcher.close()